@@ -0,0 +1,479 @@
+from __future__ import annotations
+
+__author__ = 'Robbert Harms'
+__date__ = '2026-10-18'
+__maintainer__ = 'Robbert Harms'
+__email__ = 'robbert@xkls.nl'
+__licence__ = 'LGPL v3'
+
+import hashlib
+import json
+import os
+import struct
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures.thread import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterator
+
+import numpy as np
+
+from musical_games.dice_games.base import (BarSelection, DiceGame, MidiBarPlacement, MidiSettings,
+                                           str_dice_table_name, str_staff_name)
+from musical_games.dice_games.midi import (MidiTrack, default_ticks_per_quarter, merge_tied_notes, parse_lilypond_bar,
+                                           write_midi_file)
+from musical_games.external.midi_converters import AutoMidiToWavFactory, MidiToWav
+
+_wave_format_pcm = 1
+_wave_format_float = 3
+_wave_format_extensible = 0xFFFE
+
+
+class BarAudioCache:
+
+    def __init__(self,
+                 dice_game: DiceGame,
+                 cache_dir: Path,
+                 soundfont: Path | None = None,
+                 midi_settings: MidiSettings | None = None,
+                 gain: float | None = None,
+                 release_time: float = 3.0,
+                 max_open_bars: int = 256):
+        """Cache of the synthesized audio of single bars, from which the audio of compositions is assembled.
+
+        Each bar of each staff is synthesized once, on its own, at the tempo of its section (see
+        :meth:`DiceGame.get_midi_sections`) and with the instrument and volumes of the midi settings. The synthesis
+        continues for the release time after the end of the bar, such that the release tails of the last notes are
+        kept. The audio of a composition is then the overlap-add of the audio of its bars, each placed at the exact
+        sample of its start time (see :meth:`DiceGame.get_midi_bar_placements`). Once all the bars are rendered, for
+        example using :meth:`prerender`, assembling a composition never runs a synthesizer.
+
+        The audio of each bar is stored as a 32 bit floating point WAV file, named by a hash of the bar, the tempo,
+        the midi settings and the synthesis options. These files are memory mapped when assembling compositions. Only
+        the most recently used bars are kept mapped, such that the number of open files is bounded.
+
+        Since the bars are synthesized out of context, dynamics and ties do not carry over from one bar to the next,
+        unlike in :meth:`DiceGame.compile_composition_midi`.
+
+        Args:
+            dice_game: the dice game of the compositions
+            cache_dir: the directory in which to store the audio of the bars
+            soundfont: the soundfont to use for the synthesis
+            midi_settings: the midi settings for the synthesis, if not set we use the default midi settings.
+            gain: number between 0 and 1 to indicate the desired output gain of the synthesis.
+            release_time: the time in seconds we keep synthesizing after the end of a bar.
+            max_open_bars: the maximum number of memory mapped bar files we keep open.
+        """
+        self._dice_game = dice_game
+        self._cache_dir = Path(cache_dir)
+        self._soundfont = soundfont
+        self._midi_settings = midi_settings or dice_game.get_default_midi_settings()
+        self._gain = gain
+        self._release_time = release_time
+
+        self._midi_to_wav: MidiToWav | None = None
+        self._midi_to_wav_lock = threading.Lock()
+        self._max_open_bars = max_open_bars
+        self._bar_audio: OrderedDict[str, tuple[np.ndarray, int]] = OrderedDict()
+
+        soundfont_fingerprint = None
+        if soundfont is not None:
+            soundfont_fingerprint = [str(soundfont), os.stat(soundfont).st_mtime_ns]
+        self._options_key = json.dumps([soundfont_fingerprint, gain, release_time])
+
+    @property
+    def cache_dir(self) -> Path:
+        """The directory holding the audio of the bars."""
+        return self._cache_dir
+
+    @property
+    def nmr_open_bars(self) -> int:
+        """The number of bar files currently memory mapped, at most the maximum number of open bars."""
+        return len(self._bar_audio)
+
+    def prerender(self, max_workers: int | None = None) -> int:
+        """Render the audio of all the bars of the dice game which are not yet in the cache.
+
+        Each bar is rendered at the tempo of every section playing its dice table.
+
+        Args:
+            max_workers: the maximum number of synthesizers to run in parallel, if not set we use the default of
+                the thread pool executor.
+
+        Returns:
+            The number of bars rendered.
+        """
+        table_tempi = {}
+        for section in self._dice_game.get_midi_sections():
+            for table_name in section.table_names:
+                table_tempi.setdefault(table_name, set()).add(section.tempo)
+
+        bars = {}
+        for table_name, bar_collection in self._dice_game.get_bar_collections().items():
+            for tempo in table_tempi.get(table_name, ()):
+                for staff_name in bar_collection.get_staff_names():
+                    for bar_sequence in bar_collection.get_bar_sequences(staff_name).values():
+                        for bar in bar_sequence.get_bars():
+                            key = self._get_key(table_name, staff_name, bar.lilypond_str, tempo)
+                            if not self._get_bar_path(key).exists():
+                                bars[key] = (table_name, staff_name, bar.lilypond_str, tempo)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            list(executor.map(lambda item: self._render_bar(item[0], *item[1]), bars.items()))
+        return len(bars)
+
+    def has_bar_audio(self, placement: MidiBarPlacement) -> bool:
+        """Check if the audio of a bar is in the cache.
+
+        Args:
+            placement: the placement of the bar, see :meth:`DiceGame.get_midi_bar_placements`. Only the table, staff,
+                lilypond string and tempo of the placement are used.
+
+        Returns:
+            True if the audio of the bar was rendered or stored before, False otherwise.
+        """
+        key = self._get_key(placement.table_name, placement.staff_name, placement.lilypond_str, placement.tempo)
+        return self._get_bar_path(key).exists()
+
+    def store_bar_audio(self, placement: MidiBarPlacement, samples: np.ndarray, sample_rate: int):
+        """Store the audio of a bar in the cache, for example audio synthesized elsewhere.
+
+        Args:
+            placement: the placement of the bar, see :meth:`DiceGame.get_midi_bar_placements`. Only the table, staff,
+                lilypond string and tempo of the placement are used.
+            samples: the samples of the bar including the release tail, as an array of shape
+                (nmr_frames, nmr_channels), in the range [-1, 1].
+            sample_rate: the sample rate
+        """
+        key = self._get_key(placement.table_name, placement.staff_name, placement.lilypond_str, placement.tempo)
+        write_wav(self._get_bar_path(key), samples, sample_rate, float_samples=True)
+        self._bar_audio.pop(key, None)
+
+    def get_bar_audio(self, placement: MidiBarPlacement) -> tuple[np.ndarray, int]:
+        """Get the audio of a single bar, rendering it if it is not yet in the cache.
+
+        Args:
+            placement: the placement of the bar in a composition, see :meth:`DiceGame.get_midi_bar_placements`
+
+        Returns:
+            The (memory mapped) samples of the bar as an array of shape (nmr_frames, nmr_channels), including the
+            release tail, and the sample rate.
+        """
+        key = self._get_key(placement.table_name, placement.staff_name, placement.lilypond_str, placement.tempo)
+        if key in self._bar_audio:
+            self._bar_audio.move_to_end(key)
+            return self._bar_audio[key]
+
+        bar_path = self._get_bar_path(key)
+        if not bar_path.exists():
+            self._render_bar(key, placement.table_name, placement.staff_name, placement.lilypond_str,
+                             placement.tempo)
+        bar_audio = read_wav(bar_path)
+        if self._max_open_bars > 0:
+            self._bar_audio[key] = bar_audio
+            if len(self._bar_audio) > self._max_open_bars:
+                self._bar_audio.popitem(last=False)
+        return bar_audio
+
+    def get_composition_audio(self, bar_selection: BarSelection) -> tuple[np.ndarray, int]:
+        """Assemble the audio of a composition from the audio of its bars.
+
+        Args:
+            bar_selection: the selection of bars for the composition
+
+        Returns:
+            The samples of the composition as an array of shape (nmr_frames, nmr_channels), and the sample rate.
+
+        Raises:
+            ValueError: if the audio of the bars differs in sample rate.
+        """
+        chunks = []
+        sample_rate = None
+        for samples, sample_rate in self.iter_composition_audio(bar_selection):
+            chunks.append(samples)
+
+        if not chunks:
+            return np.zeros((0, 1), dtype=np.float32), 44100
+        return np.concatenate(chunks), sample_rate
+
+    def iter_composition_audio(self, bar_selection: BarSelection) -> Iterator[tuple[np.ndarray, int]]:
+        """Assemble the audio of a composition incrementally, yielding the samples as they become final.
+
+        The bars are added in the order of their start time, rendering them if they are not yet in the cache. After
+        adding a bar, all the samples before the start of the next bar are final and are yielded. Only the samples
+        which may still overlap with later bars are kept, such that the memory use is bounded by the length of the
+        longest bar including its release tail, regardless of the length of the composition.
+
+        The concatenation of the chunks equals the audio of :meth:`get_composition_audio`.
+
+        Args:
+            bar_selection: the selection of bars for the composition
+
+        Yields:
+            The consecutive chunks of samples, as arrays of shape (nmr_frames, nmr_channels), with the sample rate.
+
+        Raises:
+            ValueError: if the audio of the bars differs in sample rate.
+        """
+        placements = sorted(self._dice_game.get_midi_bar_placements(bar_selection),
+                            key=lambda placement: placement.start_time)
+
+        sample_rate = None
+        window = None
+        window_start = 0
+        for ind, placement in enumerate(placements):
+            samples, bar_sample_rate = self.get_bar_audio(placement)
+            if sample_rate is None:
+                sample_rate = bar_sample_rate
+                window = np.zeros((0, samples.shape[1]), dtype=np.float32)
+            elif bar_sample_rate != sample_rate:
+                raise ValueError('The audio of the bars has different sample rates.')
+
+            start = round(placement.start_time * sample_rate) - window_start
+            window = _extend_window(window, start + len(samples))
+            window[start:start + len(samples)] += samples
+
+            if ind + 1 < len(placements):
+                final_length = round(placements[ind + 1].start_time * sample_rate) - window_start
+                if final_length > 0:
+                    window = _extend_window(window, final_length)
+                    yield window[:final_length], sample_rate
+                    window = window[final_length:].copy()
+                    window_start += final_length
+            elif len(window):
+                yield window, sample_rate
+
+    def iter_composition_wav(self, bar_selection: BarSelection, float_samples: bool = False) -> Iterator[bytes]:
+        """Stream the audio of a composition as a WAV file, for example as the body of an HTTP response.
+
+        This first yields the WAV header, as soon as the first bar is available, followed by the PCM data of each
+        chunk of :meth:`iter_composition_audio`. Since the total length is not known up front, the header holds the
+        maximum sizes, as is common for streamed WAV files.
+
+        Args:
+            bar_selection: the selection of bars for the composition
+            float_samples: if set, we stream 32 bit floating point samples, else 16 bit integer samples.
+
+        Yields:
+            The consecutive bytes of the WAV file.
+        """
+        header_sent = False
+        for samples, sample_rate in self.iter_composition_audio(bar_selection):
+            if not header_sent:
+                yield get_wav_header(sample_rate, samples.shape[1], float_samples=float_samples)
+                header_sent = True
+            yield to_pcm_bytes(samples, float_samples=float_samples)
+
+    def write_composition_wav(self, bar_selection: BarSelection, wav_out: Path,
+                              float_samples: bool = False) -> Path:
+        """Assemble the audio of a composition and write it to a WAV file.
+
+        The audio is written incrementally, with the memory use of :meth:`iter_composition_audio`.
+
+        Args:
+            bar_selection: the selection of bars for the composition
+            wav_out: where to place the output wav file
+            float_samples: if set, we write 32 bit floating point samples, else 16 bit integer samples.
+
+        Returns:
+            The path to the output wav file.
+        """
+        wav_out = Path(wav_out)
+        wav_out.parent.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile('wb', dir=wav_out.parent, prefix='.tmp_', suffix='.wav', delete=False) as f:
+            nmr_frames = 0
+            nmr_channels = 1
+            sample_rate = 44100
+            for samples, sample_rate in self.iter_composition_audio(bar_selection):
+                if nmr_frames == 0:
+                    nmr_channels = samples.shape[1]
+                    f.write(get_wav_header(sample_rate, nmr_channels, float_samples=float_samples))
+                f.write(to_pcm_bytes(samples, float_samples=float_samples))
+                nmr_frames += len(samples)
+            f.seek(0)
+            f.write(get_wav_header(sample_rate, nmr_channels, float_samples=float_samples, nmr_frames=nmr_frames))
+        os.replace(f.name, wav_out)
+        return wav_out
+
+    def _get_key(self, table_name: str_dice_table_name, staff_name: str_staff_name, lilypond_str: str,
+                 tempo: float) -> str:
+        """Get the hash identifying the audio of a bar."""
+        key_data = [lilypond_str, tempo,
+                    self._midi_settings.get_midi_instrument(table_name, staff_name),
+                    self._midi_settings.get_min_volume(table_name, staff_name),
+                    self._midi_settings.get_max_volume(table_name, staff_name),
+                    self._options_key]
+        return hashlib.sha256(json.dumps(key_data).encode()).hexdigest()
+
+    def _get_bar_path(self, key: str) -> Path:
+        return self._cache_dir / key[:2] / f'{key}.wav'
+
+    def _render_bar(self, key: str, table_name: str_dice_table_name, staff_name: str_staff_name,
+                    lilypond_str: str, tempo: float):
+        """Synthesize the audio of a single bar into the cache."""
+        with self._midi_to_wav_lock:
+            if self._midi_to_wav is None:
+                factory = AutoMidiToWavFactory()
+                factory.set_soundfont(self._soundfont)
+                self._midi_to_wav = factory.create()
+
+        bar_events = parse_lilypond_bar(lilypond_str)
+        release_ticks = round(self._release_time * tempo / 60 * default_ticks_per_quarter)
+        track = MidiTrack(f'{table_name} {staff_name}',
+                          self._midi_settings.get_midi_instrument(table_name, staff_name),
+                          self._midi_settings.get_min_volume(table_name, staff_name),
+                          self._midi_settings.get_max_volume(table_name, staff_name),
+                          merge_tied_notes(list(bar_events.notes)))
+        midi = write_midi_file([track], [(0, tempo)], length=bar_events.length + release_ticks)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            midi_path = Path(tmp_dir) / 'bar.midi'
+            wav_path = Path(tmp_dir) / 'bar.wav'
+            midi_path.write_bytes(midi)
+            self._midi_to_wav.call(midi_path, wav_path, self._gain)
+            samples, sample_rate = read_wav(wav_path, mmap=False)
+        write_wav(self._get_bar_path(key), samples, sample_rate, float_samples=True)
+
+
+def read_wav(wav_in: Path, mmap: bool = True) -> tuple[np.ndarray, int]:
+    """Read the samples of a PCM or floating point WAV file.
+
+    Args:
+        wav_in: the WAV file to read
+        mmap: if set, 32 bit floating point files are memory mapped instead of read into memory.
+
+    Returns:
+        The samples as a float32 array of shape (nmr_frames, nmr_channels), scaled to [-1, 1], and the sample rate.
+
+    Raises:
+        ValueError: if the file is not a WAV file, or has an unsupported sample format.
+    """
+    file_size = os.path.getsize(wav_in)
+    with open(wav_in, 'rb') as f:
+        riff, _, wave = struct.unpack('<4sI4s', f.read(12))
+        if riff != b'RIFF' or wave != b'WAVE':
+            raise ValueError(f'The file "{wav_in}" is not a WAV file.')
+
+        fmt = None
+        while True:
+            chunk_header = f.read(8)
+            if len(chunk_header) < 8:
+                raise ValueError(f'The WAV file "{wav_in}" has no data.')
+            chunk_id, chunk_size = struct.unpack('<4sI', chunk_header)
+            if chunk_id == b'fmt ':
+                fmt = f.read(chunk_size)
+                f.seek(chunk_size % 2, os.SEEK_CUR)
+            elif chunk_id == b'data':
+                data_offset = f.tell()
+                data_size = min(chunk_size, file_size - data_offset)
+                break
+            else:
+                f.seek(chunk_size + chunk_size % 2, os.SEEK_CUR)
+
+    if fmt is None:
+        raise ValueError(f'The WAV file "{wav_in}" has no format chunk.')
+
+    format_tag, nmr_channels, sample_rate, _, block_align, bits_per_sample = struct.unpack('<HHIIHH', fmt[:16])
+    if format_tag == _wave_format_extensible:
+        format_tag = struct.unpack('<H', fmt[24:26])[0]
+
+    nmr_frames = data_size // block_align
+    bytes_per_sample = block_align // nmr_channels
+    if format_tag == _wave_format_float and bits_per_sample == 32:
+        if mmap and nmr_frames:
+            return np.memmap(wav_in, dtype='<f4', mode='r', offset=data_offset,
+                             shape=(nmr_frames, nmr_channels)), sample_rate
+        return np.fromfile(wav_in, dtype='<f4', count=nmr_frames * nmr_channels,
+                           offset=data_offset).reshape(nmr_frames, nmr_channels), sample_rate
+
+    if format_tag != _wave_format_pcm or bytes_per_sample not in (1, 2, 3, 4):
+        raise ValueError(f'The WAV file "{wav_in}" has an unsupported sample format.')
+
+    raw = np.fromfile(wav_in, dtype=np.uint8, count=nmr_frames * block_align, offset=data_offset)
+    if bytes_per_sample == 1:
+        samples = (raw.astype(np.float32) - 128) / 128
+    elif bytes_per_sample == 3:
+        raw = raw.reshape(-1, 3)
+        values = (raw[:, 0].astype(np.int32) | (raw[:, 1].astype(np.int32) << 8)
+                  | (raw[:, 2].astype(np.int8).astype(np.int32) << 16))
+        samples = values.astype(np.float32) / 2 ** 23
+    else:
+        samples = raw.view(f'<i{bytes_per_sample}').astype(np.float32) / 2 ** (8 * bytes_per_sample - 1)
+    return samples.reshape(nmr_frames, nmr_channels), sample_rate
+
+
+def write_wav(wav_out: Path, samples: np.ndarray, sample_rate: int, float_samples: bool = False):
+    """Write samples to a WAV file.
+
+    The file is written to a temporary file first and then moved in place, such that readers never observe a partial
+    file.
+
+    Args:
+        wav_out: the WAV file to write
+        samples: the samples, as an array of shape (nmr_frames, nmr_channels), in the range [-1, 1].
+        sample_rate: the sample rate
+        float_samples: if set, we write 32 bit floating point samples, else we clip to 16 bit integer samples.
+    """
+    samples = np.asarray(samples)
+    if samples.ndim == 1:
+        samples = samples[:, None]
+
+    wav_out = Path(wav_out)
+    wav_out.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile('wb', dir=wav_out.parent, prefix='.tmp_', suffix='.wav', delete=False) as f:
+        f.write(get_wav_header(sample_rate, samples.shape[1], float_samples=float_samples, nmr_frames=len(samples)))
+        f.write(to_pcm_bytes(samples, float_samples=float_samples))
+    os.replace(f.name, wav_out)
+
+
+def get_wav_header(sample_rate: int, nmr_channels: int, float_samples: bool = False,
+                   nmr_frames: int | None = None) -> bytes:
+    """Get the header of a WAV file, up to and including the header of the data chunk.
+
+    Args:
+        sample_rate: the sample rate
+        nmr_channels: the number of channels
+        float_samples: if the data holds 32 bit floating point samples, else 16 bit integer samples.
+        nmr_frames: the number of frames in the data. If not set, for streaming, the sizes in the header are set to
+            their maximum values.
+
+    Returns:
+        The bytes of the header, to be followed by the data of :func:`to_pcm_bytes`.
+    """
+    format_tag, bits_per_sample = (_wave_format_float, 32) if float_samples else (_wave_format_pcm, 16)
+    block_align = nmr_channels * bits_per_sample // 8
+    fmt = struct.pack('<HHIIHH', format_tag, nmr_channels, sample_rate, sample_rate * block_align, block_align,
+                      bits_per_sample)
+    chunks = b'fmt ' + struct.pack('<I', len(fmt)) + fmt
+    if float_samples:
+        chunks += b'fact' + struct.pack('<II', 4, 0xFFFFFFFF if nmr_frames is None else nmr_frames)
+
+    if nmr_frames is None:
+        return b'RIFF' + struct.pack('<I', 0xFFFFFFFF) + b'WAVE' + chunks + b'data' + struct.pack('<I', 0xFFFFFFFF)
+
+    data_size = nmr_frames * block_align
+    return (b'RIFF' + struct.pack('<I', 4 + len(chunks) + 8 + data_size) + b'WAVE' + chunks
+            + b'data' + struct.pack('<I', data_size))
+
+
+def to_pcm_bytes(samples: np.ndarray, float_samples: bool = False) -> bytes:
+    """Convert samples to the data of a WAV file.
+
+    Args:
+        samples: the samples, as an array of shape (nmr_frames, nmr_channels), in the range [-1, 1].
+        float_samples: if set, we return 32 bit floating point samples, else we clip to 16 bit integer samples.
+
+    Returns:
+        The interleaved little endian samples.
+    """
+    if float_samples:
+        return np.asarray(samples, dtype='<f4').tobytes()
+    return np.clip(np.round(np.asarray(samples) * 32768), -32768, 32767).astype('<i2').tobytes()
+
+
+def _extend_window(window: np.ndarray, length: int) -> np.ndarray:
+    """Extend a window of samples with silence up to the given length, if it is shorter."""
+    if length <= len(window):
+        return window
+    return np.concatenate([window, np.zeros((length - len(window), window.shape[1]), dtype=np.float32)])
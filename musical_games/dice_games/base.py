@@ -7,16 +7,25 @@ __email__ = 'robbert@xkls.nl'
 __licence__ = 'LGPL v3'
 
 import math
-import random
+import os
+import re
+import time
+import threading
+from collections import OrderedDict
 from abc import ABCMeta, abstractmethod
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from fractions import Fraction
 from functools import reduce
 from operator import mul
 from pathlib import Path
-from typing import Self, TypeAlias, Any
+from typing import Self, TypeAlias, Any, Hashable, Callable, Iterator
 
 from frozendict import frozendict
 import jinja2
+import numpy as np
+
+from musical_games.dice_games.midi import (BarEvents, MidiNote, MidiTrack, default_ticks_per_quarter, merge_tied_notes,
+                                           parse_lilypond_bar, write_midi_file)
 
 
 int_bar_index: TypeAlias = int
@@ -45,6 +54,15 @@ class DiceGame(metaclass=ABCMeta):
             The title of the dice game.
         """
 
+    def warm(self):
+        """Load all data of this dice game which may otherwise be loaded lazily on first use.
+
+        Implementing dice games may defer loading their bars and templates until they are needed. Calling this
+        method loads everything up front, for instance in a server before handling any requests.
+        """
+        for bar_collection in self.get_bar_collections().values():
+            bar_collection.get_synchronous_bar_sequences()
+
     @abstractmethod
     def get_dice_table_names(self) -> list[str_dice_table_name]:
         """Get a list of dice table names in this dice game.
@@ -85,40 +103,409 @@ class DiceGame(metaclass=ABCMeta):
         """
 
     @abstractmethod
-    def get_duplicate_dice_table_elements(self, dice_table_name: str_dice_table_name) -> list[set[DiceTableElement]]:
+    def get_duplicate_dice_table_elements(self, dice_table_name: str_dice_table_name,
+                                          staff_name: str_staff_name | None = None) -> list[set[DiceTableElement]]:
         """Get a list of all the duplicate bars for a specific dice table.
 
         For a given dice table, this should scan for duplicate measures in the musical entries corresponding to each
         element in the dice table. We return each set of duplicates as a tuple containing all the dice table elements
         having duplicates.
 
+        Args:
+            dice_table_name: the name of the dice table
+            staff_name: if given, only compare the bars of this staff. Dice table elements may select identical bars
+                in one staff but not in another, which matters if the staffs are shuffled independently.
+
         Returns:
             A list of duplicate dice table elements.
         """
 
     @abstractmethod
-    def count_unique_compositions(self, count_duplicates=False) -> int:
+    def count_unique_compositions(self, count_duplicates=False, shuffle_staffs: bool = False) -> int:
         """Count the number of unique compositions possible by this dice game.
 
         Args:
             count_duplicates (boolean): if set to False, we exclude all identical bars in a column of the dice matrix.
+            shuffle_staffs: if the staffs within a dice table are selected independently, as in
+                :meth:`get_random_bar_selection`. If set, the uniqueness of the bars is judged per staff, since two
+                dice table elements may select identical bars in one staff but not in another.
 
         Returns:
             The number of unique compositions
         """
 
+    def get_unique_dice_table_elements(self, dice_table_name: str_dice_table_name,
+                                       staff_name: str_staff_name | None = None) -> list[list[DiceTableElement]]:
+        """Get, per column of a dice table, one dice table element for each unique bar in that column.
+
+        Of the dice table elements in a column selecting identical bars, only the first (in row order) is returned.
+        The unique compositions counted by :meth:`count_unique_compositions` are all the combinations of these
+        elements, over all tables, or over all tables and staffs when shuffling staffs.
+
+        Args:
+            dice_table_name: the name of the dice table
+            staff_name: if given, only compare the bars of this staff, see
+                :meth:`get_duplicate_dice_table_elements`.
+
+        Returns:
+            Per column (throw) the list of dice table elements selecting unique bars.
+        """
+        dice_table = self.get_dice_tables()[dice_table_name]
+        unique_elements = [{} for _ in range(dice_table.nmr_throws)]
+        for dice_table_element, bar in zip(dice_table.get_elements(),
+                                           self._get_element_bars(dice_table_name, staff_name)):
+            unique_elements[dice_table_element.column_ind].setdefault(bar, dice_table_element)
+        return [list(column_elements.values()) for column_elements in unique_elements]
+
+    def enumerate_unique_compositions(self, start: int = 0, stop: int | None = None,
+                                      shuffle_staffs: bool = False) -> UniqueCompositionEnumerator:
+        """Enumerate the unique compositions of this dice game, each exactly once.
+
+        The unique compositions are numbered from 0 up to :meth:`count_unique_compositions`, using the mixed-radix
+        encoding of :meth:`selection_to_rank` with, per throw, the unique dice table elements of
+        :meth:`get_unique_dice_table_elements` as digits. Using the start and stop, the enumeration can be split
+        over multiple processes or machines, see also :meth:`UniqueCompositionEnumerator.shard`.
+
+        Args:
+            start: the rank of the first unique composition to enumerate
+            stop: the rank after the last unique composition to enumerate, defaults to all remaining compositions.
+            shuffle_staffs: if the staffs within a dice table are selected independently. If set, every staff
+                contributes its own throws, with the unique elements judged per staff.
+
+        Returns:
+            An iterable over the bar selections of the unique compositions, in order of their rank.
+        """
+        if shuffle_staffs:
+            unique_elements = {
+                table_name: {staff_name: self.get_unique_dice_table_elements(table_name, staff_name)
+                             for staff_name in self.get_staff_names()[table_name]}
+                for table_name in self.get_dice_tables()}
+        else:
+            unique_elements = {table_name: self.get_unique_dice_table_elements(table_name)
+                               for table_name in self.get_dice_tables()}
+        return UniqueCompositionEnumerator(unique_elements, start=start, stop=stop)
+
+    def get_composition_probability(self, bar_selection: BarSelection, shuffle_staffs: bool = False,
+                                    count_duplicates: bool = False) -> Fraction:
+        """Get the exact probability of throwing a composition with the dices.
+
+        This is the product, over all throws, of the probability of the thrown dice sum, see
+        :meth:`DiceTable.get_row_probabilities`.
+
+        Args:
+            bar_selection: the bar selection of the composition
+            shuffle_staffs: if the staffs within a dice table are thrown independently. If set, every staff
+                contributes its own throws to the probability.
+            count_duplicates: if set to False, we consider the composition as the music it produces, summing per throw
+                the probabilities of all the dice table elements selecting identical bars. If set to True, we
+                consider the composition as the exact dice table elements selected.
+
+        Returns:
+            The probability of the composition.
+        """
+        probability = Fraction(1)
+        for table_name, staff_name, dice_table in self._get_rank_digit_groups(shuffle_staffs):
+            if count_duplicates:
+                row_probabilities = dice_table.get_row_probabilities()
+                for element in bar_selection.get_dice_table_elements(table_name, staff_name):
+                    probability *= row_probabilities[element.row_ind]
+            else:
+                element_probabilities = self._get_dice_table_element_probabilities(table_name, staff_name)
+                for element in bar_selection.get_dice_table_elements(table_name, staff_name):
+                    probability *= element_probabilities[element.column_ind][element.row_ind]
+        return probability
+
     @abstractmethod
-    def get_random_bar_selection(self, seed: int = None, shuffle_staffs: bool = False) -> BarSelection:
+    def get_random_bar_selection(self, seed: int | np.random.SeedSequence | None = None,
+                                 shuffle_staffs: bool = False, dice_weighted: bool = False) -> BarSelection:
         """Get a random bar selection we may use to create a composition.
 
+        The random numbers are drawn from generators owned by this call, one independent stream per dice table (and
+        per staff when shuffling staffs), all derived from the root seed. The result equals the first selection of
+        :meth:`get_random_bar_selections` with the same seed.
+
         Args:
             shuffle_staffs: if we want to shuffle the staffs within a dice table independently.
-            seed: a seed for the random number generator.
+            seed: the root seed for the random number generators. Parallel workers can use the children of one
+                :class:`numpy.random.SeedSequence` to draw reproducible and non-overlapping selections.
+            dice_weighted: if set, we select the rows with the probabilities of the thrown dice sums, as when
+                actually throwing the dices. By default every row is equally likely.
 
         Returns:
             A bar selection object with the selected bars to form a composition.
         """
 
+    def get_random_row_indices(self, nmr_selections: int, seed: int | np.random.SeedSequence | None = None,
+                               shuffle_staffs: bool = False,
+                               dice_weighted: bool = False) -> dict[str_dice_table_name, np.ndarray]:
+        """Get the dice throws of a batch of random compositions as a matrix of row indices.
+
+        This draws all the throws of all the compositions, for all the dice tables, in one vectorized pass. Each row
+        index selects the row of the dice table, per column (throw), of the dice table element in the composition.
+
+        As in :meth:`get_random_bar_selection`, each dice table (and each staff when shuffling staffs) draws from
+        its own random stream derived from the root seed.
+
+        Args:
+            nmr_selections: the number of compositions to draw
+            seed: the root seed for the random number generators.
+            shuffle_staffs: if we want to shuffle the staffs within a dice table independently.
+            dice_weighted: if set, we select the rows with the probabilities of the thrown dice sums.
+
+        Returns:
+            For each dice table an integer array with the selected row indices. Without shuffling staffs this is
+            of shape (nmr_selections, nmr_throws), with shuffling staffs it is of shape
+            (nmr_selections, nmr_staffs, nmr_throws), with the staffs in the order of :meth:`get_staff_names`.
+        """
+        row_indices = {}
+        for table_name, random_generators in self._get_random_generators(seed, shuffle_staffs).items():
+            dice_table = self.get_dice_tables()[table_name]
+            if shuffle_staffs:
+                row_indices[table_name] = np.stack(
+                    [dice_table.get_random_row_indices(nmr_selections, random_generator, dice_weighted=dice_weighted)
+                     for random_generator in random_generators.values()], axis=1)
+            else:
+                row_indices[table_name] = dice_table.get_random_row_indices(
+                    nmr_selections, random_generators, dice_weighted=dice_weighted)
+        return row_indices
+
+    def get_random_bar_selections(self, nmr_selections: int, seed: int | np.random.SeedSequence | None = None,
+                                  shuffle_staffs: bool = False, dice_weighted: bool = False) -> list[BarSelection]:
+        """Get a batch of random bar selections.
+
+        This is the batch counterpart of :meth:`get_random_bar_selection`, which draws all the dice throws in one
+        pass using :meth:`get_random_row_indices`.
+
+        Args:
+            nmr_selections: the number of bar selections to generate
+            seed: the root seed for the random number generators.
+            shuffle_staffs: if we want to shuffle the staffs within a dice table independently.
+            dice_weighted: if set, we select the rows with the probabilities of the thrown dice sums.
+
+        Returns:
+            A list of bar selections.
+        """
+        return self.row_indices_to_bar_selections(self.get_random_row_indices(
+            nmr_selections, seed=seed, shuffle_staffs=shuffle_staffs, dice_weighted=dice_weighted))
+
+    def row_indices_to_bar_selections(self, row_indices: dict[str_dice_table_name, np.ndarray]) -> list[BarSelection]:
+        """Transform a matrix of row indices into bar selections.
+
+        Args:
+            row_indices: per dice table, the row indices as returned by :meth:`get_random_row_indices`. Two dimensional
+                arrays are transformed into grouped staff selections, three dimensional arrays into per staff
+                selections.
+
+        Returns:
+            One bar selection per composition in the row indices.
+        """
+        if not len(row_indices):
+            return []
+
+        nmr_selections = len(next(iter(row_indices.values())))
+        per_staff = any(np.ndim(table_rows) == 3 for table_rows in row_indices.values())
+
+        choices = [{} for _ in range(nmr_selections)]
+        for table_name, table_rows in row_indices.items():
+            table_rows = np.asarray(table_rows)
+            dice_table = self.get_dice_tables()[table_name]
+            staff_names = self.get_staff_names()[table_name]
+
+            for selection_ind, selection_rows in enumerate(table_rows.tolist()):
+                if table_rows.ndim == 3:
+                    table_choice = {staff_name: dice_table.get_row_selection(staff_rows)
+                                    for staff_name, staff_rows in zip(staff_names, selection_rows)}
+                else:
+                    table_choice = dice_table.get_row_selection(selection_rows)
+                    if per_staff:
+                        table_choice = {staff_name: table_choice for staff_name in staff_names}
+                choices[selection_ind][table_name] = table_choice
+
+        if per_staff:
+            return [PerStaffsBarSelection(selection_choices) for selection_choices in choices]
+        return [GroupedStaffsBarSelection(selection_choices) for selection_choices in choices]
+
+    def row_indices_to_bar_indices(
+            self, row_indices: dict[str_dice_table_name, np.ndarray]) -> dict[str_dice_table_name, np.ndarray]:
+        """Transform a matrix of row indices into a matrix of the selected bar indices.
+
+        Args:
+            row_indices: per dice table, the row indices as returned by :meth:`get_random_row_indices`.
+
+        Returns:
+            Per dice table an integer array with the selected bar indices, of shape
+            (nmr_compositions, nmr_staffs, nmr_throws, max_measures_per_throw), with the staffs in the order of
+            :meth:`get_staff_names`. Row indices without a staff dimension select the same bars for all staffs. Dice
+            table elements selecting less than the maximum number of measures are padded with -1.
+        """
+        bar_indices = {}
+        for table_name, table_rows in row_indices.items():
+            table_rows = np.asarray(table_rows)
+            table_bar_indices = self._get_bar_indices_array(table_name)
+
+            if table_rows.ndim == 2:
+                nmr_staffs = len(self.get_staff_names()[table_name])
+                table_rows = np.repeat(table_rows[:, None, :], nmr_staffs, axis=1)
+
+            bar_indices[table_name] = table_bar_indices[table_rows, np.arange(table_rows.shape[-1])]
+        return bar_indices
+
+    def dice_sums_to_row_indices(
+            self, dice_sums: dict[str_dice_table_name, np.ndarray]) -> dict[str_dice_table_name, np.ndarray]:
+        """Transform a matrix of thrown dice sums into a matrix of row indices.
+
+        All dice sums of all tables are validated at once. If any are out of range, a single error reports all the
+        invalid dice sums.
+
+        Args:
+            dice_sums: per dice table, an integer array with the thrown dice sums, in the same layout as the row
+                indices of :meth:`get_random_row_indices`. That is, of shape (nmr_compositions, nmr_throws), or of
+                shape (nmr_compositions, nmr_staffs, nmr_throws) for per staff throws.
+
+        Returns:
+            Per dice table the row indices, in the same layout as the dice sums. These can be used as input to
+            :meth:`row_indices_to_bar_selections`.
+
+        Raises:
+            ValueError: if the dice sums have an invalid shape, or if any dice sum is out of range.
+        """
+        errors = []
+        row_indices = {}
+        for table_name, table_dice_sums in dice_sums.items():
+            if table_name not in self.get_dice_tables():
+                errors.append(f'Unknown dice table "{table_name}".')
+                continue
+
+            dice_table = self.get_dice_tables()[table_name]
+            table_dice_sums = np.asarray(table_dice_sums)
+            nmr_staffs = len(self.get_staff_names()[table_name])
+
+            if not np.issubdtype(table_dice_sums.dtype, np.integer) or table_dice_sums.ndim not in (2, 3) \
+                    or table_dice_sums.shape[-1] != dice_table.nmr_throws \
+                    or (table_dice_sums.ndim == 3 and table_dice_sums.shape[1] != nmr_staffs):
+                errors.append(f'Table "{table_name}": expected integer dice sums of shape (n, {dice_table.nmr_throws}) '
+                              f'or (n, {nmr_staffs}, {dice_table.nmr_throws}), '
+                              f'{table_dice_sums.dtype} array of shape {table_dice_sums.shape} given.')
+                continue
+
+            invalid = (table_dice_sums < dice_table.min_dice_value) | (table_dice_sums > dice_table.max_dice_value)
+            if invalid.any():
+                invalid_positions = np.argwhere(invalid)
+                examples = ', '.join(f'{tuple(position.tolist())}: {table_dice_sums[tuple(position)]}'
+                                     for position in invalid_positions[:5])
+                errors.append(f'Table "{table_name}": {len(invalid_positions)} dice sums out of range '
+                              f'[{dice_table.min_dice_value}, {dice_table.max_dice_value}], '
+                              f'for example at {examples}.')
+                continue
+
+            row_indices[table_name] = table_dice_sums - dice_table.min_dice_value
+
+        if errors:
+            raise ValueError('Invalid dice sums. ' + ' '.join(errors))
+        return row_indices
+
+    def dice_sums_to_bar_indices(
+            self, dice_sums: dict[str_dice_table_name, np.ndarray]) -> dict[str_dice_table_name, np.ndarray]:
+        """Transform a matrix of thrown dice sums into a matrix of the selected bar indices.
+
+        This is the vectorized counterpart of looking up each throw with :meth:`DiceTable.get_dice_throw`.
+
+        Args:
+            dice_sums: per dice table the thrown dice sums, see :meth:`dice_sums_to_row_indices`.
+
+        Returns:
+            Per dice table an integer array with the selected bar indices, of shape
+            (nmr_compositions, nmr_staffs, nmr_throws, max_measures_per_throw), with the staffs in the order of
+            :meth:`get_staff_names`. Dice sums without a staff dimension select the same bars for all staffs. Dice
+            table elements selecting less than the maximum number of measures are padded with -1.
+
+        Raises:
+            ValueError: if the dice sums have an invalid shape, or if any dice sum is out of range.
+        """
+        return self.row_indices_to_bar_indices(self.dice_sums_to_row_indices(dice_sums))
+
+    def selection_to_rank(self, bar_selection: BarSelection, shuffle_staffs: bool = False) -> int:
+        """Encode a bar selection as a single integer.
+
+        Every composition is a point in a mixed-radix number space, with one digit per throw per dice table (and per
+        staff when shuffling staffs) and as base the number of dice values of the dice table. The rank is the
+        position of the bar selection in that space, with the first throw of the first dice table as the most
+        significant digit.
+
+        Args:
+            bar_selection: the bar selection to encode
+            shuffle_staffs: if the staffs within a dice table are selected independently. If set, the rank encodes
+                the selection of each staff, else it only encodes the selection of the dice table.
+
+        Returns:
+            The rank of the bar selection, in [0, :meth:`count_ranks`).
+        """
+        rank = 0
+        for table_name, staff_name, dice_table in self._get_rank_digit_groups(shuffle_staffs):
+            for element in bar_selection.get_dice_table_elements(table_name, staff_name):
+                rank = rank * dice_table.nmr_dice_values + element.row_ind
+        return rank
+
+    def rank_to_selection(self, rank: int, shuffle_staffs: bool = False) -> BarSelection:
+        """Decode an integer rank into the bar selection it encodes.
+
+        This is the inverse of :meth:`selection_to_rank`. Every rank in [0, :meth:`count_ranks`) is valid. Since
+        duplicate bars in the dice tables are not removed from the encoding, this range is usually larger than
+        :meth:`count_unique_compositions`, and distinct ranks may decode to compositions with identical bars.
+
+        Args:
+            rank: the rank to decode
+            shuffle_staffs: if the rank encodes the selection of each staff independently.
+
+        Returns:
+            A per staff bar selection if the staffs are shuffled, else a grouped staffs bar selection.
+
+        Raises:
+            ValueError: if the rank is outside [0, :meth:`count_ranks`).
+        """
+        nmr_ranks = self.count_ranks(shuffle_staffs)
+        if not 0 <= rank < nmr_ranks:
+            raise ValueError(f'The rank should be in [0, {nmr_ranks}), {rank} given.')
+
+        digit_groups = self._get_rank_digit_groups(shuffle_staffs)
+
+        group_selections = []
+        for _, _, dice_table in reversed(digit_groups):
+            row_indices = []
+            for _ in range(dice_table.nmr_throws):
+                rank, row_ind = divmod(rank, dice_table.nmr_dice_values)
+                row_indices.append(row_ind)
+            group_selections.append(dice_table.get_row_selection(row_indices[::-1]))
+        group_selections.reverse()
+
+        if not shuffle_staffs:
+            return GroupedStaffsBarSelection({table_name: elements for (table_name, _, _), elements
+                                              in zip(digit_groups, group_selections)})
+
+        choices = {}
+        for (table_name, staff_name, _), elements in zip(digit_groups, group_selections):
+            choices.setdefault(table_name, {})[staff_name] = elements
+        return PerStaffsBarSelection(choices)
+
+    def count_ranks(self, shuffle_staffs: bool = False) -> int:
+        """Get the number of ranks used by :meth:`selection_to_rank` and :meth:`rank_to_selection`.
+
+        This is the product, over all the dice tables (and over all the staffs when shuffling staffs), of
+        ``nmr_dice_values ** nmr_throws``, that is, the number of possible bar selections including those selecting
+        identical bars.
+
+        Args:
+            shuffle_staffs: if the ranks encode the selection of each staff independently.
+
+        Returns:
+            The number of ranks, all ranks are in [0, count_ranks).
+        """
+        nmr_ranks = 1
+        for table_name, dice_table in self.get_dice_tables().items():
+            nmr_staffs = len(self.get_staff_names()[table_name]) if shuffle_staffs else 1
+            nmr_ranks *= (dice_table.nmr_dice_values ** dice_table.nmr_throws) ** nmr_staffs
+        return nmr_ranks
+
     @abstractmethod
     def bar_selection_to_bars(self,
                               bar_selection: BarSelection) -> dict[str_dice_table_name, list[SynchronousBarSequence]]:
@@ -215,32 +602,281 @@ class DiceGame(metaclass=ABCMeta):
             A lilypond score meant to be rendered as a midi
         """
 
+    def compile_composition_midi(self, bar_selection: BarSelection,
+                                 midi_settings: MidiSettings | None = None) -> bytes:
+        """Compile a composition of this dice game directly into a midi file, without typesetting it with lilypond.
+
+        This is much faster than rendering the score of :meth:`compile_composition_audio` with lilypond, at the cost
+        of a simpler performance. The notes, durations, dynamics, instruments and volumes are the same, but
+        articulations and ornaments like trills are not realized, and the tempo is fixed per section.
+
+        Args:
+            bar_selection: the selection of bars for the composition
+            midi_settings: the midi settings to use, if not set we use the default midi settings.
+
+        Returns:
+            The content of a standard midi file.
+        """
+        midi_settings = midi_settings or self.get_default_midi_settings()
+
+        notes: dict[tuple[str_dice_table_name, str_staff_name], list[MidiNote]] = {
+            (table_name, staff_name): [] for table_name, staff_names in self.get_staff_names().items()
+            for staff_name in staff_names}
+        tempo_changes = []
+        for placement in self.get_midi_bar_placements(bar_selection):
+            if not tempo_changes or tempo_changes[-1][1] != placement.tempo:
+                tempo_changes.append((placement.start, placement.tempo))
+            notes[(placement.table_name, placement.staff_name)].extend(
+                MidiNote(placement.start + note.start, note.duration, note.pitch, note.volume, note.tied)
+                for note in placement.bar_events.notes)
+
+        tracks = [MidiTrack(f'{table_name} {staff_name}',
+                            midi_settings.get_midi_instrument(table_name, staff_name),
+                            midi_settings.get_min_volume(table_name, staff_name),
+                            midi_settings.get_max_volume(table_name, staff_name),
+                            merge_tied_notes(staff_notes))
+                  for (table_name, staff_name), staff_notes in notes.items()]
+        return write_midi_file(tracks, tempo_changes)
+
+    def get_midi_sections(self) -> list[MidiSection]:
+        """Get the sections of the compositions, as played in the midi compiled by :meth:`compile_composition_midi`.
+
+        Returns:
+            The sections in the order they are played.
+        """
+        return [MidiSection((table_name,), 100) for table_name in self.get_dice_table_names()]
+
+    def get_midi_bar_placements(self, bar_selection: BarSelection) -> list[MidiBarPlacement]:
+        """Get the time line of the bars of a composition, as played in :meth:`compile_composition_midi`.
+
+        Each bar of each staff is placed at its start time, with the sections, repeats and tempi of
+        :meth:`get_midi_sections`. This allows assembling the audio of a composition from the audio of single bars.
+
+        Args:
+            bar_selection: the selection of bars for the composition
+
+        Returns:
+            The placement of each bar of each staff, ordered by section.
+        """
+        composition_bars = self.bar_selection_to_bars(bar_selection)
+        staff_names = self.get_staff_names()
+
+        placements = []
+        last_durations = {}
+        section_start = 0
+        section_start_time = 0.0
+        for section in self.get_midi_sections():
+            seconds_per_tick = 60 / (section.tempo * default_ticks_per_quarter)
+            section_end = section_start
+            for table_name in section.table_names:
+                throw_order = section.throw_order
+                if throw_order is None:
+                    throw_order = range(len(composition_bars[table_name]))
+
+                time = section_start
+                for throw_ind in throw_order:
+                    synchronous_bar_sequence = composition_bars[table_name][throw_ind]
+                    bar_end = time
+                    for staff_name in staff_names[table_name]:
+                        staff_time = time
+                        for bar in synchronous_bar_sequence.get_bar_sequence(staff_name).get_bars():
+                            bar_events = parse_lilypond_bar(
+                                bar.lilypond_str, last_durations.get((table_name, staff_name), Fraction(1, 4)))
+                            placements.append(MidiBarPlacement(
+                                table_name, staff_name, bar.lilypond_str, bar_events, staff_time,
+                                section_start_time + (staff_time - section_start) * seconds_per_tick, section.tempo))
+                            last_durations[(table_name, staff_name)] = bar_events.last_duration
+                            staff_time += bar_events.length
+                        bar_end = max(bar_end, staff_time)
+                    time = bar_end
+                section_end = max(section_end, time)
+            section_start_time += (section_end - section_start) * seconds_per_tick
+            section_start = section_end
+        return placements
+
+    def _get_random_generators(
+            self, seed: int | np.random.SeedSequence | None, shuffle_staffs: bool
+    ) -> dict[str_dice_table_name, np.random.Generator | dict[str_staff_name, np.random.Generator]]:
+        """Get independent random number generators per dice table, and per staff if shuffling staffs.
+
+        The streams are spawned from one seed sequence of the root seed, first per dice table and then per staff,
+        such that the streams of the tables and staffs, and of different root seeds, do not overlap. A given seed
+        sequence is copied before spawning, such that repeated calls with the same seed sequence are reproducible.
+
+        Args:
+            seed: the root seed
+            shuffle_staffs: if we want a generator per staff in each dice table
+
+        Returns:
+            Per dice table a random generator, or per dice table and staff if shuffling staffs.
+        """
+        if isinstance(seed, np.random.SeedSequence):
+            seed_sequence = np.random.SeedSequence(seed.entropy, spawn_key=seed.spawn_key, pool_size=seed.pool_size)
+        else:
+            seed_sequence = np.random.SeedSequence(seed)
+
+        random_generators = {}
+        for table_name, table_seed in zip(self.get_dice_tables(), seed_sequence.spawn(len(self.get_dice_tables()))):
+            if shuffle_staffs:
+                staff_names = self.get_staff_names()[table_name]
+                random_generators[table_name] = {
+                    staff_name: np.random.default_rng(staff_seed)
+                    for staff_name, staff_seed in zip(staff_names, table_seed.spawn(len(staff_names)))}
+            else:
+                random_generators[table_name] = np.random.default_rng(table_seed)
+        return random_generators
+
+    def _get_element_bars(self, dice_table_name: str_dice_table_name,
+                          staff_name: str_staff_name | None = None) -> list[SynchronousBarSequence | BarSequence]:
+        """Get the bars selected by each element of a dice table, in the order of :meth:`DiceTable.get_elements`.
+
+        The bars are compared by content, that is, by their hash and equality.
+
+        Args:
+            dice_table_name: the name of the dice table
+            staff_name: if given, get the bar sequences of this staff only, else the synchronous bar sequences.
+
+        Returns:
+            Per dice table element the bars it selects.
+        """
+        flat_dice_table = self.get_dice_tables()[dice_table_name].get_elements()
+        bar_collection = self.get_bar_collections()[dice_table_name]
+        if staff_name is None:
+            return bar_collection.get_synchronous_selection(flat_dice_table)
+        return bar_collection.get_bar_selection(staff_name, flat_dice_table)
+
+    def _get_dice_table_element_probabilities(self, dice_table_name: str_dice_table_name,
+                                              staff_name: str_staff_name | None = None) -> list[list[Fraction]]:
+        """Get per column and row of a dice table the probability of throwing the bar of that dice table element.
+
+        This sums, per column, the probabilities of all the rows selecting identical bars.
+
+        Args:
+            dice_table_name: the name of the dice table
+            staff_name: if given, merge the rows selecting identical bars in this staff, else the rows selecting
+                identical synchronous bars.
+
+        Returns:
+            Per column (throw) and per row the probability of throwing the bar of that element.
+        """
+        dice_table = self.get_dice_tables()[dice_table_name]
+        row_probabilities = dice_table.get_row_probabilities()
+        flat_dice_table = dice_table.get_elements()
+        bars = self._get_element_bars(dice_table_name, staff_name)
+
+        bar_probabilities = [{} for _ in range(dice_table.nmr_throws)]
+        for dice_table_element, bar in zip(flat_dice_table, bars):
+            column_probabilities = bar_probabilities[dice_table_element.column_ind]
+            column_probabilities[bar] = (column_probabilities.get(bar, 0)
+                                         + row_probabilities[dice_table_element.row_ind])
+
+        element_probabilities = [[Fraction(0)] * dice_table.nmr_dice_values for _ in range(dice_table.nmr_throws)]
+        for dice_table_element, bar in zip(flat_dice_table, bars):
+            element_probabilities[dice_table_element.column_ind][dice_table_element.row_ind] = \
+                bar_probabilities[dice_table_element.column_ind][bar]
+        return element_probabilities
+
+    def _get_rank_digit_groups(
+            self, shuffle_staffs: bool) -> list[tuple[str_dice_table_name, str_staff_name | None, DiceTable]]:
+        """Get the groups of digits in the mixed-radix encoding of the compositions, most significant first.
+
+        Each group holds the digits of all the throws of one dice table, or of one staff of a dice table when the
+        staffs are shuffled.
+
+        Args:
+            shuffle_staffs: if we want a digit group per staff
+
+        Returns:
+            Per digit group the dice table name, the staff name (None if not shuffling staffs) and the dice table.
+        """
+        digit_groups = []
+        for table_name, dice_table in self.get_dice_tables().items():
+            if shuffle_staffs:
+                for staff_name in self.get_staff_names()[table_name]:
+                    digit_groups.append((table_name, staff_name, dice_table))
+            else:
+                digit_groups.append((table_name, None, dice_table))
+        return digit_groups
+
+    def _get_bar_indices_array(self, dice_table_name: str_dice_table_name) -> np.ndarray:
+        """Get the dense bar indices array of a dice table, see :meth:`DiceTable.get_bar_indices_array`.
+
+        Args:
+            dice_table_name: the name of the dice table
+
+        Returns:
+            The bar indices of all elements of the dice table.
+        """
+        return self.get_dice_tables()[dice_table_name].get_bar_indices_array()
+
 
 class SimpleDiceGame(DiceGame, metaclass=ABCMeta):
+    _template_names = ('bar_overview.ly', 'single_bar.ly', 'single_dice_table_element.ly',
+                       'composition_pdf.ly', 'composition_midi.ly')
 
     def __init__(self,
                  author: str,
                  title: str,
                  dice_tables: dict[str_dice_table_name: DiceTable],
                  bar_collections: dict[str_dice_table_name, BarCollection],
-                 jinja2_environment: jinja2.Environment,
-                 default_midi_settings: MidiSettings):
+                 jinja2_environment: jinja2.Environment | Callable[[], jinja2.Environment],
+                 default_midi_settings: MidiSettings,
+                 bar_selection_cache_size: int | None = 1024,
+                 render_options: RenderOptions | None = None,
+                 midi_sections: list[MidiSection] | None = None):
         """Implementation of a simple dice game covering most standard dice games functionality.
 
+        The bars resolved by :meth:`bar_selection_to_bars` are kept in a least recently used cache, such that for
+        instance compiling both the score and the audio of a composition only resolves the bar selection once. The
+        results of :meth:`count_unique_compositions`, :meth:`get_duplicate_dice_table_elements`,
+        :meth:`get_unique_dice_table_elements` and the probabilities of :meth:`get_composition_probability` are
+        cached after their first computation.
+
+        The bar collections and the jinja2 environment may be loaded lazily, on first use. Use :meth:`warm` to load
+        everything up front.
+
         Args:
             author: the author of the dice game
             title: the title of the dice game
             dice_tables: the dice tables indexed by table name
             bar_collections: the collection of bars per table
-            jinja2_environment: the jinja2 environment we use for typesetting
+            jinja2_environment: the jinja2 environment we use for typesetting, or a factory function generating the
+                environment on first use.
             default_midi_settings: the default midi settings
+            bar_selection_cache_size: the maximum number of resolved bar selections we cache.
+                Set to 0 to disable caching, or to None for an unbounded cache.
+            render_options: the options for rendering the lilypond templates, if not set we use the defaults.
+            midi_sections: the order of the sections of the compositions when compiled directly to midi, see
+                :meth:`compile_composition_midi`. If not set, we play each dice table once, in order, at 100
+                quarter notes per minute.
         """
         self._author = author
         self._title = title
         self._dice_tables = dice_tables
         self._bar_collections = bar_collections
-        self._jinja2_environment = jinja2_environment
+        self._jinja2_environment = jinja2_environment if isinstance(jinja2_environment, jinja2.Environment) else None
+        self._jinja2_environment_factory = jinja2_environment
         self._default_midi_settings = default_midi_settings
+        self._bar_selection_cache_size = bar_selection_cache_size
+        self._bar_selection_cache: OrderedDict[FrozenBarSelection,
+                                               dict[str_dice_table_name, list[SynchronousBarSequence]]] = OrderedDict()
+        self._bar_selection_cache_hits = 0
+        self._bar_selection_cache_misses = 0
+        self._bar_selection_cache_lock = threading.Lock()
+        self._render_options = render_options or RenderOptions()
+        self._midi_sections = midi_sections or [MidiSection((table_name,), 100) for table_name in dice_tables]
+        self._compiled_templates: dict[str, CompiledCompositionTemplate] = {}
+        self._templates: dict[str, jinja2.Template] = {}
+        self._unique_composition_counts: dict[tuple[bool, bool], int] = {}
+        self._duplicate_dice_table_elements: dict[tuple[str_dice_table_name, str_staff_name | None],
+                                                  list[set[DiceTableElement]]] = {}
+        self._unique_dice_table_elements: dict[tuple[str_dice_table_name, str_staff_name | None],
+                                               list[list[DiceTableElement]]] = {}
+        self._bar_indices_arrays: dict[str_dice_table_name, np.ndarray] = {}
+        self._dice_table_element_probabilities: dict[tuple[str_dice_table_name, str_staff_name | None],
+                                                     list[list[Fraction]]] = {}
+        if self._render_options.preload_templates:
+            self._load_templates()
 
     @property
     def author(self) -> str:
@@ -250,6 +886,10 @@ class SimpleDiceGame(DiceGame, metaclass=ABCMeta):
     def title(self) -> str:
         return self._title
 
+    def warm(self):
+        super().warm()
+        self._load_templates()
+
     def get_dice_table_names(self) -> list[str_dice_table_name]:
         return list(self._dice_tables.keys())
 
@@ -262,59 +902,119 @@ class SimpleDiceGame(DiceGame, metaclass=ABCMeta):
     def get_bar_collections(self) -> dict[str_dice_table_name, BarCollection]:
         return self._bar_collections
 
-    def get_duplicate_dice_table_elements(self, dice_table_name: str_dice_table_name) -> list[set[DiceTableElement]]:
-        flat_dice_table = self._dice_tables[dice_table_name].get_elements()
-        bars = self._bar_collections[dice_table_name].get_synchronous_selection(flat_dice_table)
-
-        bars_grouped = {}
-        for dice_table_element, bar in zip(flat_dice_table, bars):
-            bar_elements = bars_grouped.setdefault(bar, set())
-            bar_elements.add(dice_table_element)
-
-        return [v for k, v in bars_grouped.items() if len(v) > 1]
-
-    def count_unique_compositions(self, count_duplicates=False) -> int:
-        def count_unique_bars(table_name: str, throw_ind: int):
-            """Count the number of unique bars for the indicated throw index (column)."""
-            dice_table_column = self._dice_tables[table_name].get_column(throw_ind)
-            bars_in_column = self._bar_collections[table_name].get_synchronous_selection(dice_table_column)
-            return len(set(bars_in_column))
-
-        table_counts = []
-        for table_name, table in self._dice_tables.items():
-            if count_duplicates:
-                table_counts.append(table.nmr_dice_values ** table.nmr_throws)
+    def get_duplicate_dice_table_elements(self, dice_table_name: str_dice_table_name,
+                                          staff_name: str_staff_name | None = None) -> list[set[DiceTableElement]]:
+        cache_key = (dice_table_name, staff_name)
+        if cache_key not in self._duplicate_dice_table_elements:
+            flat_dice_table = self._dice_tables[dice_table_name].get_elements()
+
+            bars_grouped = {}
+            for dice_table_element, bar in zip(flat_dice_table, self._get_element_bars(dice_table_name, staff_name)):
+                bar_elements = bars_grouped.setdefault(bar, set())
+                bar_elements.add(dice_table_element)
+
+            self._duplicate_dice_table_elements[cache_key] = [v for k, v in bars_grouped.items() if len(v) > 1]
+        return [set(elements) for elements in self._duplicate_dice_table_elements[cache_key]]
+
+    def count_unique_compositions(self, count_duplicates=False, shuffle_staffs: bool = False) -> int:
+        cache_key = (count_duplicates, shuffle_staffs)
+        if cache_key not in self._unique_composition_counts:
+            table_counts = []
+            for table_name, table in self._dice_tables.items():
+                if count_duplicates:
+                    nmr_staffs = len(self._bar_collections[table_name].get_staff_names()) if shuffle_staffs else 1
+                    table_counts.append(table.nmr_dice_values ** (table.nmr_throws * nmr_staffs))
+                else:
+                    staff_names = self._bar_collections[table_name].get_staff_names() if shuffle_staffs else [None]
+                    table_counts.append(reduce(mul, [len(column_elements) for staff_name in staff_names
+                                                     for column_elements
+                                                     in self.get_unique_dice_table_elements(table_name, staff_name)]))
+            self._unique_composition_counts[cache_key] = reduce(mul, table_counts)
+        return self._unique_composition_counts[cache_key]
+
+    def get_unique_dice_table_elements(self, dice_table_name: str_dice_table_name,
+                                       staff_name: str_staff_name | None = None) -> list[list[DiceTableElement]]:
+        cache_key = (dice_table_name, staff_name)
+        if cache_key not in self._unique_dice_table_elements:
+            self._unique_dice_table_elements[cache_key] = super().get_unique_dice_table_elements(
+                dice_table_name, staff_name)
+        return [list(column_elements) for column_elements in self._unique_dice_table_elements[cache_key]]
+
+    def get_random_bar_selection(self, seed: int | np.random.SeedSequence | None = None,
+                                 shuffle_staffs: bool = False, dice_weighted: bool = False) -> BarSelection:
+        choices = {}
+        for table_name, random_generators in self._get_random_generators(seed, shuffle_staffs).items():
+            dice_table = self._dice_tables[table_name]
+            if shuffle_staffs:
+                choices[table_name] = {
+                    staff_name: dice_table.get_random_selection(random_generator, dice_weighted=dice_weighted)
+                    for staff_name, random_generator in random_generators.items()}
             else:
-                table_counts.append(reduce(mul, [count_unique_bars(table_name, throw_ind)
-                                                 for throw_ind in range(table.nmr_throws)]))
-        return reduce(mul, table_counts)
+                choices[table_name] = dice_table.get_random_selection(random_generators, dice_weighted=dice_weighted)
 
-    def get_random_bar_selection(self, seed: int = None, shuffle_staffs: bool = False) -> BarSelection:
         if shuffle_staffs:
-            choices = {}
-            for table_ind, (table_name, dice_table) in enumerate(self._dice_tables.items()):
-                choices[table_name] = {}
-                for staff_ind, staff_name in enumerate(self._bar_collections[table_name].get_staff_names()):
-                    choices[table_name][staff_name] = dice_table.get_random_selection(seed + table_ind + staff_ind)
             return PerStaffsBarSelection(choices)
-        else:
-            choices = {}
-            for table_ind, (table_name, dice_table) in enumerate(self._dice_tables.items()):
-                choices[table_name] = dice_table.get_random_selection(seed + table_ind)
-            return GroupedStaffsBarSelection(choices)
+        return GroupedStaffsBarSelection(choices)
 
     def bar_selection_to_bars(self,
                               bar_selection: BarSelection) -> dict[str_dice_table_name, list[SynchronousBarSequence]]:
+        if not isinstance(bar_selection, FrozenBarSelection):
+            bar_selection = FrozenBarSelection.from_bar_selection(bar_selection, self.get_staff_names())
+
+        with self._bar_selection_cache_lock:
+            composition_bars = self._bar_selection_cache.get(bar_selection)
+            if composition_bars is not None:
+                self._bar_selection_cache_hits += 1
+                self._bar_selection_cache.move_to_end(bar_selection)
+            else:
+                self._bar_selection_cache_misses += 1
+
+        if composition_bars is None:
+            composition_bars = self._frozen_bar_selection_to_bars(bar_selection)
+            if self._bar_selection_cache_size != 0:
+                with self._bar_selection_cache_lock:
+                    self._bar_selection_cache[bar_selection] = composition_bars
+                    if (self._bar_selection_cache_size is not None
+                            and len(self._bar_selection_cache) > self._bar_selection_cache_size):
+                        self._bar_selection_cache.popitem(last=False)
+        return {table_name: list(bars) for table_name, bars in composition_bars.items()}
+
+    def get_bar_selection_cache_info(self) -> BarSelectionCacheInfo:
+        """Get the statistics of the cache of resolved bar selections used by :meth:`bar_selection_to_bars`.
+
+        Returns:
+            The number of cache hits and misses, the maximum size and the current size.
+        """
+        with self._bar_selection_cache_lock:
+            return BarSelectionCacheInfo(self._bar_selection_cache_hits, self._bar_selection_cache_misses,
+                                         self._bar_selection_cache_size, len(self._bar_selection_cache))
+
+    def _frozen_bar_selection_to_bars(
+            self, bar_selection: FrozenBarSelection) -> dict[str_dice_table_name, list[SynchronousBarSequence]]:
+        """Transform a frozen bar selection into the synchronous bar sequences it selects.
+
+        This is the uncached implementation of :meth:`bar_selection_to_bars`.
+
+        Args:
+            bar_selection: the bar selection to resolve
+
+        Returns:
+            For each dice table the bars to use as synchronous bar sequences.
+        """
         composition_bars = {table_name: [] for table_name in self._dice_tables.keys()}
 
         for table_name in self._dice_tables.keys():
-            staff_names = self._bar_collections[table_name].get_staff_names()
+            bar_collection = self._bar_collections[table_name]
+            staff_names = bar_collection.get_staff_names()
+            staff_selections = [bar_selection.dice_table_elements[table_name][staff_name] for staff_name in staff_names]
+
+            if all(staff_selection == staff_selections[0] for staff_selection in staff_selections[1:]):
+                composition_bars[table_name] = bar_collection.get_synchronous_selection(staff_selections[0])
+                continue
 
             bar_sequences_per_staff = {}
-            for staff_name in staff_names:
-                staff_selection = bar_selection.get_dice_table_elements(table_name, staff_name)
-                selected_bars = self._bar_collections[table_name].get_bar_selection(staff_name, staff_selection)
-                bar_sequences_per_staff[staff_name] = selected_bars
+            for staff_name, staff_selection in zip(staff_names, staff_selections):
+                bar_sequences_per_staff[staff_name] = bar_collection.get_bar_selection(staff_name, staff_selection)
 
             complete_bars = []
             for composition_ind in range(len(bar_sequences_per_staff[staff_names[0]])):
@@ -330,12 +1030,12 @@ class SimpleDiceGame(DiceGame, metaclass=ABCMeta):
         return self._default_midi_settings
 
     def compile_bars_overview(self, single_page: bool = False) -> LilypondScore:
-        template = self._jinja2_environment.get_template('bar_overview.ly')
+        template = self._get_template('bar_overview.ly')
         return SimpleLilypondScore(template.render(bar_collections=self._bar_collections,
                                                    render_settings={'single_page': single_page}))
 
     def compile_single_bar(self, table_name: str_dice_table_name, bar_ind: int_bar_index) -> LilypondScore:
-        template = self._jinja2_environment.get_template('single_bar.ly')
+        template = self._get_template('single_bar.ly')
         synchronous_bar_sequence = self._bar_collections[table_name].get_synchronous_bar_sequence(bar_ind)
         return SimpleLilypondScore(template.render(table_name=table_name,
                                                    synchronous_bar_sequence=synchronous_bar_sequence))
@@ -343,7 +1043,7 @@ class SimpleDiceGame(DiceGame, metaclass=ABCMeta):
     def compile_single_dice_table_element(self,
                                           table_name: str_dice_table_name,
                                           dice_table_element: DiceTableElement) -> LilypondScore:
-        template = self._jinja2_environment.get_template('single_dice_table_element.ly')
+        template = self._get_template('single_dice_table_element.ly')
         synchronous_bar_sequence = self._bar_collections[table_name].get_synchronous_selection([dice_table_element])[0]
         return SimpleLilypondScore(template.render(table_name=table_name,
                                                    synchronous_bar_sequence=synchronous_bar_sequence))
@@ -352,20 +1052,97 @@ class SimpleDiceGame(DiceGame, metaclass=ABCMeta):
                                   bar_selection: BarSelection,
                                   comment: str | None = None,
                                   single_page: bool = False) -> LilypondScore:
-        template = self._jinja2_environment.get_template('composition_pdf.ly')
         composition_bars = self.bar_selection_to_bars(bar_selection)
-        return SimpleLilypondScore(template.render(composition_bars=composition_bars,
-                                                   render_settings={'comment': comment, 'single_page': single_page}))
+        return SimpleLilypondScore(self._render_composition(
+            'composition_pdf.ly', composition_bars, (comment, single_page),
+            render_settings={'comment': comment, 'single_page': single_page}))
 
     def compile_composition_audio(self, bar_selection: BarSelection,
                                   midi_settings: MidiSettings | None = None) -> LilypondScore:
         midi_settings = midi_settings or self.get_default_midi_settings()
-        template = self._jinja2_environment.get_template('composition_midi.ly')
         composition_bars = self.bar_selection_to_bars(bar_selection)
-        return SimpleLilypondScore(template.render(composition_bars=composition_bars, midi_settings=midi_settings))
+
+        midi_settings_key = tuple((table_name, staff_name, midi_settings.get_midi_instrument(table_name, staff_name),
+                                   midi_settings.get_min_volume(table_name, staff_name),
+                                   midi_settings.get_max_volume(table_name, staff_name))
+                                  for table_name, staff_names in self.get_staff_names().items()
+                                  for staff_name in staff_names)
+        return SimpleLilypondScore(self._render_composition(
+            'composition_midi.ly', composition_bars, midi_settings_key, midi_settings=midi_settings))
+
+    def get_midi_sections(self) -> list[MidiSection]:
+        return self._midi_sections
+
+    def _render_composition(self,
+                            template_name: str,
+                            composition_bars: dict[str_dice_table_name, list[SynchronousBarSequence]],
+                            context_key: Hashable,
+                            **context: Any) -> str:
+        """Render one of the composition templates.
+
+        Depending on the render options, this either renders the jinja2 template, or the compiled template.
+
+        Args:
+            template_name: the name of the composition template
+            composition_bars: the bars of the composition
+            context_key: a hashable representation of the other context variables
+            **context: the other context variables of the template
+
+        Returns:
+            The rendered template.
+        """
+        if not self._render_options.compiled_compositions:
+            template = self._get_template(template_name)
+            return template.render(composition_bars=composition_bars, **context)
+
+        compiled_template = self._compiled_templates.get(template_name)
+        if compiled_template is None:
+            compiled_template = self._compiled_templates.setdefault(
+                template_name, CompiledCompositionTemplate(self._get_template(template_name)))
+        return compiled_template.render(composition_bars, context_key, **context)
+
+    def _get_template(self, template_name: str) -> jinja2.Template:
+        """Get one of the templates of this dice game, preloaded if enabled in the render options.
+
+        Args:
+            template_name: the name of the template
+
+        Returns:
+            The jinja2 template.
+        """
+        if template_name in self._templates:
+            return self._templates[template_name]
+        return self._get_jinja2_environment().get_template(template_name)
+
+    def _load_templates(self):
+        """Load all the templates of this dice game, such that they are ready for use."""
+        jinja2_environment = self._get_jinja2_environment()
+        for template_name in self._template_names:
+            self._templates[template_name] = jinja2_environment.get_template(template_name)
+
+    def _get_jinja2_environment(self) -> jinja2.Environment:
+        """Get the jinja2 environment, generating it on first use if a factory function was provided."""
+        if self._jinja2_environment is None:
+            self._jinja2_environment = self._jinja2_environment_factory()
+        return self._jinja2_environment
+
+    def _get_dice_table_element_probabilities(self, dice_table_name: str_dice_table_name,
+                                              staff_name: str_staff_name | None = None) -> list[list[Fraction]]:
+        cache_key = (dice_table_name, staff_name)
+        if cache_key not in self._dice_table_element_probabilities:
+            self._dice_table_element_probabilities[cache_key] = super()._get_dice_table_element_probabilities(
+                dice_table_name, staff_name)
+        return self._dice_table_element_probabilities[cache_key]
+
+    def _get_bar_indices_array(self, dice_table_name: str_dice_table_name) -> np.ndarray:
+        if dice_table_name not in self._bar_indices_arrays:
+            self._bar_indices_arrays[dice_table_name] = super()._get_bar_indices_array(dice_table_name)
+        return self._bar_indices_arrays[dice_table_name]
 
     @staticmethod
-    def _generate_jinja2_environment(data_name: str) -> jinja2.Environment:
+    def _generate_jinja2_environment(data_name: str,
+                                     render_options: RenderOptions | None = None,
+                                     jinja2_globals: dict[str, Any] | None = None) -> jinja2.Environment:
         """Generate a standard jinja2 environment for a musical game.
 
         This assumes the lilypond templates for the dice game are kept in the package in the data directory:
@@ -374,16 +1151,30 @@ class SimpleDiceGame(DiceGame, metaclass=ABCMeta):
 
         Args:
             data_name: the data name of this dice games' data
+            render_options: the render options, used for the template reloading and bytecode caching.
+            jinja2_globals: additional global variables or functions to add to the environment.
 
         Returns:
             A jinj2 environment to provide to the dice game.
         """
+        render_options = render_options or RenderOptions()
+
         template_loader = jinja2.ChoiceLoader([
             jinja2.PackageLoader('musical_games', f'data/dice_games/{data_name}/lilypond'),
             jinja2.PackageLoader('musical_games', 'data/lilypond_utils'),
         ])
-        env_options = SimpleDiceGame._standard_jinja2_environment_options() | {'loader': template_loader}
-        return jinja2.Environment(**env_options)
+        env_options = SimpleDiceGame._standard_jinja2_environment_options() | {
+            'loader': template_loader,
+            'auto_reload': render_options.auto_reload
+        }
+        if render_options.bytecode_cache:
+            if render_options.bytecode_cache_dir is not None:
+                os.makedirs(render_options.bytecode_cache_dir, exist_ok=True)
+            env_options['bytecode_cache'] = jinja2.FileSystemBytecodeCache(render_options.bytecode_cache_dir)
+
+        jinja2_environment = jinja2.Environment(**env_options)
+        jinja2_environment.globals.update(jinja2_globals or {})
+        return jinja2_environment
 
     @staticmethod
     def _standard_jinja2_environment_options():
@@ -403,6 +1194,184 @@ class SimpleDiceGame(DiceGame, metaclass=ABCMeta):
         )
 
 
+class UniqueCompositionEnumerator:
+
+    def __init__(self,
+                 unique_elements: (dict[str_dice_table_name, list[list[DiceTableElement]]]
+                                   | dict[str_dice_table_name, dict[str_staff_name, list[list[DiceTableElement]]]]),
+                 start: int = 0,
+                 stop: int | None = None):
+        """Iterable over a range of the unique compositions of a dice game.
+
+        Each composition is a combination of one dice table element per throw per dice table, numbered by a
+        mixed-radix rank with the first throw of the first dice table as most significant digit. Iterating yields the
+        bar selections from the start rank up to the stop rank, stepping a counter per throw from one composition to
+        the next, such that the enumeration runs in constant memory.
+
+        If the unique elements are given per staff, every staff contributes its own throws, after the throws of the
+        staffs before it, and the compositions are yielded as :class:`PerStaffsBarSelection`.
+
+        The number of compositions enumerated so far and the throughput are available during and after iteration.
+
+        Args:
+            unique_elements: per dice table, per throw, the dice table elements to combine. Alternatively, per dice
+                table, per staff, per throw the dice table elements to combine.
+            start: the rank of the first composition to enumerate
+            stop: the rank after the last composition to enumerate, defaults to the total number of compositions.
+
+        Raises:
+            ValueError: if the start and stop do not form a valid range of ranks.
+        """
+        self._unique_elements = unique_elements
+        self._per_staff = any(isinstance(table_elements, dict) for table_elements in unique_elements.values())
+
+        digit_groups = {}
+        for table_name, table_elements in unique_elements.items():
+            if self._per_staff:
+                for staff_name, staff_elements in table_elements.items():
+                    digit_groups[(table_name, staff_name)] = staff_elements
+            else:
+                digit_groups[(table_name, None)] = table_elements
+
+        self._digits = [column_elements for group_elements in digit_groups.values()
+                        for column_elements in group_elements]
+        self._group_slices = {}
+        digit_ind = 0
+        for group_key, group_elements in digit_groups.items():
+            self._group_slices[group_key] = slice(digit_ind, digit_ind + len(group_elements))
+            digit_ind += len(group_elements)
+
+        self._nmr_ranks = reduce(mul, [len(column_elements) for column_elements in self._digits], 1)
+        self._start = start
+        self._stop = self._nmr_ranks if stop is None else stop
+        if not 0 <= self._start <= self._stop <= self._nmr_ranks:
+            raise ValueError(f'The start and stop should satisfy 0 <= start <= stop <= {self._nmr_ranks}, '
+                             f'[{start}, {stop}) given.')
+
+        self._nmr_enumerated = 0
+        self._start_time = None
+        self._end_time = None
+
+    @property
+    def start(self) -> int:
+        """The rank of the first composition in this enumeration."""
+        return self._start
+
+    @property
+    def stop(self) -> int:
+        """The rank after the last composition in this enumeration."""
+        return self._stop
+
+    @property
+    def nmr_ranks(self) -> int:
+        """The total number of compositions, in all shards."""
+        return self._nmr_ranks
+
+    @property
+    def nmr_enumerated(self) -> int:
+        """The number of compositions enumerated so far, in the current or last iteration."""
+        return self._nmr_enumerated
+
+    @property
+    def elapsed_time(self) -> float:
+        """The time in seconds spent in the current or last iteration."""
+        if self._start_time is None:
+            return 0.0
+        return (self._end_time or time.perf_counter()) - self._start_time
+
+    @property
+    def throughput(self) -> float:
+        """The number of compositions enumerated per second, in the current or last iteration."""
+        elapsed_time = self.elapsed_time
+        return self._nmr_enumerated / elapsed_time if elapsed_time > 0 else 0.0
+
+    @property
+    def nmr_compositions(self) -> int:
+        """The number of compositions in this enumeration, from the start up to the stop rank."""
+        return self._stop - self._start
+
+    def shard(self, shard_ind: int, nmr_shards: int) -> Self:
+        """Get one of a number of equally sized parts of this enumeration.
+
+        Args:
+            shard_ind: the index of the shard, in [0, nmr_shards)
+            nmr_shards: the number of shards to split this enumeration into
+
+        Returns:
+            An enumeration over the compositions of the requested shard.
+
+        Raises:
+            ValueError: if the shard index is out of range.
+        """
+        if not 0 <= shard_ind < nmr_shards:
+            raise ValueError(f'The shard index should be in [0, {nmr_shards}), {shard_ind} given.')
+        shard_start = self._start + self.nmr_compositions * shard_ind // nmr_shards
+        shard_stop = self._start + self.nmr_compositions * (shard_ind + 1) // nmr_shards
+        return type(self)(self._unique_elements, start=shard_start, stop=shard_stop)
+
+    def rank_to_selection(self, rank: int) -> BarSelection:
+        """Get the bar selection of the composition at the given rank.
+
+        Args:
+            rank: the rank of the composition, in [0, nmr_ranks)
+
+        Returns:
+            The bar selection of that composition.
+
+        Raises:
+            ValueError: if the rank is out of range.
+        """
+        if not 0 <= rank < self._nmr_ranks:
+            raise ValueError(f'The rank should be in [0, {self._nmr_ranks}), {rank} given.')
+        return self._to_bar_selection([column_elements[digit] for column_elements, digit
+                                       in zip(self._digits, self._rank_to_digits(rank))])
+
+    def __iter__(self) -> Iterator[BarSelection]:
+        self._nmr_enumerated = 0
+        self._start_time = time.perf_counter()
+        self._end_time = None
+
+        if self._start < self._stop:
+            counter = self._rank_to_digits(self._start)
+            selected_elements = [column_elements[digit] for column_elements, digit in zip(self._digits, counter)]
+            bases = [len(column_elements) for column_elements in self._digits]
+
+            for _ in range(self._stop - self._start):
+                yield self._to_bar_selection(selected_elements)
+                self._nmr_enumerated += 1
+
+                digit_ind = len(counter) - 1
+                while digit_ind >= 0:
+                    counter[digit_ind] += 1
+                    if counter[digit_ind] < bases[digit_ind]:
+                        selected_elements[digit_ind] = self._digits[digit_ind][counter[digit_ind]]
+                        break
+                    counter[digit_ind] = 0
+                    selected_elements[digit_ind] = self._digits[digit_ind][0]
+                    digit_ind -= 1
+
+        self._end_time = time.perf_counter()
+
+    def _rank_to_digits(self, rank: int) -> list[int]:
+        """Decode a rank into the digit (element index) of each throw, most significant first."""
+        digits = []
+        for column_elements in reversed(self._digits):
+            rank, digit = divmod(rank, len(column_elements))
+            digits.append(digit)
+        return digits[::-1]
+
+    def _to_bar_selection(self, selected_elements: list[DiceTableElement]) -> BarSelection:
+        """Create the bar selection from the selected element of each throw."""
+        if not self._per_staff:
+            return GroupedStaffsBarSelection({table_name: selected_elements[group_slice]
+                                              for (table_name, _), group_slice in self._group_slices.items()})
+
+        choices = {}
+        for (table_name, staff_name), group_slice in self._group_slices.items():
+            choices.setdefault(table_name, {})[staff_name] = selected_elements[group_slice]
+        return PerStaffsBarSelection(choices)
+
+
 class Bar(metaclass=ABCMeta):
     """Representation of a single bar, of a single staff."""
 
@@ -751,10 +1720,14 @@ class SimpleSynchronousBar(SynchronousBar):
 class SimpleSynchronousBarSequence(SynchronousBarSequence):
     """Representation of a synchronous bar sequence.
 
+    The bar sequence of each staff is computed on first request and then reused.
+
     Args:
         synchronous_bars: sequence of synchronous bars
     """
     synchronous_bars: tuple[SynchronousBar, ...]
+    _bar_sequences: dict[str_staff_name, BarSequence] | None = field(init=False, default=None,
+                                                                       repr=False, compare=False)
 
     @classmethod
     def from_synchronous_bar_sequences(cls, synchronous_bar_sequences: list[SynchronousBarSequence]) -> Self:
@@ -792,7 +1765,10 @@ class SimpleSynchronousBarSequence(SynchronousBarSequence):
             for staff_name, bar_sequence in staff_to_bar_sequences.items():
                 bars_by_staff[staff_name] = bar_sequence.get_bar(ind)
             synchronous_bars.append(SimpleSynchronousBar(frozendict(bars_by_staff)))
-        return cls(tuple(synchronous_bars))
+
+        synchronous_bar_sequence = cls(tuple(synchronous_bars))
+        object.__setattr__(synchronous_bar_sequence, '_bar_sequences', dict(staff_to_bar_sequences))
+        return synchronous_bar_sequence
 
     @property
     def nmr_bars_in_sequence(self) -> int:
@@ -810,10 +1786,11 @@ class SimpleSynchronousBarSequence(SynchronousBarSequence):
         return list(self.synchronous_bars)
 
     def get_bar_sequence(self, staff_name: str_staff_name) -> BarSequence:
-        bars = []
-        for ind in range(self.nmr_bars_in_sequence):
-            bars.append(self.synchronous_bars[ind].get_bar(staff_name))
-        return SimpleBarSequence(tuple(bars))
+        if self._bar_sequences is None:
+            object.__setattr__(self, '_bar_sequences', {
+                name: SimpleBarSequence(tuple(sync_bar.get_bar(name) for sync_bar in self.synchronous_bars))
+                for name in self.get_staff_names()})
+        return self._bar_sequences[staff_name]
 
 
 @dataclass(frozen=True, slots=True)
@@ -823,10 +1800,27 @@ class SimpleBarCollection(BarCollection):
     The bars are stored in a dictionary such that we can store the bars with their dice table label instead
     of a numerical index.
 
+    On construction, we precompute the staff names and the bar sequences of each staff, such that all lookups
+    afterwards are dictionary lookups. The returned lists and dictionaries are shared and should not be modified.
+
     Args:
         bar_collection: the collection of synchronous bar sequences indexed by their bar index.
     """
     bar_collection: dict[int_bar_index, SynchronousBarSequence]
+    _staff_names: list[str_staff_name] = field(init=False, repr=False, compare=False)
+    _bar_sequences: dict[str_staff_name, dict[int_bar_index, BarSequence]] = field(init=False, repr=False,
+                                                                                  compare=False)
+
+    def __post_init__(self):
+        staff_names = []
+        if len(self.bar_collection):
+            staff_names = next(iter(self.bar_collection.values())).get_staff_names()
+        object.__setattr__(self, '_staff_names', staff_names)
+
+        object.__setattr__(self, '_bar_sequences', {
+            staff_name: {bar_index: sync_bar_sequence.get_bar_sequence(staff_name)
+                         for bar_index, sync_bar_sequence in self.bar_collection.items()}
+            for staff_name in staff_names})
 
     @property
     def nmr_bars(self) -> int:
@@ -843,41 +1837,247 @@ class SimpleBarCollection(BarCollection):
         return self.bar_collection[bar_index]
 
     def get_staff_names(self) -> list[str_staff_name]:
-        if self.nmr_bars == 0:
-            return []
-        first_sync_bar = self.bar_collection[list(self.bar_collection.keys())[0]]
-        return first_sync_bar.get_staff_names()
+        return self._staff_names
 
     def get_bar_sequences(self, staff_name: str_staff_name) -> dict[int_bar_index, BarSequence]:
-        bar_sequences = {}
-        for bar_index, sync_bar_sequence in self.bar_collection.items():
-            bar_sequences[bar_index] = sync_bar_sequence.get_bar_sequence(staff_name)
-        return bar_sequences
+        return self._bar_sequences[staff_name]
 
     def get_bar_sequence(self, staff_name: str_staff_name, bar_index: int_bar_index) -> BarSequence:
-        return self.bar_collection[bar_index].get_bar_sequence(staff_name)
+        return self._bar_sequences[staff_name][bar_index]
 
     def get_synchronous_selection(self, dice_table_elements: list[DiceTableElement]) -> list[SynchronousBarSequence]:
         bars = []
         for element in dice_table_elements:
-            bar_tuplets = []
-            for bar_index in element.get_bar_indices():
-                bar_tuplets.append(self.get_synchronous_bar_sequence(bar_index))
-            bars.append(SimpleSynchronousBarSequence.from_synchronous_bar_sequences(bar_tuplets))
+            bar_indices = element.get_bar_indices()
+            if len(bar_indices) == 1:
+                bars.append(self.bar_collection[bar_indices[0]])
+            else:
+                bars.append(SimpleSynchronousBarSequence.from_synchronous_bar_sequences(
+                    [self.bar_collection[bar_index] for bar_index in bar_indices]))
         return bars
 
     def get_bar_selection(self,
                           staff_name: str_staff_name,
                           dice_table_elements: list[DiceTableElement]) -> list[BarSequence]:
+        bar_sequences = self._bar_sequences[staff_name]
+
         bars = []
         for element in dice_table_elements:
-            bar_tuplets = []
-            for bar_index in element.get_bar_indices():
-                bar_tuplets.append(self.get_bar_sequence(staff_name, bar_index))
-            bars.append(SimpleBarSequence.from_bar_sequences(bar_tuplets))
+            bar_indices = element.get_bar_indices()
+            if len(bar_indices) == 1:
+                bars.append(bar_sequences[bar_indices[0]])
+            else:
+                bars.append(SimpleBarSequence.from_bar_sequences([bar_sequences[bar_index]
+                                                                  for bar_index in bar_indices]))
         return bars
 
 
+class InternedBarCollection(BarCollection):
+
+    def __init__(self,
+                 staff_names: list[str_staff_name],
+                 bar_indices: np.ndarray,
+                 sequence_offsets: np.ndarray,
+                 string_ids: np.ndarray,
+                 strings: tuple[str, ...],
+                 annotation_ids: np.ndarray | None = None,
+                 annotations: tuple[BarAnnotation | None, ...] | None = None):
+        """Columnar representation of a collection of bars, with all lilypond strings interned in a string table.
+
+        Instead of storing an object per bar, this stores one shared staff schema and a few compact integer arrays.
+        All synchronous bars of all bar sequences are stored as consecutive rows, with one column per staff. Bar
+        sequence ``i`` (with bar index ``bar_indices[i]``) spans the rows ``sequence_offsets[i]`` up to
+        ``sequence_offsets[i + 1]``. Each cell holds an index into the string table, and optionally an index into the
+        table of annotations.
+
+        Bar objects are only created when they are requested, after which they are reused for all further lookups. The
+        same holds for the merged bar sequences of dice table elements selecting multiple bars.
+
+        Args:
+            staff_names: the names of the staffs, the columns of the string ids.
+            bar_indices: the bar indices, of shape (nmr_bars,)
+            sequence_offsets: the first row of each bar sequence, of shape (nmr_bars + 1,)
+            string_ids: for each synchronous bar and staff the index into the strings, of shape (nmr_rows, nmr_staffs)
+            strings: the table of unique lilypond strings
+            annotation_ids: for each synchronous bar and staff the index into the annotations
+            annotations: the table of unique annotations
+        """
+        self._staff_names = tuple(staff_names)
+        self._staff_columns = {staff_name: ind for ind, staff_name in enumerate(self._staff_names)}
+        self._bar_indices = bar_indices
+        self._bar_positions = {bar_index: ind for ind, bar_index in enumerate(bar_indices.tolist())}
+        self._sequence_offsets = sequence_offsets
+        self._string_ids = string_ids
+        self._strings = strings
+        self._annotation_ids = annotation_ids
+        self._annotations = annotations
+
+        self._bars: dict[tuple[int, int], Bar] = {}
+        self._bar_sequences: dict[tuple[int, int], BarSequence] = {}
+        self._synchronous_bar_sequences: dict[int, SynchronousBarSequence] = {}
+        self._merged_bar_sequences: dict[tuple[int, tuple[int_bar_index, ...]], BarSequence] = {}
+        self._merged_synchronous_bar_sequences: dict[tuple[int_bar_index, ...], SynchronousBarSequence] = {}
+
+    @classmethod
+    def from_lilypond_strings(cls,
+                              staff_names: list[str_staff_name],
+                              lilypond_strings: dict[int_bar_index, list[list[str]]],
+                              annotations: dict[int_bar_index, list[list[BarAnnotation | None]]] | None = None
+                              ) -> Self:
+        """Construct this bar collection from the lilypond strings of each bar.
+
+        Args:
+            staff_names: the names of the staffs
+            lilypond_strings: per bar index, for each bar in the sequence a list with per staff the lilypond string.
+            annotations: optional annotations, in the same layout as the lilypond strings.
+
+        Returns:
+            A new bar collection with the strings and annotations interned.
+        """
+        bar_indices = list(lilypond_strings)
+
+        string_table = {}
+        annotation_table = {}
+        sequence_offsets = [0]
+        string_ids = []
+        annotation_ids = []
+
+        for bar_index in bar_indices:
+            for sequence_ind, staff_strings in enumerate(lilypond_strings[bar_index]):
+                string_ids.append([string_table.setdefault(bar_str, len(string_table)) for bar_str in staff_strings])
+                if annotations is not None:
+                    annotation_ids.append([annotation_table.setdefault(annotation, len(annotation_table))
+                                           for annotation in annotations[bar_index][sequence_ind]])
+            sequence_offsets.append(len(string_ids))
+
+        id_dtype = np.min_scalar_type(max(len(string_table), len(annotation_table), 1))
+        return cls(staff_names,
+                   np.array(bar_indices, dtype=np.int32),
+                   np.array(sequence_offsets, dtype=np.int32),
+                   np.array(string_ids, dtype=id_dtype).reshape((-1, len(staff_names))),
+                   tuple(string_table),
+                   np.array(annotation_ids, dtype=id_dtype).reshape((-1, len(staff_names)))
+                   if annotations is not None else None,
+                   tuple(annotation_table) if annotations is not None else None)
+
+    @classmethod
+    def from_bar_collection(cls, bar_collection: BarCollection) -> Self:
+        """Construct this bar collection from another bar collection.
+
+        Args:
+            bar_collection: the bar collection to convert.
+
+        Returns:
+            A new bar collection with the same bars.
+        """
+        staff_names = bar_collection.get_staff_names()
+
+        lilypond_strings = {}
+        annotations = {}
+        for bar_index, synchronous_bar_sequence in bar_collection.get_synchronous_bar_sequences().items():
+            sync_bars = synchronous_bar_sequence.get_synchronous_bars()
+            lilypond_strings[bar_index] = [[sync_bar.get_bar(staff_name).lilypond_str for staff_name in staff_names]
+                                           for sync_bar in sync_bars]
+            annotations[bar_index] = [[sync_bar.get_bar(staff_name).get_annotation() for staff_name in staff_names]
+                                      for sync_bar in sync_bars]
+
+        has_annotations = any(annotation is not None for sequence_annotations in annotations.values()
+                              for staff_annotations in sequence_annotations for annotation in staff_annotations)
+        return cls.from_lilypond_strings(staff_names, lilypond_strings, annotations if has_annotations else None)
+
+    @property
+    def nmr_bars(self) -> int:
+        return len(self._bar_indices)
+
+    @property
+    def maximum_bar_ind(self) -> int:
+        return self.nmr_bars + 1
+
+    def get_synchronous_bar_sequences(self) -> dict[int_bar_index, SynchronousBarSequence]:
+        return {bar_index: self._get_synchronous_bar_sequence(position)
+                for bar_index, position in self._bar_positions.items()}
+
+    def get_synchronous_bar_sequence(self, bar_index: int_bar_index) -> SynchronousBarSequence:
+        return self._get_synchronous_bar_sequence(self._bar_positions[bar_index])
+
+    def get_staff_names(self) -> list[str_staff_name]:
+        return list(self._staff_names)
+
+    def get_bar_sequences(self, staff_name: str_staff_name) -> dict[int_bar_index, BarSequence]:
+        column = self._staff_columns[staff_name]
+        return {bar_index: self._get_bar_sequence(column, position)
+                for bar_index, position in self._bar_positions.items()}
+
+    def get_bar_sequence(self, staff_name: str_staff_name, bar_index: int_bar_index) -> BarSequence:
+        return self._get_bar_sequence(self._staff_columns[staff_name], self._bar_positions[bar_index])
+
+    def get_synchronous_selection(self, dice_table_elements: list[DiceTableElement]) -> list[SynchronousBarSequence]:
+        bars = []
+        for element in dice_table_elements:
+            bar_indices = element.get_bar_indices()
+            if len(bar_indices) == 1:
+                bars.append(self.get_synchronous_bar_sequence(bar_indices[0]))
+            else:
+                merged_sequence = self._merged_synchronous_bar_sequences.get(bar_indices)
+                if merged_sequence is None:
+                    merged_sequence = self._merged_synchronous_bar_sequences.setdefault(
+                        bar_indices, SimpleSynchronousBarSequence.from_synchronous_bar_sequences(
+                            [self.get_synchronous_bar_sequence(bar_index) for bar_index in bar_indices]))
+                bars.append(merged_sequence)
+        return bars
+
+    def get_bar_selection(self,
+                          staff_name: str_staff_name,
+                          dice_table_elements: list[DiceTableElement]) -> list[BarSequence]:
+        column = self._staff_columns[staff_name]
+        bars = []
+        for element in dice_table_elements:
+            bar_indices = element.get_bar_indices()
+            if len(bar_indices) == 1:
+                bars.append(self._get_bar_sequence(column, self._bar_positions[bar_indices[0]]))
+            else:
+                merged_sequence = self._merged_bar_sequences.get((column, bar_indices))
+                if merged_sequence is None:
+                    merged_sequence = self._merged_bar_sequences.setdefault(
+                        (column, bar_indices), SimpleBarSequence.from_bar_sequences(
+                            [self._get_bar_sequence(column, self._bar_positions[bar_index])
+                             for bar_index in bar_indices]))
+                bars.append(merged_sequence)
+        return bars
+
+    def _get_bar(self, row: int, column: int) -> Bar:
+        """Get the (interned) bar object at the given row and staff column."""
+        string_id = int(self._string_ids[row, column])
+        annotation_id = -1 if self._annotation_ids is None else int(self._annotation_ids[row, column])
+
+        bar = self._bars.get((string_id, annotation_id))
+        if bar is None:
+            annotation = None if self._annotations is None else self._annotations[annotation_id]
+            bar = self._bars.setdefault((string_id, annotation_id), SimpleBar(self._strings[string_id], annotation))
+        return bar
+
+    def _get_bar_sequence(self, column: int, position: int) -> BarSequence:
+        """Get the bar sequence of one staff column at the given position in the bar indices."""
+        bar_sequence = self._bar_sequences.get((column, position))
+        if bar_sequence is None:
+            rows = range(self._sequence_offsets[position], self._sequence_offsets[position + 1])
+            bar_sequence = self._bar_sequences.setdefault(
+                (column, position), SimpleBarSequence(tuple(self._get_bar(row, column) for row in rows)))
+        return bar_sequence
+
+    def _get_synchronous_bar_sequence(self, position: int) -> SynchronousBarSequence:
+        """Get the synchronous bar sequence at the given position in the bar indices."""
+        synchronous_bar_sequence = self._synchronous_bar_sequences.get(position)
+        if synchronous_bar_sequence is None:
+            rows = range(self._sequence_offsets[position], self._sequence_offsets[position + 1])
+            synchronous_bar_sequence = SimpleSynchronousBarSequence(tuple(
+                SimpleSynchronousBar(frozendict({staff_name: self._get_bar(row, column)
+                                                 for staff_name, column in self._staff_columns.items()}))
+                for row in rows))
+            synchronous_bar_sequence = self._synchronous_bar_sequences.setdefault(position, synchronous_bar_sequence)
+        return synchronous_bar_sequence
+
+
 class DiceTable(metaclass=ABCMeta):
     """Representation of a dice table used in playing the dice games.
 
@@ -1004,13 +2204,81 @@ class DiceTable(metaclass=ABCMeta):
             The dice game elements in the indicated row
         """
 
-    @abstractmethod
-    def get_random_selection(self, seed: int = None) -> list[DiceTableElement]:
+    def get_row_probabilities(self) -> list[Fraction]:
+        """Get the exact probability of throwing each row of this dice table.
+
+        The rows are selected by the sum of the thrown dices, which are not all equally likely. For example, with two
+        dices a sum of 7 is six times as likely as a sum of 2. If the table does not cover all possible sums, the
+        probabilities are renormalized over the rows of the table.
+
+        Returns:
+            Per row the probability of selecting that row with a single throw.
+        """
+        return get_dice_sum_probabilities(self.nmr_dices, self.min_dice_value, self.max_dice_value)
+
+    def get_random_selection(self, seed: int | np.random.Generator | None = None,
+                             dice_weighted: bool = False) -> list[DiceTableElement]:
         """Get a random selection of bar numbers
 
+        This uses its own random number generator, and does not touch the global random state. The selection equals
+        the first row of :meth:`get_random_row_indices` with the same seed.
+
+        Args:
+            seed: a seed for the random number generator, or a numpy random generator to draw from.
+            dice_weighted: if set, we sample the rows with the probabilities of the thrown dice sums (see
+                :meth:`get_row_probabilities`), instead of uniformly.
+
         Returns:
             A list of random bar numbers from the table
         """
+        return self.get_row_selection(self.get_random_row_indices(1, seed, dice_weighted=dice_weighted)[0].tolist())
+
+    def get_random_row_indices(self, nmr_selections: int,
+                               seed: int | np.random.Generator | None = None,
+                               dice_weighted: bool = False) -> np.ndarray:
+        """Get the row indices of a batch of random selections.
+
+        This is the vectorized counterpart of :meth:`get_random_selection`, drawing all the throws of all the
+        selections in one pass. Dice weighted draws use an alias table, taking constant time per throw.
+
+        Args:
+            nmr_selections: the number of selections to draw
+            seed: a seed for the random number generator, or a numpy random generator to draw from.
+            dice_weighted: if set, we sample the rows with the probabilities of the thrown dice sums (see
+                :meth:`get_row_probabilities`), instead of uniformly.
+
+        Returns:
+            An integer array of shape (nmr_selections, nmr_throws) with for each selection the row index per throw.
+        """
+        rng = np.random.default_rng(seed)
+        if dice_weighted:
+            return AliasSampler(self.get_row_probabilities()).sample(rng, (nmr_selections, self.nmr_throws))
+        return rng.integers(0, self.shape[0], size=(nmr_selections, self.nmr_throws))
+
+    def get_row_selection(self, row_indices: list[int]) -> list[DiceTableElement]:
+        """Get the dice table elements selected by one row index per throw.
+
+        Args:
+            row_indices: for each throw (column), the row index of the selected element.
+
+        Returns:
+            The selected dice table element for each throw.
+        """
+        return [self.get_element(row_ind, column_ind) for column_ind, row_ind in enumerate(row_indices)]
+
+    def get_bar_indices_array(self) -> np.ndarray:
+        """Get the bar indices of all elements as a dense array, for vectorized processing.
+
+        Returns:
+            An integer array of shape (rows, columns, max_measures_per_throw) with per element the bar indices,
+            padded with -1 for elements selecting less than the maximum number of measures.
+        """
+        bar_indices = np.full(self.shape + (self.max_measures_per_throw,), -1, dtype=np.int32)
+        for row_ind, row in enumerate(self.list_rows()):
+            for column_ind, element in enumerate(row):
+                element_bar_indices = element.get_bar_indices()
+                bar_indices[row_ind, column_ind, :len(element_bar_indices)] = element_bar_indices
+        return bar_indices
 
 
 class DiceTableElement(metaclass=ABCMeta):
@@ -1085,12 +2353,20 @@ class SimpleDiceTableElement(DiceTableElement):
 class SimpleDiceTable(DiceTable):
     """Implementation of a dice table.
 
+    On construction, this precomputes a column-major view of the table, such that column lookups do not have to
+    rebuild the columns. The table should therefore not be modified after construction.
+
     Args:
         table: the dice table as a list of rows, with for each row the dice table elements
         max_measures_per_throw: the maximum selected measures in the dice table.
     """
     table: list[list[DiceTableElement]]
     max_measures_per_throw: int
+    _columns: tuple[tuple[DiceTableElement, ...], ...] = field(init=False, repr=False, compare=False)
+    _alias_sampler: AliasSampler | None = field(init=False, default=None, repr=False, compare=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, '_columns', tuple(zip(*self.table)))
 
     @classmethod
     def from_lists(cls, array: list[list[int_bar_index | tuple[int_bar_index, ...]]]) -> Self:
@@ -1161,28 +2437,168 @@ class SimpleDiceTable(DiceTable):
         return self.table
 
     def list_columns(self) -> list[list[DiceTableElement]]:
-        columns = []
-        for column_ind in range(len(self.table[0])):
-            column = []
-            for row in self.table:
-                column.append(row[column_ind])
-            columns.append(column)
-        return columns
+        return [list(column) for column in self._columns]
 
     def get_column(self, column_ind: int) -> list[DiceTableElement]:
-        return self.list_columns()[column_ind]
+        return list(self._columns[column_ind])
 
     def get_row(self, row_ind: int) -> list[DiceTableElement]:
         return self.list_rows()[row_ind]
 
-    def get_random_selection(self, seed: int = None) -> list[DiceTableElement]:
-        random.seed(seed)
-        max_val = self.shape[0] - 1
-        selected_elements = []
-        for throw_ind in range(self.nmr_throws):
-            dice_throw = random.randint(0, max_val)
-            selected_elements.append(self.get_element(dice_throw, throw_ind))
-        return selected_elements
+    def get_random_row_indices(self, nmr_selections: int,
+                               seed: int | np.random.Generator | None = None,
+                               dice_weighted: bool = False) -> np.ndarray:
+        rng = np.random.default_rng(seed)
+        if dice_weighted:
+            if self._alias_sampler is None:
+                object.__setattr__(self, '_alias_sampler', AliasSampler(self.get_row_probabilities()))
+            return self._alias_sampler.sample(rng, (nmr_selections, self.nmr_throws))
+        return rng.integers(0, self.shape[0], size=(nmr_selections, self.nmr_throws))
+
+    def get_row_selection(self, row_indices: list[int]) -> list[DiceTableElement]:
+        return [self.table[row_ind][column_ind] for column_ind, row_ind in enumerate(row_indices)]
+
+
+class ArrayDiceTable(DiceTable):
+
+    def __init__(self, bar_indices: np.ndarray, offsets: np.ndarray, lengths: np.ndarray):
+        """Implementation of a dice table backed by integer arrays.
+
+        Instead of storing an object per element, this stores the bar indices of all the elements in one flat array,
+        in row-major order of the elements. Element ``(row, column)`` selects the bar indices
+        ``bar_indices[offsets[row, column]:offsets[row, column] + lengths[row, column]]``.
+
+        Dice table elements are only created when they are requested, after which they are reused for all further
+        lookups. The raw arrays are available for vectorized processing, see :attr:`bar_indices`, :attr:`offsets`
+        and :attr:`lengths`.
+
+        Args:
+            bar_indices: the flat array with the bar indices of all elements
+            offsets: for each element the offset into the flat bar indices, of shape (rows, columns)
+            lengths: for each element the number of selected bar indices, of shape (rows, columns)
+        """
+        self._bar_indices = bar_indices
+        self._offsets = offsets
+        self._lengths = lengths
+        self._max_measures_per_throw = int(lengths.max(initial=1))
+        self._elements: dict[tuple[int, int], DiceTableElement] = {}
+        self._alias_sampler = None
+
+    @classmethod
+    def from_lists(cls, array: list[list[int_bar_index | tuple[int_bar_index, ...]]]) -> Self:
+        """Load this dice table from a simple list table of indices.
+
+        Args:
+            array: array with for each element one or more bar indices.
+
+        Returns:
+            An instance of this class.
+        """
+        bar_indices = []
+        lengths = []
+        for row in array:
+            row_lengths = []
+            for value in row:
+                value_tuple = (value,) if isinstance(value, int_bar_index) else value
+                bar_indices.extend(value_tuple)
+                row_lengths.append(len(value_tuple))
+            lengths.append(row_lengths)
+
+        lengths = np.array(lengths, dtype=np.int32)
+        offsets = np.zeros(lengths.shape, dtype=np.int32)
+        offsets.flat[1:] = np.cumsum(lengths.flat[:-1])
+        return cls(np.array(bar_indices, dtype=np.int32), offsets, lengths)
+
+    @property
+    def bar_indices(self) -> np.ndarray:
+        """The flat array with the bar indices of all elements, in row-major order of the elements."""
+        return self._bar_indices
+
+    @property
+    def offsets(self) -> np.ndarray:
+        """For each element the offset into the flat bar indices, of shape (rows, columns)."""
+        return self._offsets
+
+    @property
+    def lengths(self) -> np.ndarray:
+        """For each element the number of selected bar indices, of shape (rows, columns)."""
+        return self._lengths
+
+    @property
+    def table(self) -> list[list[DiceTableElement]]:
+        """The dice table as a list of rows, as in the ``table`` attribute of :class:`SimpleDiceTable`."""
+        return self.list_rows()
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return self._offsets.shape
+
+    @property
+    def max_measures_per_throw(self) -> int:
+        return self._max_measures_per_throw
+
+    @property
+    def nmr_dices(self) -> int:
+        return math.ceil(self.shape[0] / 6)
+
+    @property
+    def min_dice_value(self) -> int:
+        return self.nmr_dices
+
+    @property
+    def max_dice_value(self) -> int:
+        return self.shape[0] + (self.nmr_dices - 1)
+
+    @property
+    def nmr_dice_values(self) -> int:
+        return self.max_dice_value - (self.nmr_dices - 1)
+
+    @property
+    def nmr_throws(self) -> int:
+        return self.shape[1]
+
+    def get_element(self, row: int, column: int) -> DiceTableElement:
+        element = self._elements.get((row, column))
+        if element is None:
+            offset = self._offsets[row, column]
+            element = self._elements.setdefault((row, column), SimpleDiceTableElement(
+                int(row), int(column), tuple(self._bar_indices[offset:offset + self._lengths[row, column]].tolist())))
+        return element
+
+    def get_dice_throw(self, dice_number: int, column: int) -> DiceTableElement:
+        return self.get_element(dice_number - self.nmr_dices, column)
+
+    def get_elements(self) -> list[DiceTableElement]:
+        return [self.get_element(row, column) for row in range(self.shape[0]) for column in range(self.shape[1])]
+
+    def list_rows(self) -> list[list[DiceTableElement]]:
+        return [self.get_row(row) for row in range(self.shape[0])]
+
+    def list_columns(self) -> list[list[DiceTableElement]]:
+        return [self.get_column(column) for column in range(self.shape[1])]
+
+    def get_column(self, column_ind: int) -> list[DiceTableElement]:
+        return [self.get_element(row, column_ind) for row in range(self.shape[0])]
+
+    def get_row(self, row_ind: int) -> list[DiceTableElement]:
+        return [self.get_element(row_ind, column) for column in range(self.shape[1])]
+
+    def get_random_row_indices(self, nmr_selections: int,
+                               seed: int | np.random.Generator | None = None,
+                               dice_weighted: bool = False) -> np.ndarray:
+        rng = np.random.default_rng(seed)
+        if dice_weighted:
+            if self._alias_sampler is None:
+                self._alias_sampler = AliasSampler(self.get_row_probabilities())
+            return self._alias_sampler.sample(rng, (nmr_selections, self.nmr_throws))
+        return rng.integers(0, self.shape[0], size=(nmr_selections, self.nmr_throws))
+
+    def get_bar_indices_array(self) -> np.ndarray:
+        bar_indices = np.full(self.shape + (self.max_measures_per_throw,), -1, dtype=np.int32)
+        positions = np.arange(self.max_measures_per_throw)
+        mask = positions < self._lengths[..., None]
+        bar_indices[mask] = self._bar_indices[(self._offsets[..., None] + positions)[mask]]
+        return bar_indices
 
 
 class LilypondScore(metaclass=ABCMeta):
@@ -1224,6 +2640,432 @@ class SimpleLilypondScore(LilypondScore):
             f.write(self.score_str)
 
 
+@dataclass(frozen=True, slots=True)
+class RenderOptions:
+    """Options for rendering the lilypond templates of a dice game.
+
+    Args:
+        compiled_compositions: if set, we render the compositions by splicing the bars into precompiled template
+            skeletons (see :class:`CompiledCompositionTemplate`), instead of running the complete jinja2 template
+            for every composition.
+        preload_templates: if set, we load all the templates of a dice game on construction, instead of on first use.
+        auto_reload: if the jinja2 environment should check if the templates changed on disk before using them.
+        bytecode_cache: if set, we store the compiled templates in a persistent bytecode cache on disk, such that
+            new processes do not have to recompile the templates.
+        bytecode_cache_dir: the directory for the bytecode cache, if not set we use the jinja2 default, a user
+            specific directory in the system's temporary directory.
+    """
+    compiled_compositions: bool = False
+    preload_templates: bool = False
+    auto_reload: bool = True
+    bytecode_cache: bool = False
+    bytecode_cache_dir: str | None = None
+
+    @classmethod
+    def production(cls, bytecode_cache_dir: str | None = None) -> Self:
+        """Get the render options for production use.
+
+        This renders the compositions using the compiled templates, preloads all templates, disables the up-to-date
+        checks of the templates and uses a persistent bytecode cache.
+
+        Args:
+            bytecode_cache_dir: the directory for the bytecode cache, if not set we use the jinja2 default.
+
+        Returns:
+            The render options for production use.
+        """
+        return cls(compiled_compositions=True, preload_templates=True, auto_reload=False,
+                   bytecode_cache=True, bytecode_cache_dir=bytecode_cache_dir)
+
+
+class CompiledCompositionTemplate:
+
+    def __init__(self, template: jinja2.Template, max_skeletons: int = 128, max_sequences: int = 4096):
+        """Render a composition template by joining the bar strings with a precompiled skeleton.
+
+        The output of the composition templates only differs between compositions in the bars spliced into them. This
+        renders the template once with numbered placeholder bars, one slot per table, throw, staff and bar in
+        sequence, and splits the output into a skeleton of static strings with numbered slots. Compositions are then
+        rendered by joining the static strings with the lilypond strings of the selected bars.
+
+        Since some templates branch on the bar annotations, the placeholder bars carry the annotations of the actual
+        bars, wrapped such that we record which annotation attributes of which slots the template reads. Per shape
+        and context key we keep the union of the attributes read while compiling its skeletons. A skeleton is reused
+        for every composition with the same shape, context key and values of these attributes, since the template
+        then follows the same path. Annotations of bars the template does not branch on do not multiply the number
+        of skeletons. Templates splitting the voices of a bar with the global
+        ``split_voices`` function are supported by applying that function to the actual bar when filling the slot.
+
+        Each new skeleton is validated once against the output of the jinja2 template. If it does not match, for
+        example because the template branches on the lilypond strings themselves, we fall back to jinja2 rendering
+        for that skeleton, such that the output is always identical to that of the jinja2 template.
+
+        The caches are updated under a lock, such that a compiled template can be shared between threads. Skeletons
+        are compiled outside the lock, two threads may therefore compile the same skeleton at the same time.
+
+        Args:
+            template: the jinja2 composition template
+            max_skeletons: the maximum number of skeletons we keep in memory.
+            max_sequences: the maximum number of flattened synchronous bar sequences we keep in memory.
+        """
+        self._template = template
+        self._max_skeletons = max_skeletons
+        self._max_sequences = max_sequences
+        self._skeletons: OrderedDict[Hashable, tuple[tuple[str, ...], tuple[int, ...], tuple[int, ...]] | None] = \
+            OrderedDict()
+        self._annotation_reads: dict[Hashable, tuple[tuple[int, str | None], ...]] = {}
+        self._sequences: dict[int, tuple[SynchronousBarSequence, tuple[tuple[str_staff_name, int], ...],
+                                         tuple[Bar, ...]]] = {}
+        self._voices: dict[str, tuple[str, str]] = {}
+        self._split_voices = template.environment.globals.get('split_voices')
+        self._cache_lock = threading.Lock()
+
+    def render(self,
+               composition_bars: dict[str_dice_table_name, list[SynchronousBarSequence]],
+               context_key: Hashable,
+               **context: Any) -> str:
+        """Render the template with the given composition bars.
+
+        Args:
+            composition_bars: the composition bars to render, as returned by :meth:`DiceGame.bar_selection_to_bars`.
+            context_key: a hashable representation of the remaining context variables. Compositions rendered with the
+                same context key should have equal context variables.
+            **context: the remaining context variables of the template
+
+        Returns:
+            The rendered template, identical to the output of the jinja2 template.
+        """
+        shape = []
+        bars = []
+        for table_name, synchronous_bar_sequences in composition_bars.items():
+            table_shape = []
+            for synchronous_bar_sequence in synchronous_bar_sequences:
+                flattened = self._sequences.get(id(synchronous_bar_sequence))
+                if flattened is None or flattened[0] is not synchronous_bar_sequence:
+                    flattened = self._flatten_sequence(synchronous_bar_sequence)
+                table_shape.append(flattened[1])
+                bars.extend(flattened[2])
+            shape.append((table_name, tuple(table_shape)))
+        layout_key = (tuple(shape), context_key)
+
+        annotation_reads = self._annotation_reads.get(layout_key)
+        if annotation_reads is not None:
+            skeleton_key = (layout_key, annotation_reads, self._get_annotation_values(bars, annotation_reads))
+            with self._cache_lock:
+                is_cached = skeleton_key in self._skeletons
+                if is_cached:
+                    self._skeletons.move_to_end(skeleton_key)
+                    skeleton = self._skeletons[skeleton_key]
+            if is_cached:
+                if skeleton is None:
+                    return self._template.render(composition_bars=composition_bars, **context)
+                return self._fill_skeleton(skeleton, bars)
+
+        skeleton_reads, skeleton, output = self._compile_skeleton(composition_bars, bars, context)
+        with self._cache_lock:
+            known_reads = self._annotation_reads.pop(layout_key, annotation_reads or ())
+            annotation_reads = tuple(dict.fromkeys(known_reads) | dict.fromkeys(skeleton_reads))
+            self._annotation_reads[layout_key] = annotation_reads
+            if len(self._annotation_reads) > self._max_skeletons:
+                del self._annotation_reads[next(iter(self._annotation_reads))]
+
+            skeleton_key = (layout_key, annotation_reads, self._get_annotation_values(bars, annotation_reads))
+            self._skeletons[skeleton_key] = skeleton
+            if len(self._skeletons) > self._max_skeletons:
+                self._skeletons.popitem(last=False)
+        return output
+
+    def _flatten_sequence(
+            self, synchronous_bar_sequence: SynchronousBarSequence
+    ) -> tuple[SynchronousBarSequence, tuple[tuple[str_staff_name, int], ...], tuple[Bar, ...]]:
+        """Get the shape and the bars in slot order of a synchronous bar sequence, and cache them.
+
+        The bar collections reuse the same synchronous bar sequence objects, such that caching these by object
+        identity avoids walking the bar sequences for every composition. The sequence itself is kept in the cache,
+        such that its identity can not be reused while cached.
+
+        Args:
+            synchronous_bar_sequence: the synchronous bar sequence to flatten
+
+        Returns:
+            The sequence, per staff the staff name and number of bars, and the bars of all staffs in slot order.
+        """
+        staffs = synchronous_bar_sequence.get_staffs()
+        flattened = (synchronous_bar_sequence,
+                     tuple((staff_name, bar_sequence.nmr_of_bars) for staff_name, bar_sequence in staffs.items()),
+                     tuple(bar for bar_sequence in staffs.values() for bar in bar_sequence.get_bars()))
+        with self._cache_lock:
+            if len(self._sequences) >= self._max_sequences:
+                self._sequences.clear()
+            self._sequences[id(synchronous_bar_sequence)] = flattened
+        return flattened
+
+    def _compile_skeleton(
+            self,
+            composition_bars: dict[str_dice_table_name, list[SynchronousBarSequence]],
+            bars: list[Bar],
+            context: dict[str, Any]
+    ) -> tuple[tuple[tuple[int, str | None], ...], tuple[tuple[str, ...], tuple[int, ...], tuple[int, ...]] | None,
+               str]:
+        """Compile the skeleton for the given composition bars and context.
+
+        Args:
+            composition_bars: the composition bars we are rendering
+            bars: the flat list of bars in the composition bars, in slot order
+            context: the remaining context variables
+
+        Returns:
+            The annotation attributes read by the template, as slot index and attribute name (None if the annotation
+            was used as a whole), the skeleton, and the output of the jinja2 template. The skeleton holds the static
+            strings, and per slot reference in between the slot index and voice part. It is None if the template could
+            not be compiled into a skeleton.
+        """
+        annotation_reads = {}
+        slot_ind = 0
+        placeholder_bars = {}
+        for table_name, synchronous_bar_sequences in composition_bars.items():
+            placeholder_bars[table_name] = []
+            for synchronous_bar_sequence in synchronous_bar_sequences:
+                placeholder_sequences = {}
+                for staff_name, bar_sequence in synchronous_bar_sequence.get_staffs().items():
+                    placeholder_sequences[staff_name] = SimpleBarSequence(tuple(
+                        SimpleBar(f'\x00{slot_ind + ind}\x00',
+                                  _RecordingBarAnnotation(bar.get_annotation(), slot_ind + ind, annotation_reads))
+                        for ind, bar in enumerate(bar_sequence.get_bars())))
+                    slot_ind += bar_sequence.nmr_of_bars
+                placeholder_bars[table_name].append(
+                    SimpleSynchronousBarSequence.from_dict_of_bar_sequences(placeholder_sequences))
+
+        def split_placeholder_voices(voices: str) -> tuple[str, str]:
+            slot = re.fullmatch(r'\x00(\d+)\x00', voices).group(1)
+            return f'\x00{slot}:1\x00', f'\x00{slot}:2\x00'
+
+        placeholder_context = context
+        if self._split_voices is not None:
+            placeholder_context = context | {'split_voices': split_placeholder_voices}
+
+        reference_output = self._template.render(composition_bars=composition_bars, **context)
+        try:
+            placeholder_output = self._template.render(composition_bars=placeholder_bars, **placeholder_context)
+        except Exception:
+            return tuple(annotation_reads), None, reference_output
+
+        parts = re.split(r'\x00(\d+)(?::(\d))?\x00', placeholder_output)
+        skeleton = (tuple(parts[0::3]), tuple(int(slot) for slot in parts[1::3]),
+                    tuple(int(part or 0) for part in parts[2::3]))
+
+        if any('\x00' in static_string for static_string in skeleton[0]):
+            return tuple(annotation_reads), None, reference_output
+        try:
+            if self._fill_skeleton(skeleton, bars) != reference_output:
+                return tuple(annotation_reads), None, reference_output
+        except Exception:
+            return tuple(annotation_reads), None, reference_output
+        return tuple(annotation_reads), skeleton, reference_output
+
+    def _fill_skeleton(self, skeleton: tuple[tuple[str, ...], tuple[int, ...], tuple[int, ...]],
+                       bars: list[Bar]) -> str:
+        """Fill the slots of a skeleton with the lilypond strings of the given bars.
+
+        Args:
+            skeleton: the static strings, and per slot reference the slot index and voice part
+            bars: the bars per slot
+
+        Returns:
+            The joined output string
+        """
+        static_strings, slot_indices, voice_parts = skeleton
+
+        pieces = [None] * (2 * len(static_strings) - 1)
+        pieces[0::2] = static_strings
+        pieces[1::2] = [bars[slot_ind].lilypond_str for slot_ind in slot_indices]
+        for piece_ind, voice_part in enumerate(voice_parts):
+            if voice_part:
+                bar_str = pieces[2 * piece_ind + 1]
+                voices = self._voices.get(bar_str)
+                if voices is None:
+                    voices = self._split_voices(bar_str)
+                    with self._cache_lock:
+                        if len(self._voices) >= self._max_sequences:
+                            self._voices.clear()
+                        self._voices[bar_str] = voices
+                pieces[2 * piece_ind + 1] = voices[voice_part - 1]
+        return ''.join(pieces)
+
+    @staticmethod
+    def _get_annotation_values(bars: list[Bar], annotation_reads: tuple[tuple[int, str | None], ...]) -> tuple:
+        """Get the values of the annotation attributes read by a template, for the given bars.
+
+        Args:
+            bars: the bars per slot
+            annotation_reads: the slot index and attribute name of each read, the name is None if the annotation was
+                used as a whole.
+
+        Returns:
+            The value of each read annotation attribute, or the annotation itself if used as a whole.
+        """
+        values = []
+        for slot_ind, attribute_name in annotation_reads:
+            annotation = bars[slot_ind].get_annotation()
+            values.append(annotation if attribute_name is None else getattr(annotation, attribute_name, _missing))
+        return tuple(values)
+
+
+_missing = object()
+"""Marker for annotation attributes which do not exist."""
+
+
+class _RecordingBarAnnotation:
+
+    def __init__(self, annotation: BarAnnotation | None, slot_ind: int,
+                 annotation_reads: dict[tuple[int, str | None], None]):
+        """Wrapper around the annotation of a placeholder bar, recording how a template uses the annotation.
+
+        Attribute reads are recorded by attribute name. Any other use of the annotation, such as printing, testing or
+        comparing it, is recorded as a use of the annotation as a whole.
+
+        Args:
+            annotation: the wrapped annotation
+            slot_ind: the slot index of the placeholder bar
+            annotation_reads: the ordered set to which we add the reads, as slot index and attribute name.
+        """
+        object.__setattr__(self, '_annotation', annotation)
+        object.__setattr__(self, '_slot_ind', slot_ind)
+        object.__setattr__(self, '_annotation_reads', annotation_reads)
+
+    def __getattr__(self, name):
+        self._annotation_reads[(self._slot_ind, name)] = None
+        return getattr(self._annotation, name)
+
+    def _use(self) -> BarAnnotation | None:
+        """Record a use of the annotation as a whole, and return the wrapped annotation."""
+        self._annotation_reads[(self._slot_ind, None)] = None
+        return self._annotation
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Bar annotations are immutable.')
+
+    def __bool__(self):
+        return bool(self._use())
+
+    def __str__(self):
+        return str(self._use())
+
+    def __repr__(self):
+        return repr(self._use())
+
+    def __format__(self, format_spec):
+        return format(self._use(), format_spec)
+
+    def __eq__(self, other):
+        return self._use() == other
+
+    def __hash__(self):
+        return hash(self._use())
+
+    def __len__(self):
+        return len(self._use())
+
+    def __iter__(self):
+        return iter(self._use())
+
+    def __contains__(self, item):
+        return item in self._use()
+
+    def __getitem__(self, item):
+        return self._use()[item]
+
+
+def split_voices(voices: str) -> tuple[str, str]:
+    """Split a bar written as two voices into the lilypond strings of the first and second voice.
+
+    This expects the bar to be written as ``<<{\\voiceOne ...} \\new Voice {\\voiceTwo ...}>>``, as used in
+    some of the dice games. This function may be added as global to the jinja2 environment of the dice games.
+
+    Args:
+        voices: the lilypond string of the bar with two voices
+
+    Returns:
+        The lilypond string of the first and of the second voice.
+    """
+    return re.findall(r'<<{\\voiceOne ([^}]*)} \\new Voice {\\voiceTwo ([^}]*)}>>', voices)[0]
+
+
+def get_dice_sum_probabilities(nmr_dices: int, min_dice_sum: int, max_dice_sum: int) -> list[Fraction]:
+    """Get the exact probabilities of the sums of a number of thrown dices, restricted to a range of sums.
+
+    The probabilities are renormalized over the requested range of sums. Sums which can not be thrown with the
+    number of dices get a probability of zero.
+
+    Args:
+        nmr_dices: the number of six-sided dices thrown
+        min_dice_sum: the minimum dice sum
+        max_dice_sum: the maximum dice sum
+
+    Returns:
+        For each dice sum from the minimum up to and including the maximum the probability of throwing that sum.
+    """
+    sum_counts = {0: 1}
+    for _ in range(nmr_dices):
+        new_sum_counts = {}
+        for dice_sum, count in sum_counts.items():
+            for dice_value in range(1, 7):
+                new_sum_counts[dice_sum + dice_value] = new_sum_counts.get(dice_sum + dice_value, 0) + count
+        sum_counts = new_sum_counts
+
+    counts = [sum_counts.get(dice_sum, 0) for dice_sum in range(min_dice_sum, max_dice_sum + 1)]
+    return [Fraction(count, sum(counts)) for count in counts]
+
+
+class AliasSampler:
+
+    def __init__(self, probabilities: list[float | Fraction]):
+        """Sample from a discrete distribution in constant time per sample, using Vose's alias method.
+
+        On construction this divides the probability mass over one bin per outcome, each holding at most two
+        outcomes: the outcome of the bin itself and an alias. Sampling then takes one uniform number per sample, of
+        which the integer part (after scaling by the number of outcomes) selects the bin and the fractional part
+        chooses between the bin's outcome and its alias. Since every sample consumes exactly one number, a batch of
+        samples starts with the samples of any smaller batch drawn with the same random state.
+
+        Args:
+            probabilities: the probability of each outcome, these are normalized to sum to one.
+        """
+        nmr_outcomes = len(probabilities)
+        total = sum(probabilities)
+        scaled = [float(probability * nmr_outcomes / total) for probability in probabilities]
+
+        self._probabilities = np.ones(nmr_outcomes)
+        self._aliases = np.arange(nmr_outcomes)
+
+        small = [ind for ind, value in enumerate(scaled) if value < 1]
+        large = [ind for ind, value in enumerate(scaled) if value >= 1]
+        while small and large:
+            small_ind = small.pop()
+            large_ind = large.pop()
+            self._probabilities[small_ind] = scaled[small_ind]
+            self._aliases[small_ind] = large_ind
+            scaled[large_ind] -= 1 - scaled[small_ind]
+            if scaled[large_ind] < 1:
+                small.append(large_ind)
+            else:
+                large.append(large_ind)
+
+    def sample(self, rng: np.random.Generator, size: int | tuple[int, ...]) -> np.ndarray:
+        """Draw samples from the distribution.
+
+        Args:
+            rng: the random number generator to draw from
+            size: the number or shape of the samples
+
+        Returns:
+            An integer array with the sampled outcome indices.
+        """
+        scaled = rng.random(size) * len(self._probabilities)
+        bins = scaled.astype(np.int64)
+        return np.where(scaled - bins < self._probabilities[bins], bins, self._aliases[bins])
+
+
 class BarSelection(metaclass=ABCMeta):
     """Representation of a selection of bars chosen to compile into a dice game composition.
 
@@ -1307,6 +3149,97 @@ class PerStaffsBarSelection(BarSelection):
         return self.dice_table_elements[table_name][staff_name]
 
 
+@dataclass(slots=True, frozen=True)
+class FrozenBarSelection(BarSelection):
+    """Immutable and hashable bar selection, with for each table and each staff the selected dice table elements.
+
+    This can represent both grouped and per staff selections, and can be used as a dictionary or cache key. In
+    addition to the elements, this holds a canonical key with the selected bar indices per table and staff, which is
+    computed once on construction and also serves as the hash of this selection.
+
+    Args:
+        dice_table_elements: for each table key, and for each staff, the tuple of dice table elements selected in the
+            composition.
+    """
+    dice_table_elements: frozendict[str_dice_table_name, frozendict[str_staff_name, tuple[DiceTableElement, ...]]]
+    canonical_key: tuple[tuple[str_dice_table_name, str_staff_name, tuple[tuple[int_bar_index, ...], ...]], ...] = \
+        field(init=False, repr=False, compare=False)
+    _hash: int = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        if not isinstance(self.dice_table_elements, frozendict) or not all(
+                isinstance(staff_elements, frozendict) for staff_elements in self.dice_table_elements.values()):
+            raise ValueError('Expects the dice table elements to be of type frozendict.')
+
+        canonical_key = tuple(
+            (table_name, staff_name, tuple(element.get_bar_indices() for element in elements))
+            for table_name, staff_elements in sorted(self.dice_table_elements.items())
+            for staff_name, elements in sorted(staff_elements.items()))
+        object.__setattr__(self, 'canonical_key', canonical_key)
+        object.__setattr__(self, '_hash', hash(canonical_key))
+
+    @classmethod
+    def from_bar_selection(cls,
+                           bar_selection: BarSelection,
+                           staff_names: dict[str_dice_table_name, list[str_staff_name]]) -> Self:
+        """Create a frozen bar selection from any bar selection.
+
+        Args:
+            bar_selection: the bar selection to freeze
+            staff_names: for each dice table the staff names to look up in the bar selection, as given by
+                :meth:`DiceGame.get_staff_names`.
+
+        Returns:
+            A frozen version of the given bar selection.
+        """
+        dice_table_elements = {}
+        for table_name, table_staff_names in staff_names.items():
+            frozen_elements = {}
+            staff_elements = {}
+            for staff_name in table_staff_names:
+                elements = bar_selection.get_dice_table_elements(table_name, staff_name)
+                if id(elements) not in frozen_elements:
+                    frozen_elements[id(elements)] = tuple(elements)
+                staff_elements[staff_name] = frozen_elements[id(elements)]
+            dice_table_elements[table_name] = frozendict(staff_elements)
+        return cls(frozendict(dice_table_elements))
+
+    def __hash__(self):
+        return self._hash
+
+    def get_dice_table_element(self,
+                               table_name: str_dice_table_name,
+                               throw_ind: int,
+                               staff_name: str_staff_name | None = None) -> DiceTableElement:
+        return self.get_dice_table_elements(table_name, staff_name)[throw_ind]
+
+    def get_dice_table_elements(self,
+                                table_name: str_dice_table_name,
+                                staff_name: str_staff_name | None = None) -> list[DiceTableElement]:
+        staff_elements = self.dice_table_elements[table_name]
+        if staff_name is None:
+            return list(next(iter(staff_elements.values())))
+        return list(staff_elements[staff_name])
+
+
+@dataclass(frozen=True, slots=True)
+class BarSelectionCacheInfo:
+    """Statistics of the cache of resolved bar selections of a dice game.
+
+    The field names match those of the cache info of :func:`functools.lru_cache`.
+
+    Args:
+        hits: the number of bar selections found in the cache
+        misses: the number of bar selections not found in the cache, and thus resolved
+        maxsize: the maximum number of cached bar selections, 0 if caching is disabled, None if unbounded.
+        currsize: the current number of cached bar selections
+    """
+    hits: int
+    misses: int
+    maxsize: int | None
+    currsize: int
+
+
 class MidiSettings(metaclass=ABCMeta):
 
     @abstractmethod
@@ -1401,6 +3334,46 @@ class MidiSettings(metaclass=ABCMeta):
         """
 
 
+@dataclass(frozen=True, slots=True)
+class MidiSection:
+    """A section of a composition, as played in the midi files compiled directly from the bars.
+
+    The dice tables of a section are played simultaneously, for instance the treble and bass of a counterpoint. The
+    sections themselves are played one after another.
+
+    Args:
+        table_names: the dice tables played in this section
+        tempo: the tempo of this section, in quarter notes per minute
+        throw_order: the order in which the bars of the throws (columns) are played, including any repeats.
+            If not set, we play each throw once, in order.
+    """
+    table_names: tuple[str_dice_table_name, ...]
+    tempo: float
+    throw_order: tuple[int, ...] | None = None
+
+
+@dataclass(frozen=True, slots=True)
+class MidiBarPlacement:
+    """The placement of a single bar of a single staff in the midi time line of a composition.
+
+    Args:
+        table_name: the dice table of the bar
+        staff_name: the staff of the bar
+        lilypond_str: the lilypond music of the bar
+        bar_events: the parsed midi notes of the bar
+        start: the start of the bar in midi ticks, see :data:`default_ticks_per_quarter`
+        start_time: the start of the bar in seconds, taking into account the tempi of the preceding sections
+        tempo: the tempo of the bar, in quarter notes per minute
+    """
+    table_name: str_dice_table_name
+    staff_name: str_staff_name
+    lilypond_str: str
+    bar_events: BarEvents
+    start: int
+    start_time: float
+    tempo: float
+
+
 @dataclass(frozen=True, slots=True)
 class SimpleMidiSettings(MidiSettings):
     """Simple lookup implementation of the midi settings.
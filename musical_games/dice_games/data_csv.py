@@ -7,6 +7,7 @@ __email__ = 'robbert@xkls.nl'
 __licence__ = 'LGPL v3'
 
 import csv
+import threading
 from abc import ABCMeta, abstractmethod
 from importlib.abc import Traversable
 from pathlib import Path
@@ -14,7 +15,8 @@ from pathlib import Path
 from frozendict import frozendict
 
 from musical_games.dice_games.base import BarCollection, SimpleBar, SimpleBarCollection, BarAnnotation, int_bar_index, \
-    str_staff_name, SimpleSynchronousBarSequence, SimpleSynchronousBar
+    str_staff_name, SimpleSynchronousBarSequence, SimpleSynchronousBar, InternedBarCollection, SynchronousBarSequence, \
+    BarSequence, DiceTableElement
 
 
 class BarCollectionCSVWriter(metaclass=ABCMeta):
@@ -44,6 +46,99 @@ class BarCollectionLoader(metaclass=ABCMeta):
             The loaded bar collection.
         """
 
+    def load_staff_names(self) -> list[str_staff_name]:
+        """Load only the names of the staffs in the bar collection.
+
+        By default this loads the complete bar collection, implementing classes may override this with a cheaper
+        method.
+
+        Returns:
+            The names of the staffs in the bar collection.
+        """
+        return self.load_data().get_staff_names()
+
+    def load_lazy(self) -> LazyBarCollection:
+        """Get a bar collection which loads the data on first use.
+
+        Returns:
+            A lazy bar collection using this loader.
+        """
+        return LazyBarCollection(self)
+
+
+class LazyBarCollection(BarCollection):
+
+    def __init__(self, bar_collection_loader: BarCollectionLoader):
+        """Bar collection which only loads its data on first use.
+
+        The staff names are loaded separately, using :meth:`BarCollectionLoader.load_staff_names`, since these are
+        needed for drawing random compositions, without needing the bars themselves.
+
+        Args:
+            bar_collection_loader: the loader for the bar collection
+        """
+        self._bar_collection_loader = bar_collection_loader
+        self._bar_collection = None
+        self._staff_names = None
+        self._lock = threading.Lock()
+
+    @property
+    def bar_collection_loader(self) -> BarCollectionLoader:
+        """The loader used for loading the bar collection."""
+        return self._bar_collection_loader
+
+    @property
+    def is_loaded(self) -> bool:
+        """If the bar collection has been loaded."""
+        return self._bar_collection is not None
+
+    def load(self) -> BarCollection:
+        """Load the bar collection, if not yet loaded.
+
+        Returns:
+            The loaded bar collection.
+        """
+        if self._bar_collection is None:
+            with self._lock:
+                if self._bar_collection is None:
+                    self._bar_collection = self._bar_collection_loader.load_data()
+        return self._bar_collection
+
+    @property
+    def nmr_bars(self) -> int:
+        return self.load().nmr_bars
+
+    @property
+    def maximum_bar_ind(self) -> int:
+        return self.load().maximum_bar_ind
+
+    def get_synchronous_bar_sequences(self) -> dict[int_bar_index, SynchronousBarSequence]:
+        return self.load().get_synchronous_bar_sequences()
+
+    def get_synchronous_bar_sequence(self, bar_index: int_bar_index) -> SynchronousBarSequence:
+        return self.load().get_synchronous_bar_sequence(bar_index)
+
+    def get_staff_names(self) -> list[str_staff_name]:
+        if self._bar_collection is not None:
+            return self._bar_collection.get_staff_names()
+        if self._staff_names is None:
+            self._staff_names = self._bar_collection_loader.load_staff_names()
+        return list(self._staff_names)
+
+    def get_bar_sequences(self, staff_name: str_staff_name) -> dict[int_bar_index, BarSequence]:
+        return self.load().get_bar_sequences(staff_name)
+
+    def get_bar_sequence(self, staff_name: str_staff_name, bar_index: int_bar_index) -> BarSequence:
+        return self.load().get_bar_sequence(staff_name, bar_index)
+
+    def get_synchronous_selection(self, dice_table_elements: list[DiceTableElement]) -> list[SynchronousBarSequence]:
+        return self.load().get_synchronous_selection(dice_table_elements)
+
+    def get_bar_selection(self,
+                          staff_name: str_staff_name,
+                          dice_table_elements: list[DiceTableElement]) -> list[BarSequence]:
+        return self.load().get_bar_selection(staff_name, dice_table_elements)
+
 
 class SimpleBarCollectionCSVWriter(BarCollectionCSVWriter):
     """A simple CSV writer for bar collections."""
@@ -68,7 +163,8 @@ class CSVBarCollectionLoader(BarCollectionLoader):
     def __init__(self,
                  bar_data_csv: Path | Traversable,
                  annotation_data_csv: Path | Traversable | None = None,
-                 annotation_loader: AnnotationLoader | None = None):
+                 annotation_loader: AnnotationLoader | None = None,
+                 interned: bool = False):
         """Load a bar collection for a CSV file.
 
        When using this bar collection loader, bar's data are stored in CSV files, with for each synchronous bar,
@@ -80,18 +176,69 @@ class CSVBarCollectionLoader(BarCollectionLoader):
            bar_data_csv: path reference to the bar's data to load
            annotation_data_csv: reference to the annotation data to load
            annotation_loader: the factory method for the annotations's data.
+           interned: if set, we load the data into a compact :class:`InternedBarCollection` instead of a
+                :class:`SimpleBarCollection`.
        """
         self._bar_data_csv = bar_data_csv
         self._annotation_data_csv = annotation_data_csv
         self._annotation_loader = annotation_loader
+        self._interned = interned
+
+    @property
+    def bar_data_csv(self) -> Path | Traversable:
+        """The CSV file with the bar's data."""
+        return self._bar_data_csv
+
+    @property
+    def annotation_data_csv(self) -> Path | Traversable | None:
+        """The CSV file with the annotations, if any."""
+        return self._annotation_data_csv
+
+    @property
+    def annotation_loader(self) -> AnnotationLoader | None:
+        """The loader for the annotations, if any."""
+        return self._annotation_loader
 
     def load_data(self) -> BarCollection:
         annotations = None
         if self._annotation_data_csv is not None:
             annotations = self._load_annotations()
 
-        bars_by_index_and_sequence = {}
-        with (open(self._bar_data_csv, 'r', newline='') as csvfile):
+        staff_names, lilypond_strings = self.load_lilypond_strings()
+
+        if self._interned:
+            bar_annotations = None
+            if annotations is not None:
+                bar_annotations = {}
+                for bar_index, bar_sequence_strings in lilypond_strings.items():
+                    staff_annotations = [annotations[bar_index][staff_name] for staff_name in staff_names]
+                    bar_annotations[bar_index] = [staff_annotations] * len(bar_sequence_strings)
+            return InternedBarCollection.from_lilypond_strings(staff_names, lilypond_strings, bar_annotations)
+
+        bar_collection = {}
+        for bar_index, bar_sequence_strings in lilypond_strings.items():
+            sync_bars = []
+            for bar_strings in bar_sequence_strings:
+                bars = {}
+                for staff_name, bar_str in zip(staff_names, bar_strings):
+                    annotation = None
+                    if annotations is not None:
+                        annotation = annotations[bar_index][staff_name]
+
+                    bars[staff_name] = SimpleBar(bar_str, annotation=annotation)
+                sync_bars.append(SimpleSynchronousBar(frozendict(bars)))
+            bar_collection[bar_index] = SimpleSynchronousBarSequence(tuple(sync_bars))
+
+        return SimpleBarCollection(bar_collection)
+
+    def load_lilypond_strings(self) -> tuple[list[str_staff_name], dict[int_bar_index, list[list[str]]]]:
+        """Load the lilypond strings of all bars, without constructing the bar objects.
+
+        Returns:
+            The staff names, and per bar index, for each bar in the sequence a list with per staff the lilypond string.
+        """
+        strings_by_index_and_sequence = {}
+        with open(self._bar_data_csv, 'r', newline='') as csvfile:
             bar_reader = csv.reader(csvfile, dialect='unix')
 
             header = next(bar_reader)
@@ -105,47 +252,48 @@ class CSVBarCollectionLoader(BarCollectionLoader):
                 first_data_column_ind = 1
 
             for row in bar_reader:
-                sync_bars = {}
-                for staff_ind, bar_str in enumerate(row[first_data_column_ind:]):
-                    annotation = None
-                    if annotations is not None:
-                        annotation = annotations[int(row[0])][staff_names[staff_ind]]
-
-                    sync_bars[staff_names[staff_ind]] = SimpleBar(bar_str, annotation=annotation)
-
                 if has_sequences:
                     sequence_ind = row[1]
                 else:
                     sequence_ind = 0
 
-                sequence_dict = bars_by_index_and_sequence.setdefault(int(row[0]), {})
-                sequence_dict[int(sequence_ind)] = SimpleSynchronousBar(frozendict(sync_bars))
+                sequence_dict = strings_by_index_and_sequence.setdefault(int(row[0]), {})
+                sequence_dict[int(sequence_ind)] = row[first_data_column_ind:]
 
-        bar_collection = {}
-        for bar_index, bar_sequences in bars_by_index_and_sequence.items():
-            bar_collection[bar_index] = SimpleSynchronousBarSequence(
-                tuple(dict(sorted(bar_sequences.items())).values()))
+        lilypond_strings = {bar_index: list(dict(sorted(bar_sequences.items())).values())
+                            for bar_index, bar_sequences in strings_by_index_and_sequence.items()}
+        return staff_names, lilypond_strings
 
-        return SimpleBarCollection(bar_collection)
+    def load_annotation_strings(self) -> dict[int_bar_index, dict[str_staff_name, str]] | None:
+        """Load the annotation data of each bar of each staff, without loading them with the annotation loader.
 
-    def _load_annotations(self) -> dict[int_bar_index, dict[str_staff_name, BarAnnotation]]:
-        """Load the annotations for each bar of each staff."""
-        annotations_data = {}
+        Returns:
+            The annotation strings per bar index and staff, or None if this loader has no annotations.
+        """
+        if self._annotation_data_csv is None:
+            return None
 
+        annotation_strings = {}
         with open(self._annotation_data_csv, 'r', newline='') as csvfile:
             annotation_reader = csv.reader(csvfile, dialect='unix')
 
-            staff_names = None
-            for row_ind, row in enumerate(annotation_reader):
-                if row_ind == 0:
-                    staff_names = row[1:]
-                else:
-                    annotations = []
-                    for annotation_str in row[1:]:
-                        annotations.append(self._annotation_loader.load_annotation(annotation_str))
-                    annotations_data[int(row[0])] = dict(zip(staff_names, annotations))
+            staff_names = next(annotation_reader)[1:]
+            for row in annotation_reader:
+                annotation_strings[int(row[0])] = dict(zip(staff_names, row[1:]))
+        return annotation_strings
 
-        return annotations_data
+    def load_staff_names(self) -> list[str_staff_name]:
+        with open(self._bar_data_csv, 'r', newline='') as csvfile:
+            header = next(csv.reader(csvfile, dialect='unix'))
+        if header[1] == 'sequence_index':
+            return header[2:]
+        return header[1:]
+
+    def _load_annotations(self) -> dict[int_bar_index, dict[str_staff_name, BarAnnotation]]:
+        """Load the annotations for each bar of each staff."""
+        return {bar_index: {staff_name: self._annotation_loader.load_annotation(annotation_str)
+                            for staff_name, annotation_str in staff_annotations.items()}
+                for bar_index, staff_annotations in self.load_annotation_strings().items()}
 
 
 class AnnotationLoader(metaclass=ABCMeta):
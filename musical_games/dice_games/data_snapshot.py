@@ -0,0 +1,291 @@
+from __future__ import annotations
+
+__author__ = 'Robbert Harms'
+__date__ = '2026-10-18'
+__maintainer__ = 'Robbert Harms'
+__email__ = 'robbert@xkls.nl'
+__licence__ = 'LGPL v3'
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+import tempfile
+from importlib.abc import Traversable
+from pathlib import Path
+
+import numpy as np
+
+from musical_games.dice_games.base import BarCollection, InternedBarCollection, str_staff_name
+from musical_games.dice_games.data_csv import BarCollectionLoader, CSVBarCollectionLoader
+
+SNAPSHOT_VERSION = 1
+"""The version of the snapshot format, snapshots with a different version are considered stale."""
+
+_magic = b'MGSNAP\r\n'
+_preamble = struct.Struct('<8sII')
+_alignment = 8
+
+
+class SnapshotError(Exception):
+    """Raised when a snapshot can not be used, because it is missing, stale or corrupt."""
+
+
+class SnapshotBarCollectionLoader(BarCollectionLoader):
+
+    def __init__(self, csv_loader: CSVBarCollectionLoader, snapshot_file: Path | None = None):
+        """Load a bar collection from a precompiled binary snapshot of the CSV data, falling back to the CSV files.
+
+        The snapshot holds the bars in the columnar layout of :class:`InternedBarCollection`: a few integer arrays,
+        a table of unique lilypond strings and a table of unique annotation strings. Loading it only requires memory
+        mapping the file, instead of parsing the CSV files. Each annotation string is loaded once with the annotation
+        loader of the CSV loader.
+
+        The snapshot stores the sizes, modification times and checksums of the CSV files it was compiled from. On
+        load, the CSV files are only hashed if their size or modification time differs from those stored. If the
+        snapshot is missing, was written with another format version, or the CSV files changed since, we load the CSV
+        files instead. Use :meth:`write_snapshot` to (re)compile the snapshot.
+
+        The snapshot file stays memory mapped for as long as the arrays of the loaded bar collection are in use.
+
+        Args:
+            csv_loader: the loader for the CSV data the snapshot is compiled from
+            snapshot_file: the snapshot file, defaults to the bar data CSV with the extension ``.snapshot``.
+        """
+        self._csv_loader = csv_loader
+        self._snapshot_file = snapshot_file or Path(csv_loader.bar_data_csv).with_suffix('.snapshot')
+
+    @property
+    def csv_loader(self) -> CSVBarCollectionLoader:
+        """The loader for the CSV data."""
+        return self._csv_loader
+
+    @property
+    def snapshot_file(self) -> Path:
+        """The path to the snapshot file."""
+        return self._snapshot_file
+
+    def load_data(self) -> BarCollection:
+        try:
+            return self.load_snapshot()
+        except SnapshotError:
+            return self._csv_loader.load_data()
+
+    def load_staff_names(self) -> list[str_staff_name]:
+        return self._csv_loader.load_staff_names()
+
+    def is_stale(self) -> bool:
+        """Check if the snapshot is missing, or out of date with the CSV files.
+
+        Returns:
+            True if the snapshot can not be used and should be rebuilt, False otherwise.
+        """
+        try:
+            self.load_snapshot()
+        except SnapshotError:
+            return True
+        return False
+
+    def load_snapshot(self, verify_payload: bool = False) -> InternedBarCollection:
+        """Load the bar collection from the snapshot, without falling back to the CSV files.
+
+        The checksum of the payload is verified when writing the snapshot, and only on request when loading it.
+
+        Args:
+            verify_payload: if set, we verify the checksum of the payload of the snapshot.
+
+        Returns:
+            The bar collection stored in the snapshot.
+
+        Raises:
+            SnapshotError: if the snapshot is missing, stale or corrupt.
+        """
+        try:
+            with open(self._snapshot_file, 'rb') as f:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as exc:
+            raise SnapshotError(f'Could not open the snapshot "{self._snapshot_file}".') from exc
+
+        arrays = {}
+        annotation_ids = None
+        try:
+            if len(buffer) < _preamble.size:
+                raise SnapshotError('The snapshot is truncated.')
+            magic, version, header_length = _preamble.unpack_from(buffer)
+            if magic != _magic:
+                raise SnapshotError('The file is not a bar collection snapshot.')
+            if version != SNAPSHOT_VERSION:
+                raise SnapshotError(f'The snapshot has version {version}, expected version {SNAPSHOT_VERSION}.')
+
+            try:
+                header = json.loads(buffer[_preamble.size:_preamble.size + header_length])
+                source_checksums = header['source_checksums']
+                source_stats = header.get('source_stats', {})
+                payload_checksum = header['payload_checksum']
+                array_layout = header['arrays']
+                staff_names = header['staff_names']
+            except (ValueError, KeyError, TypeError, AttributeError) as exc:
+                raise SnapshotError('The snapshot header is corrupt.') from exc
+
+            if not self._is_up_to_date(source_stats, source_checksums):
+                raise SnapshotError('The snapshot is out of date with the CSV files.')
+
+            payload_offset = _get_payload_offset(header_length)
+            if verify_payload and hashlib.sha256(buffer[payload_offset:]).hexdigest() != payload_checksum:
+                raise SnapshotError('The snapshot payload is corrupt.')
+
+            try:
+                for name, (offset, dtype, shape) in array_layout.items():
+                    arrays[name] = np.frombuffer(buffer, dtype=dtype, count=int(np.prod(shape)),
+                                                 offset=payload_offset + offset).reshape(shape)
+                strings = _decode_strings(arrays['string_offsets'].tolist(), arrays['string_data'].tobytes())
+                annotation_strings = None
+                if 'annotation_ids' in arrays:
+                    annotation_strings = _decode_strings(arrays['annotation_offsets'].tolist(),
+                                                         arrays['annotation_data'].tobytes())
+            except (ValueError, TypeError, KeyError) as exc:
+                raise SnapshotError('The snapshot payload is corrupt.') from exc
+
+            annotations = None
+            if annotation_strings is not None:
+                annotation_loader = self._csv_loader.annotation_loader
+                annotations = tuple(annotation_loader.load_annotation(annotation_str)
+                                    for annotation_str in annotation_strings)
+                annotation_ids = arrays['annotation_ids']
+
+            return InternedBarCollection(staff_names, arrays['bar_indices'], arrays['sequence_offsets'],
+                                         arrays['string_ids'], strings, annotation_ids, annotations)
+        except BaseException:
+            arrays.clear()
+            annotation_ids = None
+            try:
+                buffer.close()
+            except BufferError:
+                pass  # still referenced from the traceback, the buffer is closed when that is collected
+            raise
+
+    def write_snapshot(self):
+        """Compile the CSV data into the snapshot file.
+
+        The snapshot is first written to a temporary file which then replaces the snapshot file, such that readers
+        never observe a partially written snapshot.
+        """
+        staff_names, lilypond_strings = self._csv_loader.load_lilypond_strings()
+        annotation_strings = self._csv_loader.load_annotation_strings()
+
+        string_table = {}
+        annotation_table = {}
+        sequence_offsets = [0]
+        string_ids = []
+        annotation_ids = []
+        for bar_index, bar_sequence_strings in lilypond_strings.items():
+            for staff_strings in bar_sequence_strings:
+                string_ids.append([string_table.setdefault(bar_str, len(string_table)) for bar_str in staff_strings])
+                if annotation_strings is not None:
+                    annotation_ids.append([
+                        annotation_table.setdefault(annotation_strings[bar_index][staff_name], len(annotation_table))
+                        for staff_name in staff_names])
+            sequence_offsets.append(len(string_ids))
+
+        arrays = {
+            'bar_indices': np.array(list(lilypond_strings), dtype='<i4'),
+            'sequence_offsets': np.array(sequence_offsets, dtype='<i4'),
+            'string_ids': np.array(string_ids, dtype='<i4').reshape((-1, len(staff_names))),
+        }
+        arrays['string_offsets'], arrays['string_data'] = _encode_strings(string_table)
+        if annotation_strings is not None:
+            arrays['annotation_ids'] = np.array(annotation_ids, dtype='<i4').reshape((-1, len(staff_names)))
+            arrays['annotation_offsets'], arrays['annotation_data'] = _encode_strings(annotation_table)
+
+        payload = bytearray()
+        array_layout = {}
+        for name, array in arrays.items():
+            payload.extend(b'\x00' * (-len(payload) % _alignment))
+            array_layout[name] = (len(payload), array.dtype.str, array.shape)
+            payload.extend(array.tobytes())
+
+        header = {
+            'staff_names': staff_names,
+            'source_stats': {name: _file_stat(source) for name, source in self._get_sources().items()},
+            'source_checksums': self._get_source_checksums(),
+            'payload_checksum': hashlib.sha256(payload).hexdigest(),
+            'arrays': array_layout,
+        }
+        header_bytes = json.dumps(header).encode()
+        padding = b'\x00' * (_get_payload_offset(len(header_bytes)) - _preamble.size - len(header_bytes))
+
+        snapshot_file = Path(self._snapshot_file)
+        with tempfile.NamedTemporaryFile('wb', dir=snapshot_file.parent, delete=False) as f:
+            f.write(_preamble.pack(_magic, SNAPSHOT_VERSION, len(header_bytes)))
+            f.write(header_bytes + padding)
+            f.write(payload)
+        os.replace(f.name, snapshot_file)
+        self.load_snapshot(verify_payload=True)
+
+    def _is_up_to_date(self, source_stats: dict[str, list[int]], source_checksums: dict[str, str]) -> bool:
+        """Check if the CSV files are unchanged since the snapshot was compiled.
+
+        If the sizes and modification times of all CSV files equal those stored in the snapshot, we consider them
+        unchanged without reading them. Otherwise, for example after a fresh checkout, we compare their checksums.
+
+        Args:
+            source_stats: per CSV file the size and modification time stored in the snapshot
+            source_checksums: per CSV file the checksum stored in the snapshot
+
+        Returns:
+            If the snapshot is up to date with the CSV files.
+        """
+        sources = self._get_sources()
+        if sources.keys() != source_checksums.keys():
+            return False
+        if all((stat := _file_stat(source)) is not None and stat == source_stats.get(name)
+               for name, source in sources.items()):
+            return True
+        return source_checksums == self._get_source_checksums()
+
+    def _get_sources(self) -> dict[str, Path | Traversable]:
+        """Get the CSV files the snapshot is compiled from."""
+        sources = {'bar_data': self._csv_loader.bar_data_csv}
+        if self._csv_loader.annotation_data_csv is not None:
+            sources['annotation_data'] = self._csv_loader.annotation_data_csv
+        return sources
+
+    def _get_source_checksums(self) -> dict[str, str]:
+        """Get the checksums of the CSV files the snapshot is compiled from."""
+        return {name: _file_checksum(source) for name, source in self._get_sources().items()}
+
+
+def _get_payload_offset(header_length: int) -> int:
+    """Get the offset of the payload in a snapshot file, the first aligned position after the header."""
+    header_end = _preamble.size + header_length
+    return header_end + (-header_end % _alignment)
+
+
+def _file_stat(source: Path | Traversable) -> list[int] | None:
+    """Get the size and modification time in nanoseconds of a file, or None if not a file on the file system."""
+    if not isinstance(source, Path):
+        return None
+    try:
+        stat_result = os.stat(source)
+    except OSError:
+        return None
+    return [stat_result.st_size, stat_result.st_mtime_ns]
+
+
+def _file_checksum(source: Path | Traversable) -> str:
+    """Get the SHA-256 checksum of a file."""
+    return hashlib.sha256(source.read_bytes()).hexdigest()
+
+
+def _encode_strings(strings: dict[str, int]) -> tuple[np.ndarray, np.ndarray]:
+    """Encode a table of strings into an array of offsets and an array of concatenated UTF-8 data."""
+    encoded = [string.encode() for string in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype='<i8')
+    np.cumsum([len(data) for data in encoded], out=offsets[1:])
+    return offsets, np.frombuffer(b''.join(encoded), dtype=np.uint8)
+
+
+def _decode_strings(offsets: list[int], data: bytes) -> tuple[str, ...]:
+    """Decode a table of strings from a list of offsets and the concatenated UTF-8 data."""
+    return tuple(data[start:end].decode() for start, end in zip(offsets[:-1], offsets[1:]))
@@ -4,22 +4,27 @@ __maintainer__ = 'Robbert Harms'
 __email__ = 'robbert@xkls.nl'
 __licence__ = 'LGPL v3'
 
+import functools
 import json
-import re
 from dataclasses import dataclass
 from importlib import resources
 
-from musical_games.dice_games.base import (SimpleDiceTable, SimpleMidiSettings, SimpleDiceGame, BarAnnotation)
+from musical_games.dice_games.base import (SimpleDiceTable, SimpleMidiSettings, SimpleDiceGame, BarAnnotation,
+                                           RenderOptions, MidiSection, split_voices)
 from musical_games.dice_games.data_csv import CSVBarCollectionLoader, AnnotationLoader
+from musical_games.dice_games.data_snapshot import SnapshotBarCollectionLoader
 
 
 class CPEBachCounterpoint(SimpleDiceGame):
 
-    def __init__(self):
+    def __init__(self, render_options: RenderOptions | None = None):
         """Implementation of a Counterpoint dice by C.P.E. Bach.
 
         In this dice game, the right hand and left hand of the piano piece are shuffled independently by two
         dice tables.
+
+        Args:
+            render_options: the options for rendering the lilypond templates
         """
         dice_tables = {
             'treble': SimpleDiceTable.from_lists([
@@ -45,26 +50,32 @@ class CPEBachCounterpoint(SimpleDiceGame):
         }
         data_name = 'cpe_bach_counterpoint'
 
-        treble_bars = CSVBarCollectionLoader(resources.files('musical_games')
-                                             / f'data/dice_games/{data_name}/bars_treble.csv').load_data()
-        bass_bars = CSVBarCollectionLoader(resources.files('musical_games')
-                                           / f'data/dice_games/{data_name}/bars_bass.csv').load_data()
+        treble_bars = SnapshotBarCollectionLoader(CSVBarCollectionLoader(
+            resources.files('musical_games') / f'data/dice_games/{data_name}/bars_treble.csv')).load_lazy()
+        bass_bars = SnapshotBarCollectionLoader(CSVBarCollectionLoader(
+            resources.files('musical_games') / f'data/dice_games/{data_name}/bars_bass.csv')).load_lazy()
 
         midi_settings = SimpleMidiSettings(
             {'treble': {'piano_right_hand': 'acoustic grand'}, 'bass': {'piano_left_hand': 'acoustic grand'}},
             {'treble': {'piano_right_hand': 0}, 'bass': {'piano_left_hand': 0}},
             {'treble': {'piano_right_hand': 1}, 'bass': {'piano_left_hand': 0.75}})
 
+        midi_sections = [MidiSection(('treble', 'bass'), 100)]
+
         super().__init__('C.P.E. Bach', 'Counterpoint', dice_tables, {'treble': treble_bars, 'bass': bass_bars},
-                         self._generate_jinja2_environment(data_name), midi_settings)
+                         functools.partial(self._generate_jinja2_environment, data_name, render_options), midi_settings,
+                         render_options=render_options, midi_sections=midi_sections)
 
 
 class KirnbergerMenuetTrio(SimpleDiceGame):
 
-    def __init__(self):
+    def __init__(self, render_options: RenderOptions | None = None):
         """Implementation of a Menuet and Trio dice game by Kirnberger.
 
         In this dice game, there is a dice table for the menuet and one for the trio.
+
+        Args:
+            render_options: the options for rendering the lilypond templates
         """
         dice_tables = {
             'menuet': SimpleDiceTable.from_lists([
@@ -84,10 +95,12 @@ class KirnbergerMenuetTrio(SimpleDiceGame):
         }
         data_name = 'kirnberger_menuet_trio'
 
-        bar_collections = {'menuet': CSVBarCollectionLoader(resources.files('musical_games') /
-                                                            f'data/dice_games/{data_name}/menuet_bars.csv').load_data(),
-                           'trio': CSVBarCollectionLoader(resources.files('musical_games') /
-                                                          f'data/dice_games/{data_name}/trio_bars.csv').load_data()}
+        bar_collections = {
+            'menuet': SnapshotBarCollectionLoader(CSVBarCollectionLoader(
+                resources.files('musical_games') / f'data/dice_games/{data_name}/menuet_bars.csv')).load_lazy(),
+            'trio': SnapshotBarCollectionLoader(CSVBarCollectionLoader(
+                resources.files('musical_games') / f'data/dice_games/{data_name}/trio_bars.csv')).load_lazy()
+        }
 
         midi_settings = SimpleMidiSettings(
             {'menuet': {'piano_right_hand': 'acoustic grand', 'piano_left_hand': 'acoustic grand'},
@@ -97,16 +110,25 @@ class KirnbergerMenuetTrio(SimpleDiceGame):
             {'menuet': {'piano_right_hand': 1, 'piano_left_hand': 0.75},
              'trio': {'piano_right_hand': 1, 'piano_left_hand': 0.75}})
 
+        midi_sections = [
+            MidiSection(('menuet',), 100, (*range(8), *range(8), *range(8, 16), *range(8, 16))),
+            MidiSection(('trio',), 80, (*range(8), *range(8), *range(8, 16), *range(8, 16))),
+            MidiSection(('menuet',), 100)]
+
         super().__init__('Kirnberger', 'Menuet and Trio', dice_tables, bar_collections,
-                         self._generate_jinja2_environment(data_name), midi_settings)
+                         functools.partial(self._generate_jinja2_environment, data_name, render_options), midi_settings,
+                         render_options=render_options, midi_sections=midi_sections)
 
 
 class KirnbergerPolonaise(SimpleDiceGame):
 
-    def __init__(self):
+    def __init__(self, render_options: RenderOptions | None = None):
         """Implementation of a Polonaise dice game by Kirnberger.
 
         This dice game has measures for a piano part and two violin parts.
+
+        Args:
+            render_options: the options for rendering the lilypond templates
         """
         dice_tables = {
             'polonaise': SimpleDiceTable.from_lists([
@@ -125,8 +147,8 @@ class KirnbergerPolonaise(SimpleDiceGame):
         data_name = 'kirnberger_polonaise'
 
         bar_collections = {
-            'polonaise': CSVBarCollectionLoader(resources.files('musical_games') /
-                                                f'data/dice_games/{data_name}/polonaise_bars.csv').load_data()
+            'polonaise': SnapshotBarCollectionLoader(CSVBarCollectionLoader(
+                resources.files('musical_games') / f'data/dice_games/{data_name}/polonaise_bars.csv')).load_lazy()
         }
 
         midi_settings = SimpleMidiSettings(
@@ -137,14 +159,21 @@ class KirnbergerPolonaise(SimpleDiceGame):
             {'polonaise': {'piano_right_hand': 0.75, 'piano_left_hand': 0.6,
                            'violin_1': 0.8625, 'violin_2': 0.8625}})
 
+        midi_sections = [MidiSection(('polonaise',), 70, (*range(14), *range(2, 6)))]
+
         super().__init__('Kirnberger', 'Polonaise', dice_tables, bar_collections,
-                         self._generate_jinja2_environment(data_name), midi_settings)
+                         functools.partial(self._generate_jinja2_environment, data_name, render_options), midi_settings,
+                         render_options=render_options, midi_sections=midi_sections)
 
 
 class MozartContredanse(SimpleDiceGame):
 
-    def __init__(self):
-        """Implementation of a Contredanse dice game by Mozart."""
+    def __init__(self, render_options: RenderOptions | None = None):
+        """Implementation of a Contredanse dice game by Mozart.
+
+        Args:
+            render_options: the options for rendering the lilypond templates
+        """
         dice_tables = {
             'contredanse': SimpleDiceTable.from_lists([
                 [70, 14, 164, 122, 25, 153, 18, 167, 155, 3, 162, 170, 13, 166, 95, 5],
@@ -162,8 +191,8 @@ class MozartContredanse(SimpleDiceGame):
         data_name = 'mozart_contredanse'
 
         bar_collections = {
-            'contredanse': CSVBarCollectionLoader(resources.files('musical_games') /
-                                                  f'data/dice_games/{data_name}/contredanse_bars.csv').load_data()
+            'contredanse': SnapshotBarCollectionLoader(CSVBarCollectionLoader(
+                resources.files('musical_games') / f'data/dice_games/{data_name}/contredanse_bars.csv')).load_lazy()
         }
 
         midi_settings = SimpleMidiSettings(
@@ -171,20 +200,23 @@ class MozartContredanse(SimpleDiceGame):
             {'contredanse': {'piano_right_hand': 0, 'piano_left_hand': 0}},
             {'contredanse': {'piano_right_hand': 1, 'piano_left_hand': 0.75}})
 
-        def split_voices(voices):
-            return re.findall(r'<<{\\voiceOne ([^}]*)} \\new Voice {\\voiceTwo ([^}]*)}>>', voices)[0]
+        jinja2_env = functools.partial(self._generate_jinja2_environment, data_name, render_options,
+                                       {'split_voices': split_voices})
 
-        jinja2_env = self._generate_jinja2_environment(data_name)
-        jinja2_env.globals['split_voices'] = split_voices
+        midi_sections = [MidiSection(('contredanse',), 70, (*range(8), *range(8), *range(8, 16), *range(8, 16)))]
 
         super().__init__('Mozart', 'Contredanse', dice_tables, bar_collections,
-                         jinja2_env, midi_settings)
+                         jinja2_env, midi_settings, render_options=render_options, midi_sections=midi_sections)
 
 
 class MozartWaltz(SimpleDiceGame):
 
-    def __init__(self):
-        """Implementation of a Waltz dice game by Mozart."""
+    def __init__(self, render_options: RenderOptions | None = None):
+        """Implementation of a Waltz dice game by Mozart.
+
+        Args:
+            render_options: the options for rendering the lilypond templates
+        """
         dice_tables = {
             'waltz': SimpleDiceTable.from_lists([
                 [96, 22, 141, 41, 105, 122, 11, 30, 70, 121, 26, 9, 112, 49, 109, 14],
@@ -201,32 +233,36 @@ class MozartWaltz(SimpleDiceGame):
         }
         data_name = 'mozart_waltz'
 
-        bar_collections = {'waltz': CSVBarCollectionLoader(resources.files('musical_games') /
-                                                           f'data/dice_games/{data_name}/waltz_bars.csv').load_data()}
+        bar_collections = {
+            'waltz': SnapshotBarCollectionLoader(CSVBarCollectionLoader(
+                resources.files('musical_games') / f'data/dice_games/{data_name}/waltz_bars.csv')).load_lazy()
+        }
 
         midi_settings = SimpleMidiSettings(
             {'waltz': {'piano_right_hand': 'acoustic grand', 'piano_left_hand': 'acoustic grand'}},
             {'waltz': {'piano_right_hand': 0, 'piano_left_hand': 0}},
             {'waltz': {'piano_right_hand': 1, 'piano_left_hand': 0.75}})
 
-        def split_voices(voices):
-            return re.findall(r'<<{\\voiceOne ([^}]*)} \\new Voice {\\voiceTwo ([^}]*)}>>', voices)[0]
+        jinja2_env = functools.partial(self._generate_jinja2_environment, data_name, render_options,
+                                       {'split_voices': split_voices})
 
-        jinja2_env = self._generate_jinja2_environment(data_name)
-        jinja2_env.globals['split_voices'] = split_voices
+        midi_sections = [MidiSection(('waltz',), 55, (*range(8), *range(8), *range(8, 16), *range(8, 16)))]
 
         super().__init__('Mozart', 'Waltz', dice_tables, bar_collections,
-                         jinja2_env, midi_settings)
+                         jinja2_env, midi_settings, render_options=render_options, midi_sections=midi_sections)
 
 
 class StadlerMenuetTrio(SimpleDiceGame):
 
-    def __init__(self):
+    def __init__(self, render_options: RenderOptions | None = None):
         """Implementation of a Menuet and Trio dice game by Stadler.
 
         A similar dice game has been made by Haydn.
 
         In this dice game, there is a dice table for the menuet and one for the trio.
+
+        Args:
+            render_options: the options for rendering the lilypond templates
         """
         dice_tables = {
             'menuet': SimpleDiceTable.from_lists([
@@ -251,10 +287,12 @@ class StadlerMenuetTrio(SimpleDiceGame):
         }
         data_name = 'stadler_menuet_trio'
 
-        bar_collections = {'menuet': CSVBarCollectionLoader(resources.files('musical_games') /
-                                                            f'data/dice_games/{data_name}/menuet_bars.csv').load_data(),
-                           'trio': CSVBarCollectionLoader(resources.files('musical_games') /
-                                                          f'data/dice_games/{data_name}/trio_bars.csv').load_data()}
+        bar_collections = {
+            'menuet': SnapshotBarCollectionLoader(CSVBarCollectionLoader(
+                resources.files('musical_games') / f'data/dice_games/{data_name}/menuet_bars.csv')).load_lazy(),
+            'trio': SnapshotBarCollectionLoader(CSVBarCollectionLoader(
+                resources.files('musical_games') / f'data/dice_games/{data_name}/trio_bars.csv')).load_lazy()
+        }
 
         midi_settings = SimpleMidiSettings(
             {'menuet': {'piano_right_hand': 'acoustic grand', 'piano_left_hand': 'acoustic grand'},
@@ -264,14 +302,24 @@ class StadlerMenuetTrio(SimpleDiceGame):
             {'menuet': {'piano_right_hand': 1, 'piano_left_hand': 0.75},
              'trio': {'piano_right_hand': 1, 'piano_left_hand': 0.75}})
 
+        midi_sections = [
+            MidiSection(('menuet',), 100, (*range(8), *range(8), *range(8, 16), *range(8, 16))),
+            MidiSection(('trio',), 80, (*range(8), *range(8), *range(8, 16), *range(8, 16))),
+            MidiSection(('menuet',), 100)]
+
         super().__init__('Stadler', 'Menuet and Trio', dice_tables, bar_collections,
-                         self._generate_jinja2_environment(data_name), midi_settings)
+                         functools.partial(self._generate_jinja2_environment, data_name, render_options), midi_settings,
+                         render_options=render_options, midi_sections=midi_sections)
 
 
 class GerlachScottishDance(SimpleDiceGame):
 
-    def __init__(self):
-        """Implementation of a Scottish dance dice game by Gerlach."""
+    def __init__(self, render_options: RenderOptions | None = None):
+        """Implementation of a Scottish dance dice game by Gerlach.
+
+        Args:
+            render_options: the options for rendering the lilypond templates
+        """
         dice_tables = {
             'dance': SimpleDiceTable.from_lists([
                 [(65, 14), (29, 17), (108, 96), (37, 50), (41, 35), (92, 139), (49, 90), (11, 59)],
@@ -296,7 +344,7 @@ class GerlachScottishDance(SimpleDiceGame):
                                 f'data/dice_games/{data_name}/scottish_dance_bars_annotations.csv',
             annotation_loader=GerlachScottishDance.GerlachAnnotationLoader()
         )
-        bars = csv_reader.load_data()
+        bars = SnapshotBarCollectionLoader(csv_reader).load_lazy()
 
         bar_collections = {'dance': bars,
                            'trio': bars}
@@ -309,8 +357,14 @@ class GerlachScottishDance(SimpleDiceGame):
             {'dance': {'piano_right_hand': 1, 'piano_left_hand': 0.75},
              'trio': {'piano_right_hand': 1, 'piano_left_hand': 0.75}})
 
+        midi_sections = [
+            MidiSection(('dance',), 70, (*range(4), *range(4), *range(4, 8), *range(4, 8))),
+            MidiSection(('trio',), 80, (*range(4), *range(4), *range(4, 8), *range(4, 8))),
+            MidiSection(('dance',), 70)]
+
         super().__init__('Gerlach', 'Scottish dance', dice_tables, bar_collections,
-                         self._generate_jinja2_environment(data_name), midi_settings)
+                         functools.partial(self._generate_jinja2_environment, data_name, render_options), midi_settings,
+                         render_options=render_options, midi_sections=midi_sections)
 
     @dataclass(frozen=True, slots=True)
     class GerlachAnnotation(BarAnnotation):
@@ -336,8 +390,12 @@ class GerlachScottishDance(SimpleDiceGame):
 
 class CalegariAria(SimpleDiceGame):
 
-    def __init__(self):
-        """Implementation of an Aria by Calegari."""
+    def __init__(self, render_options: RenderOptions | None = None):
+        """Implementation of an Aria by Calegari.
+
+        Args:
+            render_options: the options for rendering the lilypond templates
+        """
         dice_tables = {
             'part_one': SimpleDiceTable.from_lists([
                 [150, 142, 18, 85, 62, 3, 152, 94],
@@ -367,8 +425,8 @@ class CalegariAria(SimpleDiceGame):
         }
         data_name = 'calegari_aria'
 
-        bars = CSVBarCollectionLoader(resources.files('musical_games') /
-                               f'data/dice_games/{data_name}/bars_aria.csv').load_data()
+        bars = SnapshotBarCollectionLoader(CSVBarCollectionLoader(
+            resources.files('musical_games') / f'data/dice_games/{data_name}/bars_aria.csv')).load_lazy()
 
         bar_collections = {
             'part_one': bars,
@@ -386,5 +444,8 @@ class CalegariAria(SimpleDiceGame):
             {'part_one': {'chant': 1, 'piano_right_hand': 0.9, 'piano_left_hand': 0.8},
              'part_two': {'chant': 1, 'piano_right_hand': 0.9, 'piano_left_hand': 0.8}})
 
+        midi_sections = [MidiSection(('part_one',), 80), MidiSection(('part_two',), 80)]
+
         super().__init__('Calegari', 'Aria', dice_tables, bar_collections,
-                         self._generate_jinja2_environment(data_name), midi_settings)
+                         functools.partial(self._generate_jinja2_environment, data_name, render_options), midi_settings,
+                         render_options=render_options, midi_sections=midi_sections)
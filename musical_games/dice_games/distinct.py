@@ -0,0 +1,458 @@
+from __future__ import annotations
+
+__author__ = 'Robbert Harms'
+__date__ = '2026-10-18'
+__maintainer__ = 'Robbert Harms'
+__email__ = 'robbert@xkls.nl'
+__licence__ = 'LGPL v3'
+
+import contextlib
+import hashlib
+import json
+import math
+import os
+import struct
+import tempfile
+from abc import ABCMeta, abstractmethod
+from pathlib import Path
+from typing import Any, Iterator, Self
+
+import numpy as np
+
+from musical_games.dice_games.base import BarSelection, DiceGame
+
+if os.name == 'nt':
+    import msvcrt
+else:
+    import fcntl
+
+RANK_FILTER_VERSION = 1
+"""The version of the rank filter file format."""
+
+_magic = b'MGRANKS\n'
+_preamble = struct.Struct('<8sII')
+
+
+class RankFilter(metaclass=ABCMeta):
+    """Compact set of composition ranks, used to track which compositions were already emitted.
+
+    A rank filter never reports an added rank as absent. Depending on the implementation, it may report some ranks
+    which were never added as present.
+    """
+
+    @property
+    @abstractmethod
+    def nmr_added(self) -> int:
+        """The number of ranks added to this filter."""
+
+    @property
+    @abstractmethod
+    def bits(self) -> np.ndarray:
+        """The bits of this filter, as an array of bytes."""
+
+    @abstractmethod
+    def get_parameters(self) -> dict[str, Any]:
+        """Get the parameters needed to reconstruct this filter from its bits.
+
+        Returns:
+            The keyword arguments for the constructor of this filter, excluding the bits.
+        """
+
+    @abstractmethod
+    def contains(self, rank: int) -> bool:
+        """Check if a rank may have been added to this filter.
+
+        Args:
+            rank: the rank to check
+
+        Returns:
+            False if the rank was certainly never added, True otherwise.
+        """
+
+    @abstractmethod
+    def add(self, rank: int):
+        """Add a rank to this filter.
+
+        Args:
+            rank: the rank to add
+        """
+
+    @abstractmethod
+    def merge(self, other: Self):
+        """Add all the ranks of another filter to this filter, by combining their bits.
+
+        Args:
+            other: a filter of the same type and with the same parameters, apart from the number of ranks added.
+
+        Raises:
+            ValueError: if the other filter is not compatible with this filter.
+        """
+
+    def _check_compatible(self, other: RankFilter):
+        """Check if another filter can be merged into this filter, see :meth:`merge`."""
+        parameters = {k: v for k, v in self.get_parameters().items() if k != 'nmr_added'}
+        other_parameters = {k: v for k, v in other.get_parameters().items() if k != 'nmr_added'}
+        if type(other) is not type(self) or other_parameters != parameters:
+            raise ValueError(f'Can not merge a {type(other).__name__} with parameters {other_parameters} into a '
+                             f'{type(self).__name__} with parameters {parameters}.')
+
+
+class BitmapRankFilter(RankFilter):
+
+    def __init__(self, nmr_ranks: int, nmr_added: int = 0, bits: np.ndarray | None = None):
+        """Exact rank filter, holding one bit per possible rank.
+
+        Args:
+            nmr_ranks: the number of possible ranks
+            nmr_added: the number of ranks already added, when restoring the filter from its bits.
+            bits: the bits of the filter, when restoring the filter.
+        """
+        self._nmr_ranks = nmr_ranks
+        self._nmr_added = nmr_added
+        self._bits = np.zeros((nmr_ranks + 7) // 8, dtype=np.uint8) if bits is None else bits
+
+    @property
+    def nmr_added(self) -> int:
+        return self._nmr_added
+
+    @property
+    def bits(self) -> np.ndarray:
+        return self._bits
+
+    def get_parameters(self) -> dict[str, Any]:
+        return {'nmr_ranks': self._nmr_ranks, 'nmr_added': self._nmr_added}
+
+    def contains(self, rank: int) -> bool:
+        return bool(self._bits[rank >> 3] & (1 << (rank & 7)))
+
+    def add(self, rank: int):
+        if not self.contains(rank):
+            self._bits[rank >> 3] |= 1 << (rank & 7)
+            self._nmr_added += 1
+
+    def merge(self, other: BitmapRankFilter):
+        self._check_compatible(other)
+        np.bitwise_or(self._bits, other.bits, out=self._bits)
+        self._nmr_added = int(np.bitwise_count(self._bits).sum())
+
+
+class BloomRankFilter(RankFilter):
+
+    def __init__(self, nmr_bits: int, nmr_hashes: int, nmr_added: int = 0, bits: np.ndarray | None = None):
+        """Bloom filter over composition ranks.
+
+        Each rank sets a number of bits, at positions derived from a cryptographic hash of the rank. A rank is
+        reported as present if all its bits are set, which may happen for ranks never added (a false positive), but
+        never fails for an added rank.
+
+        Args:
+            nmr_bits: the number of bits in the filter
+            nmr_hashes: the number of bits set per rank
+            nmr_added: the number of ranks already added, when restoring the filter from its bits.
+            bits: the bits of the filter, when restoring the filter.
+        """
+        self._nmr_bits = nmr_bits
+        self._nmr_hashes = nmr_hashes
+        self._nmr_added = nmr_added
+        self._bits = np.zeros((nmr_bits + 7) // 8, dtype=np.uint8) if bits is None else bits
+
+    @classmethod
+    def from_capacity(cls, capacity: int, false_positive_rate: float) -> Self:
+        """Create a Bloom filter sized for a number of ranks and a maximum false positive rate.
+
+        Args:
+            capacity: the number of ranks we expect to add
+            false_positive_rate: the false positive rate after adding the expected number of ranks
+
+        Returns:
+            An empty Bloom filter of the optimal size.
+        """
+        nmr_bits = max(8, math.ceil(-capacity * math.log(false_positive_rate) / math.log(2) ** 2))
+        nmr_hashes = max(1, round(nmr_bits / capacity * math.log(2)))
+        return cls(nmr_bits, nmr_hashes)
+
+    @property
+    def nmr_added(self) -> int:
+        return self._nmr_added
+
+    @property
+    def bits(self) -> np.ndarray:
+        return self._bits
+
+    @property
+    def false_positive_rate(self) -> float:
+        """The current probability of a false positive, given the number of added ranks."""
+        return (1 - math.exp(-self._nmr_hashes * self._nmr_added / self._nmr_bits)) ** self._nmr_hashes
+
+    def get_parameters(self) -> dict[str, Any]:
+        return {'nmr_bits': self._nmr_bits, 'nmr_hashes': self._nmr_hashes, 'nmr_added': self._nmr_added}
+
+    def contains(self, rank: int) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._get_bit_positions(rank))
+
+    def add(self, rank: int):
+        if not self.contains(rank):
+            for position in self._get_bit_positions(rank):
+                self._bits[position >> 3] |= 1 << (position & 7)
+            self._nmr_added += 1
+
+    def merge(self, other: BloomRankFilter):
+        """Add all the ranks of another filter to this filter, by combining their bits.
+
+        The number of ranks in a Bloom filter can not be recovered from its bits, the merged filter takes the larger
+        of the two counts. This is exact if one filter holds all the ranks of the other, as is the case for filters
+        merged with a newer version of the same state file.
+
+        Args:
+            other: a filter with the same number of bits and hashes.
+
+        Raises:
+            ValueError: if the other filter is not compatible with this filter.
+        """
+        self._check_compatible(other)
+        np.bitwise_or(self._bits, other.bits, out=self._bits)
+        self._nmr_added = max(self._nmr_added, other.nmr_added)
+
+    def _get_bit_positions(self, rank: int) -> list[int]:
+        """Get the positions of the bits of a rank, using double hashing of a 128 bit digest of the rank."""
+        digest = hashlib.blake2b(rank.to_bytes(rank.bit_length() // 8 + 1, 'little'), digest_size=16).digest()
+        first_hash = int.from_bytes(digest[:8], 'little')
+        second_hash = int.from_bytes(digest[8:], 'little') | 1
+        return [(first_hash + ind * second_hash) % self._nmr_bits for ind in range(self._nmr_hashes)]
+
+
+_rank_filter_types: dict[str, type[RankFilter]] = {
+    'bitmap': BitmapRankFilter,
+    'bloom': BloomRankFilter,
+}
+
+
+def save_rank_filter(rank_filter: RankFilter, path: Path | str, metadata: dict[str, Any] | None = None):
+    """Write a rank filter to a file.
+
+    The filter is first written to a temporary file which then replaces the target file, such that an interrupted
+    write never corrupts the previous state.
+
+    Args:
+        rank_filter: the filter to save
+        path: the file to write to
+        metadata: additional JSON serializable information stored with the filter
+    """
+    filter_type = next(name for name, cls in _rank_filter_types.items() if type(rank_filter) is cls)
+    header = {
+        'filter_type': filter_type,
+        'parameters': rank_filter.get_parameters(),
+        'metadata': metadata or {},
+    }
+    header_bytes = json.dumps(header).encode()
+
+    path = Path(path)
+    with tempfile.NamedTemporaryFile('wb', dir=path.parent, delete=False) as f:
+        f.write(_preamble.pack(_magic, RANK_FILTER_VERSION, len(header_bytes)))
+        f.write(header_bytes)
+        f.write(rank_filter.bits.tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(f.name, path)
+
+
+def load_rank_filter(path: Path | str) -> tuple[RankFilter, dict[str, Any]]:
+    """Load a rank filter from a file.
+
+    Args:
+        path: the file written by :func:`save_rank_filter`
+
+    Returns:
+        The rank filter and the metadata stored with it.
+
+    Raises:
+        ValueError: if the file is not a valid rank filter file.
+    """
+    data = Path(path).read_bytes()
+    if len(data) < _preamble.size:
+        raise ValueError(f'The file "{path}" is not a rank filter file.')
+    magic, version, header_length = _preamble.unpack_from(data)
+    if magic != _magic:
+        raise ValueError(f'The file "{path}" is not a rank filter file.')
+    if version != RANK_FILTER_VERSION:
+        raise ValueError(f'The rank filter file has version {version}, expected version {RANK_FILTER_VERSION}.')
+
+    header = json.loads(data[_preamble.size:_preamble.size + header_length])
+    bits = np.frombuffer(data, dtype=np.uint8, offset=_preamble.size + header_length).copy()
+    rank_filter = _rank_filter_types[header['filter_type']](**header['parameters'], bits=bits)
+    return rank_filter, header['metadata']
+
+
+@contextlib.contextmanager
+def lock_rank_filter(path: Path | str) -> Iterator[None]:
+    """Hold an exclusive advisory lock on a rank filter file, blocking until it is acquired.
+
+    The lock is taken on a separate ``.lock`` file next to the filter file, since saving a filter replaces the filter
+    file itself. The lock only excludes other processes taking the same lock.
+
+    Args:
+        path: the rank filter file to lock
+    """
+    path = Path(path)
+    with open(path.with_name(path.name + '.lock'), 'a+b') as f:
+        if os.name == 'nt':
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        else:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if os.name == 'nt':
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class DistinctCompositionGenerator:
+
+    def __init__(self, dice_game: DiceGame, state_file: Path | str | None = None,
+                 capacity: int = 1_000_000, false_positive_rate: float = 1e-6):
+        """Generate random compositions which are guaranteed to differ from all compositions generated before.
+
+        The compositions are drawn uniformly from the unique compositions of the dice game, that is, compositions
+        differing in at least one bar (see :meth:`DiceGame.enumerate_unique_compositions`). The ranks of the
+        emitted compositions are tracked in a rank filter, an exact bitmap if the number of unique compositions is
+        small enough, else a Bloom filter. A Bloom filter may reject some compositions which were never emitted, but
+        never lets a composition pass twice.
+
+        If a state file is given, the compositions are reserved in it before they are emitted, see :meth:`generate`,
+        such that the guarantee holds across restarts, crashes and concurrently running processes.
+
+        Args:
+            dice_game: the dice game to generate compositions for
+            state_file: the file in which to persist the emitted compositions
+            capacity: the number of compositions we expect to generate over the lifetime of the state file, used to
+                size the Bloom filter.
+            false_positive_rate: the rate at which the Bloom filter rejects new compositions, at full capacity.
+
+        Raises:
+            ValueError: if the state file belongs to another dice game.
+        """
+        self._dice_game = dice_game
+        self._state_file = None if state_file is None else Path(state_file)
+        self._enumerator = dice_game.enumerate_unique_compositions()
+        self._digit_bases = [len(column_elements)
+                             for table_name in dice_game.get_dice_table_names()
+                             for column_elements in dice_game.get_unique_dice_table_elements(table_name)]
+        self._metadata = {'game': f'{dice_game.author}, {dice_game.title}',
+                          'nmr_ranks': self._enumerator.nmr_ranks}
+
+        bloom_filter = BloomRankFilter.from_capacity(capacity, false_positive_rate)
+        if self._enumerator.nmr_ranks <= len(bloom_filter.bits) * 8:
+            self._rank_filter = BitmapRankFilter(self._enumerator.nmr_ranks)
+        else:
+            self._rank_filter = bloom_filter
+
+        if self._state_file is not None and self._state_file.exists():
+            with lock_rank_filter(self._state_file):
+                self._rank_filter = self._load_state()
+
+    @property
+    def rank_filter(self) -> RankFilter:
+        """The filter holding the ranks of the emitted compositions."""
+        return self._rank_filter
+
+    @property
+    def nmr_emitted(self) -> int:
+        """The number of compositions emitted so far, including those of other processes using the state file.
+
+        With a state file, this counts the reserved compositions, see :meth:`generate`, as last read from the file.
+        """
+        return self._rank_filter.nmr_added
+
+    def generate(self, nmr_compositions: int, seed: int | np.random.SeedSequence | None = None,
+                 max_attempts: int = 1000, batch_size: int = 100) -> Iterator[BarSelection]:
+        """Generate compositions not generated before.
+
+        With a state file, the compositions are reserved in batches before they are yielded. Per batch, we lock the
+        state file, merge in the compositions emitted by other processes, draw the batch and save it. A composition
+        is therefore recorded before it is yielded, also when the process is killed, and two processes sharing a
+        state file never emit the same composition. The price is that the compositions reserved but not yielded,
+        at most ``batch_size - 1`` if the iteration is ended early or the process is killed, are never emitted.
+
+        Args:
+            nmr_compositions: the number of compositions to generate
+            seed: the seed for the random number generator
+            max_attempts: the maximum number of consecutive draws rejected by the rank filter before we give up.
+            batch_size: the number of compositions reserved per write of the state file
+
+        Yields:
+            The bar selections of the new compositions.
+
+        Raises:
+            RuntimeError: if no new composition could be found in the maximum number of attempts, which happens
+                when (nearly) all unique compositions have been generated.
+        """
+        rng = np.random.default_rng(seed)
+        nmr_remaining = nmr_compositions
+        while nmr_remaining > 0:
+            nmr_requested = min(batch_size, nmr_remaining)
+            ranks = self._reserve_ranks(rng, nmr_requested, max_attempts)
+            for rank in ranks:
+                yield self._enumerator.rank_to_selection(rank)
+
+            if len(ranks) < nmr_requested:
+                raise RuntimeError(f'Could not find a new composition in {max_attempts} attempts, '
+                                   f'{self.nmr_emitted} of {self._enumerator.nmr_ranks} emitted.')
+            nmr_remaining -= nmr_requested
+
+    def save(self):
+        """Save the emitted compositions to the state file, if set.
+
+        The compositions in the state file, possibly added by other processes, are merged with ours before saving.
+        """
+        if self._state_file is not None:
+            with lock_rank_filter(self._state_file):
+                self._merge_state()
+                self._save_state()
+
+    def _reserve_ranks(self, rng: np.random.Generator, nmr_ranks: int, max_attempts: int) -> list[int]:
+        """Draw new ranks and record them in the rank filter and the state file, if set.
+
+        Returns:
+            The new ranks, fewer than requested if no new rank could be found in the maximum number of attempts.
+        """
+        with lock_rank_filter(self._state_file) if self._state_file is not None else contextlib.nullcontext():
+            self._merge_state()
+            ranks = []
+            for _ in range(nmr_ranks):
+                for _ in range(max_attempts):
+                    rank = self._draw_rank(rng)
+                    if not self._rank_filter.contains(rank):
+                        break
+                else:
+                    break
+                self._rank_filter.add(rank)
+                ranks.append(rank)
+            self._save_state()
+        return ranks
+
+    def _load_state(self) -> RankFilter:
+        """Load the rank filter from the state file, which should exist and be locked."""
+        rank_filter, metadata = load_rank_filter(self._state_file)
+        if metadata != self._metadata:
+            raise ValueError(f'The state file "{self._state_file}" belongs to {metadata["game"]} '
+                             f'with {metadata["nmr_ranks"]} unique compositions.')
+        return rank_filter
+
+    def _merge_state(self):
+        """Merge the ranks in the state file, if set and existing, into our rank filter. The file should be locked."""
+        if self._state_file is not None and self._state_file.exists():
+            self._rank_filter.merge(self._load_state())
+
+    def _save_state(self):
+        """Save our rank filter to the state file, if set. The file should be locked."""
+        if self._state_file is not None:
+            save_rank_filter(self._rank_filter, self._state_file, self._metadata)
+
+    def _draw_rank(self, rng: np.random.Generator) -> int:
+        """Draw a uniformly random rank, digit by digit, since the number of ranks may exceed 64 bits."""
+        rank = 0
+        for base, digit in zip(self._digit_bases, rng.integers(0, self._digit_bases).tolist()):
+            rank = rank * base + digit
+        return rank
@@ -0,0 +1,486 @@
+from __future__ import annotations
+
+__author__ = 'Robbert Harms'
+__date__ = '2026-10-18'
+__maintainer__ = 'Robbert Harms'
+__email__ = 'robbert@xkls.nl'
+__licence__ = 'LGPL v3'
+
+import dataclasses
+import functools
+import re
+import struct
+from dataclasses import dataclass
+from fractions import Fraction
+
+midi_instruments = (
+    'acoustic grand', 'bright acoustic', 'electric grand', 'honky-tonk', 'electric piano 1', 'electric piano 2',
+    'harpsichord', 'clav', 'celesta', 'glockenspiel', 'music box', 'vibraphone', 'marimba', 'xylophone',
+    'tubular bells', 'dulcimer', 'drawbar organ', 'percussive organ', 'rock organ', 'church organ', 'reed organ',
+    'accordion', 'harmonica', 'concertina', 'acoustic guitar (nylon)', 'acoustic guitar (steel)',
+    'electric guitar (jazz)', 'electric guitar (clean)', 'electric guitar (muted)', 'overdriven guitar',
+    'distorted guitar', 'guitar harmonics', 'acoustic bass', 'electric bass (finger)', 'electric bass (pick)',
+    'fretless bass', 'slap bass 1', 'slap bass 2', 'synth bass 1', 'synth bass 2', 'violin', 'viola', 'cello',
+    'contrabass', 'tremolo strings', 'pizzicato strings', 'orchestral harp', 'timpani', 'string ensemble 1',
+    'string ensemble 2', 'synthstrings 1', 'synthstrings 2', 'choir aahs', 'voice oohs', 'synth voice',
+    'orchestra hit', 'trumpet', 'trombone', 'tuba', 'muted trumpet', 'french horn', 'brass section', 'synthbrass 1',
+    'synthbrass 2', 'soprano sax', 'alto sax', 'tenor sax', 'baritone sax', 'oboe', 'english horn', 'bassoon',
+    'clarinet', 'piccolo', 'flute', 'recorder', 'pan flute', 'blown bottle', 'shakuhachi', 'whistle', 'ocarina',
+    'lead 1 (square)', 'lead 2 (sawtooth)', 'lead 3 (calliope)', 'lead 4 (chiff)', 'lead 5 (charang)',
+    'lead 6 (voice)', 'lead 7 (fifths)', 'lead 8 (bass+lead)', 'pad 1 (new age)', 'pad 2 (warm)',
+    'pad 3 (polysynth)', 'pad 4 (choir)', 'pad 5 (bowed)', 'pad 6 (metallic)', 'pad 7 (halo)', 'pad 8 (sweep)',
+    'fx 1 (rain)', 'fx 2 (soundtrack)', 'fx 3 (crystal)', 'fx 4 (atmosphere)', 'fx 5 (brightness)', 'fx 6 (goblin)',
+    'fx 7 (echoes)', 'fx 8 (sci-fi)', 'sitar', 'banjo', 'shamisen', 'koto', 'kalimba', 'bagpipe', 'fiddle', 'shanai',
+    'tinkle bell', 'agogo', 'steel drums', 'woodblock', 'taiko drum', 'melodic tom', 'synth drum', 'reverse cymbal',
+    'guitar fret noise', 'breath noise', 'seashore', 'bird tweet', 'telephone ring', 'helicopter', 'applause',
+    'gunshot')
+"""The general midi instruments, by their lilypond names, in order of their midi program number."""
+
+dynamic_volumes = {
+    'ppppp': 0.25, 'pppp': 0.29, 'ppp': 0.33, 'pp': 0.40, 'p': 0.49, 'mp': 0.56,
+    'mf': 0.63, 'f': 0.72, 'ff': 0.80, 'fff': 0.87, 'ffff': 0.94, 'fffff': 1.0,
+}
+"""The relative volume of each dynamic mark, as in lilypond's default midi volumes."""
+
+default_dynamic_volume = dynamic_volumes['mf']
+"""The relative volume of notes before any dynamic mark."""
+
+default_ticks_per_quarter = 384
+"""The default time resolution of the midi output, in ticks per quarter note."""
+
+_pitch_classes = {'c': 0, 'd': 2, 'e': 4, 'f': 5, 'g': 7, 'a': 9, 'b': 11}
+_alterations = {'': 0, 'isis': 2, 'is': 1, 'eses': -2, 'es': -1, 'ses': -2, 's': -1}
+_grace_commands = {'\\grace', '\\acciaccatura', '\\appoggiatura', '\\slashedGrace', '\\afterGrace'}
+_relative_pitch_commands = {'\\relative', '\\fixed', '\\transpose'}
+
+_token_pattern = re.compile(r'''
+      (?P<string>"[^"]*")
+    | (?P<scheme>\#\S+)
+    | (?P<separator>\\\\)
+    | (?P<command>\\[a-zA-Z]+)
+    | (?P<parallel_start><<)
+    | (?P<parallel_end>>>)
+    | (?P<symbol>[{}<>~])
+    | (?P<fraction>\d+/\d+)
+    | (?P<duration>\d+\.*(?:\*\d+(?:/\d+)?)*)
+    | (?P<note>[a-g](?:isis|is|eses|es|ses|s)?(?![a-zA-Z])[',]*)
+    | (?P<rest>[rsR](?![a-zA-Z]))
+    | (?P<word>[a-zA-Z]+)
+    | (?P<ignored>\S)
+''', re.VERBOSE)
+
+
+@dataclass(frozen=True, slots=True)
+class MidiNote:
+    """A single note in the midi output.
+
+    Args:
+        start: the start time of the note, in midi ticks
+        duration: the duration of the note, in midi ticks
+        pitch: the midi pitch number, 60 being the middle C
+        volume: the relative volume of the note's dynamic, or None if no dynamic was set in its bar.
+        tied: if this note is tied to the next note of the same pitch
+    """
+    start: int
+    duration: int
+    pitch: int
+    volume: float | None = None
+    tied: bool = False
+
+
+@dataclass(frozen=True, slots=True)
+class BarEvents:
+    """The midi notes of a bar of lilypond music.
+
+    Args:
+        notes: the notes in the bar, with the start times relative to the start of the bar
+        length: the length of the bar, in midi ticks
+        last_duration: the last duration entered in the bar in whole notes, the default duration of the next bar.
+    """
+    notes: tuple[MidiNote, ...]
+    length: int
+    last_duration: Fraction
+
+
+@dataclass(frozen=True, slots=True)
+class MidiTrack:
+    """A track of a midi file, typically one staff of a composition.
+
+    Args:
+        name: the name of the track
+        instrument: the lilypond name of the midi instrument, see :data:`midi_instruments`
+        min_volume: the volume of the softest dynamic, between 0 and 1
+        max_volume: the volume of the loudest dynamic, between 0 and 1
+        notes: the notes of the track, with absolute start times in midi ticks
+    """
+    name: str
+    instrument: str
+    min_volume: float
+    max_volume: float
+    notes: list[MidiNote]
+
+
+@functools.lru_cache(maxsize=4096)
+def parse_lilypond_bar(lilypond_str: str, default_duration: Fraction = Fraction(1, 4),
+                       ticks_per_quarter: int = default_ticks_per_quarter) -> BarEvents:
+    """Parse a bar of lilypond music into midi notes.
+
+    This supports the subset of lilypond used in the bars of the dice games: absolute pitches in Dutch note names,
+    durations with dots and multipliers, rests, chords, ties, tuplets, grace notes, dynamics and parallel voices. Other
+    commands, like articulations, clefs, beams and slurs, do not affect the midi output and are skipped.
+
+    Grace notes are played at the start of the following note, taking at most half of its duration. Ornaments, like
+    trills, are not realized. Relative and transposed music (``\\relative``, ``\\fixed`` and ``\\transpose``) is not
+    supported and raises an error, instead of silently producing the wrong pitches.
+
+    The times are computed exactly and then rounded to midi ticks. The results of the most recently parsed bars are
+    cached, such that assembling a composition from bars typically parses each distinct bar only once, and only adds
+    integer offsets to the cached notes.
+
+    Args:
+        lilypond_str: the lilypond music of the bar
+        default_duration: the duration of notes without an explicit duration at the start of the bar, this is the
+            last duration of the previous bar in the composition.
+        ticks_per_quarter: the time resolution of the midi output
+
+    Returns:
+        The notes of the bar.
+
+    Raises:
+        ValueError: if the lilypond music could not be parsed, or uses relative or transposed pitches.
+    """
+    return _LilypondMidiParser(lilypond_str, default_duration, ticks_per_quarter).parse()
+
+
+def get_midi_program(instrument: str) -> int:
+    """Get the general midi program number of an instrument.
+
+    Args:
+        instrument: the lilypond name of the midi instrument, matched case-insensitively
+
+    Returns:
+        The program number, between 0 and 127.
+
+    Raises:
+        ValueError: if the instrument is unknown.
+    """
+    try:
+        return midi_instruments.index(instrument.lower())
+    except ValueError:
+        raise ValueError(f'Unknown midi instrument "{instrument}".') from None
+
+
+def merge_tied_notes(notes: list[MidiNote]) -> list[MidiNote]:
+    """Merge each tied note with the note of the same pitch directly following it.
+
+    Args:
+        notes: the notes to merge, with absolute start times
+
+    Returns:
+        The notes with all ties resolved, sorted by start time.
+    """
+    notes = sorted(notes, key=lambda note: (note.start, note.pitch))
+    continuations = {(note.pitch, note.start): ind for ind, note in enumerate(notes)}
+
+    merged = []
+    absorbed = set()
+    for ind, note in enumerate(notes):
+        if ind in absorbed:
+            continue
+        duration = note.duration
+        current = note
+        while current.tied:
+            next_ind = continuations.get((current.pitch, current.start + current.duration))
+            if next_ind is None or next_ind in absorbed:
+                break
+            absorbed.add(next_ind)
+            current = notes[next_ind]
+            duration += current.duration
+        merged.append(MidiNote(note.start, duration, note.pitch, note.volume))
+    return merged
+
+
+def write_midi_file(tracks: list[MidiTrack], tempo_changes: list[tuple[int, float]],
+                    ticks_per_quarter: int = default_ticks_per_quarter, length: int | None = None) -> bytes:
+    """Write tracks of notes to a standard midi file.
+
+    Args:
+        tracks: the tracks to write, each track gets its own midi channel (skipping the percussion channel).
+        tempo_changes: the tempo changes, as tuples of the time in midi ticks and the tempo in quarter notes per
+            minute.
+        ticks_per_quarter: the time resolution of the midi file
+        length: the minimum length of the tracks in midi ticks, for example to leave room for the release of the
+            last notes when synthesizing. If not set, the tracks end at their last event.
+
+    Returns:
+        The content of a format 1 midi file.
+    """
+    channels = [channel for channel in range(16) if channel != 9]
+
+    conductor_events = [(time, 0, b'\xff\x51\x03' + round(60_000_000 / tempo).to_bytes(3, 'big'))
+                        for time, tempo in tempo_changes]
+    track_chunks = [_encode_track(conductor_events, length or 0)]
+
+    for track_ind, track in enumerate(tracks):
+        channel = channels[track_ind % len(channels)]
+        name = track.name.encode()
+        events = [(0, 0, b'\xff\x03' + _encode_variable_length(len(name)) + name),
+                  (0, 1, bytes([0xC0 | channel, get_midi_program(track.instrument)]))]
+
+        volume_range = track.max_volume - track.min_volume
+        velocities = {}
+        last_volume = default_dynamic_volume
+        for note in sorted(track.notes, key=lambda note: note.start):
+            last_volume = last_volume if note.volume is None else note.volume
+            if (velocity := velocities.get(last_volume)) is None:
+                velocity = min(127, max(1, round(127 * (track.min_volume + volume_range * last_volume))))
+                velocities[last_volume] = velocity
+            events.append((note.start, 3, bytes((0x90 | channel, note.pitch, velocity))))
+            events.append((note.start + max(1, note.duration), 2, bytes((0x80 | channel, note.pitch, 0))))
+        track_chunks.append(_encode_track(events, length or 0))
+
+    header = b'MThd' + struct.pack('>IHHH', 6, 1, len(track_chunks), ticks_per_quarter)
+    return header + b''.join(track_chunks)
+
+
+@dataclass(frozen=True, slots=True)
+class _ExactNote:
+    """A note with exact times in whole notes, used while parsing."""
+    start: Fraction
+    duration: Fraction
+    pitch: int
+    volume: float | None = None
+    tied: bool = False
+
+
+class _LilypondMidiParser:
+
+    def __init__(self, lilypond_str: str, default_duration: Fraction, ticks_per_quarter: int):
+        """Recursive descent parser for a bar of lilypond music, collecting the midi notes.
+
+        The notes are collected with exact times in whole notes, and converted to midi ticks at the end.
+
+        Args:
+            lilypond_str: the lilypond music of the bar
+            default_duration: the duration of notes without explicit duration, until a duration is entered.
+            ticks_per_quarter: the time resolution of the midi output
+        """
+        self._lilypond_str = lilypond_str
+        self._ticks_per_quarter = ticks_per_quarter
+        self._tokens = [(match.lastgroup, match.group()) for match in _token_pattern.finditer(lilypond_str)]
+        self._position = 0
+        self._last_duration = default_duration
+        self._volume: float | None = None
+        self._notes: list[_ExactNote] = []
+        self._last_note_inds: range = range(0)
+        self._grace_notes: list[tuple[list[int], Fraction]] | None = None
+        self._pending_grace_notes: list[tuple[list[int], Fraction]] = []
+
+    def parse(self) -> BarEvents:
+        """Parse the bar.
+
+        Returns:
+            The notes of the bar.
+        """
+        time = Fraction(0)
+        while self._position < len(self._tokens):
+            time = self._parse_music(time, Fraction(1))
+
+        notes = []
+        for note in self._notes:
+            start = self._to_ticks(note.start)
+            notes.append(MidiNote(start, self._to_ticks(note.start + note.duration) - start, note.pitch,
+                                  note.volume, note.tied))
+        return BarEvents(tuple(notes), self._to_ticks(time), self._last_duration)
+
+    def _parse_music(self, time: Fraction, factor: Fraction) -> Fraction:
+        """Parse one music expression, starting at the given time.
+
+        Args:
+            time: the start time of the expression
+            factor: the factor on the durations, set by tuplets
+
+        Returns:
+            The end time of the expression.
+        """
+        kind, value = self._next_token()
+
+        if value == '{':
+            while self._peek_token()[1] != '}':
+                time = self._parse_music(time, factor)
+            self._next_token()
+            return time
+        if kind == 'parallel_start':
+            end_time = time
+            while self._peek_token()[0] != 'parallel_end':
+                if self._peek_token()[0] == 'separator':
+                    self._next_token()
+                    continue
+                end_time = max(end_time, self._parse_music(time, factor))
+            self._next_token()
+            return end_time
+        if value == '<':
+            pitches = []
+            while self._peek_token()[1] != '>':
+                pitch_kind, pitch_value = self._next_token()
+                if pitch_kind == 'note':
+                    pitches.append(_parse_pitch(pitch_value))
+            self._next_token()
+            return self._add_notes(time, pitches, self._parse_duration() * factor)
+        if kind == 'note':
+            return self._add_notes(time, [_parse_pitch(value)], self._parse_duration() * factor)
+        if kind == 'rest':
+            return self._add_notes(time, [], self._parse_duration() * factor)
+        if value == '~':
+            self._update_last_notes(tied=True)
+            return time
+        if kind == 'command':
+            return self._parse_command(value, time, factor)
+        return time
+
+    def _parse_command(self, command: str, time: Fraction, factor: Fraction) -> Fraction:
+        """Parse a lilypond command and its arguments.
+
+        Args:
+            command: the command, including the backslash
+            time: the current time
+            factor: the factor on the durations, set by tuplets
+
+        Returns:
+            The time after the command.
+        """
+        name = command[1:]
+        if command in _relative_pitch_commands:
+            raise ValueError(f'The command "{command}" in the lilypond music "{self._lilypond_str}" is not supported, '
+                             f'only absolute pitches are.')
+        if name == 'tuplet':
+            numerator, denominator = self._next_token()[1].split('/')
+            if self._peek_token()[0] == 'duration':
+                self._next_token()
+            return self._parse_music(time, factor * Fraction(int(denominator), int(numerator)))
+        if name == 'times':
+            numerator, denominator = self._next_token()[1].split('/')
+            return self._parse_music(time, factor * Fraction(int(numerator), int(denominator)))
+        if command in _grace_commands:
+            self._grace_notes = []
+            self._parse_music(time, factor)
+            self._pending_grace_notes.extend(self._grace_notes)
+            self._grace_notes = None
+            return time
+        if name in dynamic_volumes:
+            self._volume = dynamic_volumes[name]
+            self._update_last_notes(volume=self._volume)
+        elif name in ('clef', 'clefBracketed', 'ottava', 'new', 'bar', 'time', 'partial'):
+            self._next_token()
+            if name == 'new' and self._peek_token()[1] == '=':
+                self._next_token()
+                self._next_token()
+        elif name == 'key':
+            self._next_token()
+            self._next_token()
+        return time
+
+    def _add_notes(self, time: Fraction, pitches: list[int], duration: Fraction) -> Fraction:
+        """Add the notes of a single note, chord or rest.
+
+        Inside grace music this collects the notes for the next main note. Otherwise, any pending grace notes are
+        played first, at the start of these notes.
+
+        Args:
+            time: the start time of the notes
+            pitches: the pitches sounding, empty for a rest
+            duration: the duration of the notes
+
+        Returns:
+            The end time of the notes.
+        """
+        if self._grace_notes is not None:
+            self._grace_notes.append((pitches, duration))
+            return time + duration
+
+        start = time
+        if self._pending_grace_notes:
+            grace_length = sum(grace_duration for _, grace_duration in self._pending_grace_notes)
+            scale = min(Fraction(1), duration / 2 / grace_length)
+            for grace_pitches, grace_duration in self._pending_grace_notes:
+                self._notes.extend(_ExactNote(start, grace_duration * scale, pitch, self._volume)
+                                   for pitch in grace_pitches)
+                start += grace_duration * scale
+            self._pending_grace_notes = []
+
+        first_ind = len(self._notes)
+        self._notes.extend(_ExactNote(start, time + duration - start, pitch, self._volume) for pitch in pitches)
+        self._last_note_inds = range(first_ind, len(self._notes))
+        return time + duration
+
+    def _update_last_notes(self, **changes):
+        """Update the last added notes, for the postfix ties and dynamics."""
+        for ind in self._last_note_inds:
+            self._notes[ind] = dataclasses.replace(self._notes[ind], **changes)
+
+    def _parse_duration(self) -> Fraction:
+        """Parse an optional duration, updating the default duration if present.
+
+        This skips any cautionary or forced accidental marks (``?`` or ``!``) between the pitch and the duration.
+        """
+        while self._position < len(self._tokens) and self._peek_token()[1] in ('?', '!'):
+            self._position += 1
+        if self._position < len(self._tokens) and self._peek_token()[0] == 'duration':
+            self._last_duration = _parse_duration(self._next_token()[1])
+        return self._last_duration
+
+    def _to_ticks(self, time: Fraction) -> int:
+        """Convert a time in whole notes to midi ticks."""
+        return round(time * 4 * self._ticks_per_quarter)
+
+    def _next_token(self) -> tuple[str, str]:
+        token = self._peek_token()
+        self._position += 1
+        return token
+
+    def _peek_token(self) -> tuple[str, str]:
+        if self._position >= len(self._tokens):
+            raise ValueError(f'Unexpected end of the lilypond music "{self._lilypond_str}".')
+        return self._tokens[self._position]
+
+
+def _parse_pitch(note: str) -> int:
+    """Get the midi pitch of an absolute lilypond pitch in Dutch note names, for example ``fis''``."""
+    name = note.rstrip("',")
+    octave = note.count("'") - note.count(',')
+    return 48 + 12 * octave + _pitch_classes[name[0]] + _alterations[name[1:]]
+
+
+def _parse_duration(duration: str) -> Fraction:
+    """Get the length in whole notes of a lilypond duration, for example ``8.`` or ``8*3/2``."""
+    base, *multipliers = duration.split('*')
+    nmr_dots = base.count('.')
+    length = Fraction(1, int(base.rstrip('.'))) * (2 - Fraction(1, 2 ** nmr_dots))
+    for multiplier in multipliers:
+        length *= Fraction(multiplier)
+    return length
+
+
+@functools.lru_cache(maxsize=4096)
+def _encode_variable_length(value: int) -> bytes:
+    """Encode an integer as a midi variable length quantity."""
+    encoded = [value & 0x7F]
+    value >>= 7
+    while value:
+        encoded.append(0x80 | (value & 0x7F))
+        value >>= 7
+    return bytes(reversed(encoded))
+
+
+def _encode_track(events: list[tuple[int, int, bytes]], length: int = 0) -> bytes:
+    """Encode a midi track chunk from events with an absolute tick, an order at equal ticks and the event data.
+
+    The end of the track is placed at the last event, or at the given length if that is later.
+    """
+    data = bytearray()
+    current_tick = 0
+    for tick, _, event_data in sorted(events):
+        data += _encode_variable_length(tick - current_tick) + event_data
+        current_tick = tick
+    data += _encode_variable_length(max(0, length - current_tick)) + b'\xff\x2f\x00'
+    return b'MTrk' + struct.pack('>I', len(data)) + bytes(data)
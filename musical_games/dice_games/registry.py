@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+__author__ = 'Robbert Harms'
+__date__ = '2026-10-18'
+__maintainer__ = 'Robbert Harms'
+__email__ = 'robbert@xkls.nl'
+__licence__ = 'LGPL v3'
+
+import importlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from musical_games.dice_games.base import DiceGame, RenderOptions
+
+_game_classes: dict[str, tuple[str, str]] = {
+    'cpe_bach_counterpoint': ('musical_games.dice_games.dice_games', 'CPEBachCounterpoint'),
+    'kirnberger_menuet_trio': ('musical_games.dice_games.dice_games', 'KirnbergerMenuetTrio'),
+    'kirnberger_polonaise': ('musical_games.dice_games.dice_games', 'KirnbergerPolonaise'),
+    'mozart_contredanse': ('musical_games.dice_games.dice_games', 'MozartContredanse'),
+    'mozart_waltz': ('musical_games.dice_games.dice_games', 'MozartWaltz'),
+    'stadler_menuet_trio': ('musical_games.dice_games.dice_games', 'StadlerMenuetTrio'),
+    'gerlach_scottish_dance': ('musical_games.dice_games.dice_games', 'GerlachScottishDance'),
+    'calegari_aria': ('musical_games.dice_games.dice_games', 'CalegariAria'),
+}
+"""The dice games in the registry, mapping the game names to the module and class name of each game."""
+
+_games: dict[tuple[str, RenderOptions], DiceGame] = {}
+_games_lock = threading.Lock()
+
+
+def list_games() -> list[str]:
+    """Get the names of all the dice games in the registry.
+
+    This does not import nor instantiate any of the dice games.
+
+    Returns:
+        The names of the available dice games.
+    """
+    return list(_game_classes)
+
+
+def register_game(name: str, module_name: str, class_name: str):
+    """Add a dice game to the registry.
+
+    The dice game class is only imported when the game is first requested.
+
+    Args:
+        name: the name under which to register the game
+        module_name: the name of the module containing the dice game class
+        class_name: the name of the dice game class, this class should accept a keyword argument ``render_options``.
+    """
+    _game_classes[name] = (module_name, class_name)
+
+
+def get_game(name: str, render_options: RenderOptions | None = None) -> DiceGame:
+    """Get the shared instance of a dice game.
+
+    This returns one instance per game and render options per process. The instance is created on first request,
+    and the same instance is returned for all later requests. The dice games do not change after construction, such
+    that the instance can safely be shared between callers and threads.
+
+    Args:
+        name: the name of the dice game, see :func:`list_games`
+        render_options: the render options to instantiate the dice game with
+
+    Returns:
+        The shared instance of the dice game.
+
+    Raises:
+        ValueError: if no dice game with the given name exists.
+    """
+    render_options = render_options or RenderOptions()
+    key = (name, render_options)
+    if key in _games:
+        return _games[key]
+
+    if name not in _game_classes:
+        raise ValueError(f'No dice game named "{name}", available games are: {", ".join(_game_classes)}.')
+
+    with _games_lock:
+        if key not in _games:
+            module_name, class_name = _game_classes[name]
+            game_class = getattr(importlib.import_module(module_name), class_name)
+            _games[key] = game_class(render_options=render_options)
+    return _games[key]
+
+
+def load_all(parallel: bool = True, render_options: RenderOptions | None = None) -> dict[str, DiceGame]:
+    """Instantiate and warm all dice games in the registry.
+
+    This is meant for use at startup of, for example, a web server, such that the first requests do not have to wait
+    for the games to be loaded. See :meth:`DiceGame.warm`.
+
+    Args:
+        parallel: if set, we load the dice games concurrently in a thread pool
+        render_options: the render options to instantiate the dice games with
+
+    Returns:
+        The loaded dice games, indexed by name.
+    """
+    def load_game(name: str) -> DiceGame:
+        game = get_game(name, render_options=render_options)
+        game.warm()
+        return game
+
+    names = list_games()
+    if parallel:
+        with ThreadPoolExecutor() as executor:
+            return dict(zip(names, executor.map(load_game, names)))
+    return {name: load_game(name) for name in names}
@@ -0,0 +1,213 @@
+from __future__ import annotations
+
+__author__ = 'Robbert Harms'
+__date__ = '2026-10-18'
+__maintainer__ = 'Robbert Harms'
+__email__ = 'robbert@xkls.nl'
+__licence__ = 'LGPL v3'
+
+import numpy as np
+
+from musical_games.dice_games.base import BarSelection, DiceGame, str_dice_table_name
+
+
+class CompositionIndex:
+
+    def __init__(self, dice_game: DiceGame, shuffle_staffs: bool = False):
+        """Index over compositions of a dice game, answering nearest neighbour queries by Hamming distance.
+
+        The distance between two compositions is the number of throws in which they select different bars. Dice
+        table elements selecting identical bars (see :meth:`DiceGame.get_duplicate_dice_table_elements`) count as
+        equal. When shuffling staffs, every staff contributes its own throws, and the duplicates are judged per staff.
+
+        Each composition is stored as a bit-packed one-hot code, with per throw one bit per row of the dice table.
+        Duplicate bars map to the bit of the first row selecting that bar. Two compositions differing in a throw
+        differ in two bits of their codes, such that the Hamming distance is half the population count of the
+        exclusive or of the codes. The codes are stored word-major, such that queries compute this for all the stored
+        compositions in a few vectorized passes over contiguous memory.
+
+        Args:
+            dice_game: the dice game of the compositions
+            shuffle_staffs: if the compositions select the staffs of a dice table independently.
+        """
+        self._dice_game = dice_game
+        self._shuffle_staffs = shuffle_staffs
+        self._staff_names = dice_game.get_staff_names()
+
+        self._canonical_rows: dict[str_dice_table_name, np.ndarray] = {}
+        self._bit_offsets: dict[str_dice_table_name, int] = {}
+        nmr_bits = 0
+        for table_name, dice_table in dice_game.get_dice_tables().items():
+            staff_names = self._staff_names[table_name] if shuffle_staffs else [None]
+            canonical_rows = np.repeat(np.arange(dice_table.shape[0])[None, :, None], len(staff_names), axis=0)
+            canonical_rows = np.repeat(canonical_rows, dice_table.shape[1], axis=2)
+            for staff_ind, staff_name in enumerate(staff_names):
+                for duplicates in dice_game.get_duplicate_dice_table_elements(table_name, staff_name):
+                    for column_ind in {element.column_ind for element in duplicates}:
+                        rows = [element.row_ind for element in duplicates if element.column_ind == column_ind]
+                        canonical_rows[staff_ind, rows, column_ind] = min(rows)
+            self._canonical_rows[table_name] = canonical_rows if shuffle_staffs else canonical_rows[0]
+
+            self._bit_offsets[table_name] = nmr_bits
+            nmr_staffs = len(self._staff_names[table_name]) if shuffle_staffs else 1
+            nmr_bits += nmr_staffs * dice_table.nmr_throws * dice_table.shape[0]
+
+        self._nmr_words = max(1, -(-nmr_bits // 64))
+        self._code_chunks: list[np.ndarray] = []
+        self._row_indices_chunks: dict[str_dice_table_name, list[np.ndarray]] = {
+            table_name: [] for table_name in self._canonical_rows}
+        self._codes: np.ndarray = np.zeros((self._nmr_words, 0), dtype=np.uint64)
+        self._row_indices: dict[str_dice_table_name, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return self._codes.shape[1] + sum(len(chunk) for chunk in self._code_chunks)
+
+    def add_row_indices(self, row_indices: dict[str_dice_table_name, np.ndarray]) -> np.ndarray:
+        """Add a batch of compositions to the index, given as row indices.
+
+        Args:
+            row_indices: per dice table the row indices of the compositions, as returned by
+                :meth:`DiceGame.get_random_row_indices`, with the same setting of shuffle staffs as this index.
+
+        Returns:
+            The identifiers of the added compositions in this index.
+        """
+        start = len(self)
+        codes = self.encode(row_indices)
+        self._code_chunks.append(codes)
+        for table_name, table_rows in row_indices.items():
+            self._row_indices_chunks[table_name].append(np.asarray(table_rows, dtype=np.uint8))
+        return np.arange(start, start + len(codes))
+
+    def add_bar_selections(self, bar_selections: list[BarSelection]) -> np.ndarray:
+        """Add compositions to the index.
+
+        Args:
+            bar_selections: the bar selections of the compositions
+
+        Returns:
+            The identifiers of the added compositions in this index.
+        """
+        return self.add_row_indices(self._bar_selections_to_row_indices(bar_selections))
+
+    def get_bar_selections(self, ids: np.ndarray | list[int]) -> list[BarSelection]:
+        """Get the stored compositions with the given identifiers.
+
+        Args:
+            ids: the identifiers of the compositions
+
+        Returns:
+            The bar selections of the compositions.
+        """
+        self._consolidate()
+        return self._dice_game.row_indices_to_bar_selections(
+            {table_name: table_rows[np.asarray(ids)] for table_name, table_rows in self._row_indices.items()})
+
+    def query(self, bar_selection: BarSelection, k: int = 10) -> list[tuple[int, int]]:
+        """Find the stored compositions nearest to a composition.
+
+        Args:
+            bar_selection: the composition to find the neighbours of
+            k: the number of neighbours to find
+
+        Returns:
+            Up to k tuples with the identifier and distance of the nearest compositions, nearest first.
+        """
+        ids, distances = self.query_row_indices(self._bar_selections_to_row_indices([bar_selection]), k=k)
+        return list(zip(ids[0].tolist(), distances[0].tolist()))
+
+    def query_row_indices(self, row_indices: dict[str_dice_table_name, np.ndarray],
+                          k: int = 10) -> tuple[np.ndarray, np.ndarray]:
+        """Find the stored compositions nearest to each of a batch of compositions.
+
+        Args:
+            row_indices: per dice table the row indices of the query compositions
+            k: the number of neighbours to find per query
+
+        Returns:
+            Two arrays of shape (nmr_queries, min(k, len(self))), with the identifiers and the distances of the
+            nearest compositions, nearest first. Equally distant compositions are ordered by identifier.
+        """
+        self._consolidate()
+        query_codes = self.encode(row_indices)
+        nmr_stored = self._codes.shape[1]
+        k = min(k, nmr_stored)
+
+        ids = np.zeros((len(query_codes), k), dtype=np.int64)
+        distances = np.zeros((len(query_codes), k), dtype=np.int64)
+        if k == 0:
+            return ids, distances
+
+        xor_buffer = np.empty(nmr_stored, dtype=np.uint64)
+        count_buffer = np.empty(nmr_stored, dtype=np.uint8)
+        for query_ind, query_code in enumerate(query_codes):
+            bit_distances = np.zeros(nmr_stored, dtype=np.uint16)
+            for word_codes, query_word in zip(self._codes, query_code):
+                np.bitwise_xor(word_codes, query_word, out=xor_buffer)
+                np.bitwise_count(xor_buffer, out=count_buffer)
+                bit_distances += count_buffer
+
+            cutoff = int(np.searchsorted(np.cumsum(np.bincount(bit_distances)), k))
+            nearer = np.flatnonzero(bit_distances < cutoff)
+            at_cutoff = np.flatnonzero(bit_distances == cutoff)[:k - len(nearer)]
+            candidates = np.concatenate([nearer, at_cutoff])
+            candidates = candidates[np.argsort(bit_distances[candidates], kind='stable')]
+
+            ids[query_ind] = candidates
+            distances[query_ind] = bit_distances[candidates] // 2
+        return ids, distances
+
+    def encode(self, row_indices: dict[str_dice_table_name, np.ndarray]) -> np.ndarray:
+        """Encode compositions into bit-packed one-hot codes, with duplicate bars mapped to the same bit.
+
+        Args:
+            row_indices: per dice table the row indices of the compositions
+
+        Returns:
+            An array of shape (nmr_compositions, nmr_words) of 64 bit words.
+        """
+        nmr_compositions = len(next(iter(row_indices.values())))
+        bits = np.zeros((nmr_compositions, self._nmr_words * 64), dtype=bool)
+        for table_name, table_rows in row_indices.items():
+            canonical_rows = self._canonical_rows[table_name]
+            table_rows = np.asarray(table_rows)
+            if table_rows.ndim != (3 if self._shuffle_staffs else 2):
+                raise ValueError(f'The row indices of table "{table_name}" do not match the shuffle staffs '
+                                 f'setting of this index.')
+
+            if self._shuffle_staffs:
+                canonical = canonical_rows[np.arange(canonical_rows.shape[0])[:, None], table_rows,
+                                           np.arange(canonical_rows.shape[2])]
+            else:
+                canonical = canonical_rows[table_rows, np.arange(canonical_rows.shape[1])]
+            canonical = canonical.reshape(nmr_compositions, -1)
+            positions = (self._bit_offsets[table_name] + np.arange(canonical.shape[1]) * canonical_rows.shape[-2]
+                         + canonical)
+            bits[np.arange(nmr_compositions)[:, None], positions] = True
+        return np.packbits(bits, axis=1, bitorder='little').view(np.uint64)
+
+    def _consolidate(self):
+        """Concatenate the chunks of added compositions into single arrays."""
+        if self._code_chunks:
+            self._codes = np.concatenate([self._codes] + [chunk.T for chunk in self._code_chunks], axis=1)
+            self._code_chunks = []
+            for table_name, chunks in self._row_indices_chunks.items():
+                if table_name in self._row_indices:
+                    chunks.insert(0, self._row_indices[table_name])
+                self._row_indices[table_name] = np.concatenate(chunks)
+                chunks.clear()
+
+    def _bar_selections_to_row_indices(
+            self, bar_selections: list[BarSelection]) -> dict[str_dice_table_name, np.ndarray]:
+        """Get the row indices of bar selections, in the layout used by this index."""
+        row_indices = {}
+        for table_name in self._canonical_rows:
+            if self._shuffle_staffs:
+                row_indices[table_name] = np.array(
+                    [[[element.row_ind for element in bar_selection.get_dice_table_elements(table_name, staff_name)]
+                      for staff_name in self._staff_names[table_name]] for bar_selection in bar_selections])
+            else:
+                row_indices[table_name] = np.array(
+                    [[element.row_ind for element in bar_selection.get_dice_table_elements(table_name)]
+                     for bar_selection in bar_selections])
+        return row_indices
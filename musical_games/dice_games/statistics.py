@@ -0,0 +1,226 @@
+from __future__ import annotations
+
+__author__ = 'Robbert Harms'
+__date__ = '2026-10-18'
+__maintainer__ = 'Robbert Harms'
+__email__ = 'robbert@xkls.nl'
+__licence__ = 'LGPL v3'
+
+import csv
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Self
+
+import numpy as np
+
+from musical_games.dice_games.base import DiceGame, str_dice_table_name, str_staff_name
+
+
+@dataclass(slots=True, frozen=True)
+class BarUsage:
+    """The number of times each bar is used, per dice table, staff and throw, over a corpus of compositions.
+
+    The counts are either observed counts over sampled compositions (integers), or expected counts computed from the
+    structure of the dice tables (floats).
+
+    Args:
+        nmr_compositions: the number of compositions the counts are over
+        staff_names: per dice table the names of the staffs, in the order of the staff axis of the counts
+        counts: per dice table an array of shape (nmr_staffs, nmr_throws, nmr_bar_indices), with the usage of each
+            bar index, per staff and throw.
+    """
+    nmr_compositions: int
+    staff_names: dict[str_dice_table_name, list[str_staff_name]]
+    counts: dict[str_dice_table_name, np.ndarray]
+
+    def get_counts(self, table_name: str_dice_table_name, staff_name: str_staff_name | None = None,
+                   throw_ind: int | None = None) -> np.ndarray:
+        """Get the usage of each bar index for a dice table, optionally for a single staff and throw.
+
+        Args:
+            table_name: the name of the dice table
+            staff_name: the staff to get the counts for, if not set we sum over all staffs
+            throw_ind: the throw (column) to get the counts for, if not set we sum over all throws.
+
+        Returns:
+            Per bar index the usage count.
+        """
+        counts = self.counts[table_name]
+        if staff_name is None:
+            counts = counts.sum(axis=0)
+        else:
+            counts = counts[self.staff_names[table_name].index(staff_name)]
+
+        if throw_ind is None:
+            return counts.sum(axis=0)
+        return counts[throw_ind]
+
+    def to_csv(self, path: Path | str):
+        """Write the non-zero counts to a CSV file.
+
+        The file has one row per dice table, staff, throw and bar index, with the columns ``table``, ``staff``,
+        ``throw``, ``bar_index`` and ``count``.
+
+        Args:
+            path: the file to write to
+        """
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['table', 'staff', 'throw', 'bar_index', 'count'])
+            for table_name, counts in self.counts.items():
+                staff_names = self.staff_names[table_name]
+                for staff_ind, throw_ind, bar_index in np.argwhere(counts).tolist():
+                    writer.writerow([table_name, staff_names[staff_ind], throw_ind, bar_index,
+                                     counts[staff_ind, throw_ind, bar_index].item()])
+
+    def to_npz(self, path: Path | str):
+        """Write the counts to a compressed numpy archive.
+
+        Per dice table, the archive holds the counts under ``<table>/counts`` and the staff names under
+        ``<table>/staff_names``. The number of compositions is stored under ``nmr_compositions``.
+
+        Args:
+            path: the file to write to
+        """
+        arrays = {'nmr_compositions': np.array(self.nmr_compositions)}
+        for table_name, counts in self.counts.items():
+            arrays[f'{table_name}/counts'] = counts
+            arrays[f'{table_name}/staff_names'] = np.array(self.staff_names[table_name])
+        np.savez_compressed(path, **arrays)
+
+    @classmethod
+    def from_npz(cls, path: Path | str) -> Self:
+        """Load the counts written by :meth:`to_npz`.
+
+        Args:
+            path: the file to load
+
+        Returns:
+            The loaded bar usage.
+        """
+        with np.load(path) as data:
+            table_names = [key.removesuffix('/counts') for key in data.files if key.endswith('/counts')]
+            return cls(int(data['nmr_compositions']),
+                       {table_name: data[f'{table_name}/staff_names'].tolist() for table_name in table_names},
+                       {table_name: data[f'{table_name}/counts'] for table_name in table_names})
+
+    def __add__(self, other: BarUsage) -> BarUsage:
+        """Combine the counts of two corpora, for example of two shards of a sampling run."""
+        if not isinstance(other, BarUsage):
+            return NotImplemented
+        return BarUsage(self.nmr_compositions + other.nmr_compositions, self.staff_names,
+                        {table_name: counts + other.counts[table_name] for table_name, counts in self.counts.items()})
+
+
+def count_bar_usage(dice_game: DiceGame, row_indices: dict[str_dice_table_name, np.ndarray]) -> BarUsage:
+    """Count the usage of each bar in a batch of compositions, given as row indices.
+
+    Args:
+        dice_game: the dice game the compositions are from
+        row_indices: per dice table the row indices of the compositions, as returned by
+            :meth:`DiceGame.get_random_row_indices`, with or without a staff dimension.
+
+    Returns:
+        The bar usage counts of the compositions.
+    """
+    staff_names = dice_game.get_staff_names()
+    dice_tables = dice_game.get_dice_tables()
+    nmr_compositions = len(next(iter(row_indices.values()), []))
+
+    counts = {}
+    for table_name, table_rows in row_indices.items():
+        table_rows = np.asarray(table_rows)
+        nmr_staffs = len(staff_names[table_name])
+        grouped_staffs = table_rows.ndim == 2
+        if grouped_staffs:
+            table_rows = table_rows[:, None, :]
+
+        bar_indices = dice_game.row_indices_to_bar_indices({table_name: table_rows})[table_name]
+        bar_indices = np.moveaxis(bar_indices, 0, 2).reshape(table_rows.shape[1], table_rows.shape[2], -1)
+        nmr_bar_indices = int(dice_tables[table_name].get_bar_indices_array().max(initial=-1)) + 1
+
+        flat_indices = np.arange(table_rows.shape[1] * table_rows.shape[2]).reshape(
+            table_rows.shape[1], table_rows.shape[2], 1) * nmr_bar_indices + bar_indices
+        table_counts = np.bincount(flat_indices[bar_indices >= 0],
+                                   minlength=table_rows.shape[1] * table_rows.shape[2] * nmr_bar_indices)
+        table_counts = table_counts.reshape(table_rows.shape[1], table_rows.shape[2], nmr_bar_indices)
+
+        if grouped_staffs:
+            table_counts = np.repeat(table_counts, nmr_staffs, axis=0)
+        counts[table_name] = table_counts
+
+    return BarUsage(nmr_compositions, {table_name: staff_names[table_name] for table_name in counts}, counts)
+
+
+def sample_bar_usage(dice_game: DiceGame, nmr_compositions: int, seed: int | np.random.SeedSequence | None = None,
+                     shuffle_staffs: bool = False, dice_weighted: bool = False,
+                     batch_size: int = 100_000) -> BarUsage:
+    """Count the usage of each bar over a large number of randomly sampled compositions.
+
+    The compositions are sampled and counted in batches, as row indices, such that the memory use is bounded by the
+    batch size and no bar selections are created. Each batch draws from its own random stream, spawned from the
+    seed.
+
+    Args:
+        dice_game: the dice game to sample compositions from
+        nmr_compositions: the number of compositions to sample
+        seed: the root seed for the random number generators
+        shuffle_staffs: if we want to shuffle the staffs within a dice table independently.
+        dice_weighted: if set, we select the rows with the probabilities of the thrown dice sums.
+        batch_size: the number of compositions sampled and counted at a time
+
+    Returns:
+        The bar usage counts of the sampled compositions.
+    """
+    if isinstance(seed, np.random.SeedSequence):
+        seed_sequence = np.random.SeedSequence(seed.entropy, spawn_key=seed.spawn_key, pool_size=seed.pool_size)
+    else:
+        seed_sequence = np.random.SeedSequence(seed)
+
+    batch_sizes = [min(batch_size, nmr_compositions - start) for start in range(0, nmr_compositions, batch_size)]
+    bar_usage = count_bar_usage(dice_game, {table_name: np.zeros((0, dice_table.nmr_throws), dtype=np.int64)
+                                            for table_name, dice_table in dice_game.get_dice_tables().items()})
+    for nmr_batch_compositions, batch_seed in zip(batch_sizes, seed_sequence.spawn(len(batch_sizes))):
+        row_indices = dice_game.get_random_row_indices(nmr_batch_compositions, seed=batch_seed,
+                                                       shuffle_staffs=shuffle_staffs, dice_weighted=dice_weighted)
+        bar_usage += count_bar_usage(dice_game, row_indices)
+    return bar_usage
+
+
+def expected_bar_usage(dice_game: DiceGame, nmr_compositions: int = 1, dice_weighted: bool = False) -> BarUsage:
+    """Compute the expected usage of each bar, from the structure of the dice tables.
+
+    Per throw, each row of a dice table is selected with a fixed probability, uniform or following the dice sums.
+    The expected usage of a bar in a throw is then the number of compositions times the summed probability of the
+    rows selecting that bar. The expected usage is the same for each staff, with or without shuffling the staffs.
+
+    Args:
+        dice_game: the dice game
+        nmr_compositions: the number of compositions to compute the expected usage for
+        dice_weighted: if set, the rows are selected with the probabilities of the thrown dice sums, else uniformly.
+
+    Returns:
+        The expected bar usage, as floating point counts.
+    """
+    staff_names = dice_game.get_staff_names()
+
+    counts = {}
+    for table_name, dice_table in dice_game.get_dice_tables().items():
+        bar_indices = dice_table.get_bar_indices_array()
+        if dice_weighted:
+            row_probabilities = np.array([float(p) for p in dice_table.get_row_probabilities()])
+        else:
+            row_probabilities = np.full(dice_table.shape[0], 1 / dice_table.shape[0])
+
+        nmr_throws = dice_table.nmr_throws
+        nmr_bar_indices = int(bar_indices.max(initial=-1)) + 1
+        flat_indices = np.arange(nmr_throws)[None, :, None] * nmr_bar_indices + bar_indices
+        weights = np.broadcast_to(row_probabilities[:, None, None], bar_indices.shape)
+
+        valid = bar_indices >= 0
+        table_counts = np.bincount(flat_indices[valid], weights=weights[valid] * nmr_compositions,
+                                   minlength=nmr_throws * nmr_bar_indices).reshape(nmr_throws, nmr_bar_indices)
+        counts[table_name] = np.repeat(table_counts[None], len(staff_names[table_name]), axis=0)
+
+    return BarUsage(nmr_compositions, {table_name: staff_names[table_name] for table_name in counts}, counts)
+
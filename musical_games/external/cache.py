@@ -0,0 +1,274 @@
+from __future__ import annotations
+
+__author__ = 'Robbert Harms'
+__date__ = '2026-10-18'
+__maintainer__ = 'Robbert Harms'
+__email__ = 'robbert@xkls.nl'
+__licence__ = 'LGPL v3'
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from musical_games.external.utils import run_command
+
+_toolchain = ('lilypond', 'convert', 'fluidsynth', 'timidity', 'ffmpeg')
+"""The external programs used in the conversions, their versions are part of the cache keys."""
+
+_include_pattern = re.compile(rb'\\include\s*"([^"]+)"')
+
+
+@dataclass(frozen=True, slots=True)
+class ConversionCacheStats:
+    """Statistics of a conversion cache.
+
+    Args:
+        hits: the number of lookups which found a cached entry, since the creation of the cache object
+        misses: the number of lookups which did not find a cached entry
+        evictions: the number of entries removed to keep the cache within its maximum size
+        nmr_entries: the number of entries currently in the cache
+        size: the total size of the cached files, in bytes
+        max_size: the maximum size of the cached files, in bytes
+    """
+    hits: int
+    misses: int
+    evictions: int
+    nmr_entries: int
+    size: int
+    max_size: int
+
+
+class ConversionCache:
+
+    def __init__(self, cache_dir: Path, max_size: int = 2 ** 30, link: bool = True):
+        """Content addressed cache for the output files of typesetting and converting lilypond files.
+
+        Each entry is keyed by a hash of the lilypond text, the files it includes, the versions of the external
+        programs and the conversion options, see :meth:`get_key`. The versions of the programs are fingerprinted by
+        the location, size and modification time of their executables, and, since the lilypond executable is often a
+        wrapper script, by the output of ``lilypond --version``. This version is queried once per cache object, such
+        that lookups do not launch external processes.
+
+        On a hit, the cached files are hard linked (or copied if linking is not possible) to the requested output
+        location. Since hard links share their content with the cache, linked outputs should not be modified in
+        place. The least recently used entries are removed when the total size exceeds the maximum size.
+
+        Args:
+            cache_dir: the directory in which to store the cached files
+            max_size: the maximum total size of the cached files, in bytes
+            link: if set, we hard link cached files to the outputs, else we copy them.
+        """
+        self._cache_dir = Path(cache_dir)
+        self._max_size = max_size
+        self._link = link
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._toolchain_fingerprint: dict[str, Any] | None = None
+
+    @property
+    def cache_dir(self) -> Path:
+        """The directory holding the cached files."""
+        return self._cache_dir
+
+    def get_key(self, lilypond_in: Path, **options) -> str:
+        """Get the cache key of converting a lilypond file with the given options.
+
+        Args:
+            lilypond_in: the lilypond file
+            **options: the conversion options, these should be JSON serializable, paths are converted to strings.
+                Paths to existing files are fingerprinted by their size and modification time.
+
+        Returns:
+            The hexadecimal SHA-256 hash of the lilypond text, the text of the included files, the toolchain
+            versions and the options.
+        """
+        if self._toolchain_fingerprint is None:
+            toolchain_fingerprint = {program: _file_fingerprint(shutil.which(program)) for program in _toolchain}
+            toolchain_fingerprint['lilypond_version'] = _get_lilypond_version()
+            self._toolchain_fingerprint = toolchain_fingerprint
+
+        lilypond_text = Path(lilypond_in).read_bytes()
+        key_data = {
+            'toolchain': self._toolchain_fingerprint,
+            'includes': _get_include_checksums(Path(lilypond_in), lilypond_text),
+            'options': {name: _file_fingerprint(value) if isinstance(value, Path) else value
+                        for name, value in sorted(options.items())},
+        }
+        key_hash = hashlib.sha256(lilypond_text)
+        key_hash.update(json.dumps(key_data, sort_keys=True).encode())
+        return key_hash.hexdigest()
+
+    def retrieve(self, key: str, output_basename: Path) -> dict[str, list[Path]] | None:
+        """Place the cached output files of an entry at the given output location.
+
+        Args:
+            key: the cache key, see :meth:`get_key`
+            output_basename: the path and file prefix for the output files
+
+        Returns:
+            Per output type (for example ``pdf_list``) the list of output files, or None if the entry is not cached.
+        """
+        entry_dir = self._cache_dir / key
+        try:
+            manifest = json.loads((entry_dir / 'manifest.json').read_text())
+            os.utime(entry_dir / 'manifest.json')
+
+            output_basename.parent.mkdir(parents=True, exist_ok=True)
+            outputs = {}
+            for output_type, suffixes in manifest['outputs'].items():
+                outputs[output_type] = []
+                for ind, suffix in enumerate(suffixes):
+                    output_path = Path(str(output_basename) + suffix)
+                    self._place_file(entry_dir / f'{output_type}_{ind}', output_path)
+                    outputs[output_type].append(output_path)
+        except (OSError, ValueError, KeyError):
+            with self._lock:
+                self._misses += 1
+            return None
+
+        with self._lock:
+            self._hits += 1
+        return outputs
+
+    def store(self, key: str, output_basename: Path, outputs: dict[str, list[Path]]):
+        """Add the output files of a conversion to the cache.
+
+        The entry is assembled in a temporary directory and then moved in place, such that concurrent readers never
+        observe a partial entry. Afterwards, the least recently used entries are evicted if the cache is too large.
+
+        Args:
+            key: the cache key, see :meth:`get_key`
+            output_basename: the path and file prefix of the output files
+            outputs: per output type the list of output files, all starting with the output basename.
+        """
+        self._cache_dir.mkdir(parents=True, exist_ok=True)
+        temp_dir = Path(tempfile.mkdtemp(dir=self._cache_dir, prefix='.tmp_'))
+        try:
+            manifest = {'outputs': {}}
+            for output_type, output_paths in outputs.items():
+                manifest['outputs'][output_type] = []
+                for ind, output_path in enumerate(output_paths):
+                    shutil.copyfile(output_path, temp_dir / f'{output_type}_{ind}')
+                    manifest['outputs'][output_type].append(str(output_path)[len(str(output_basename)):])
+            (temp_dir / 'manifest.json').write_text(json.dumps(manifest))
+            os.replace(temp_dir, self._cache_dir / key)
+        except OSError:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            if not (self._cache_dir / key / 'manifest.json').exists():
+                raise
+        self._evict()
+
+    def get_stats(self) -> ConversionCacheStats:
+        """Get the statistics of this cache.
+
+        Returns:
+            The hit, miss and eviction counts of this cache object, and the current number of entries and size.
+        """
+        entries = self._list_entries()
+        with self._lock:
+            return ConversionCacheStats(self._hits, self._misses, self._evictions, len(entries),
+                                        sum(size for _, size, _ in entries), self._max_size)
+
+    def clear(self):
+        """Remove all the entries from the cache."""
+        for entry_dir, _, _ in self._list_entries():
+            shutil.rmtree(entry_dir, ignore_errors=True)
+
+    def _place_file(self, cached_file: Path, output_path: Path):
+        """Hard link or copy a cached file to the output path, replacing any existing file."""
+        output_path.unlink(missing_ok=True)
+        if self._link:
+            try:
+                os.link(cached_file, output_path)
+                return
+            except OSError:
+                pass
+        shutil.copyfile(cached_file, output_path)
+
+    def _evict(self):
+        """Remove the least recently used entries until the total size is within the maximum size."""
+        entries = sorted(self._list_entries(), key=lambda entry: entry[2])
+        total_size = sum(size for _, size, _ in entries)
+        for entry_dir, size, _ in entries:
+            if total_size <= self._max_size:
+                break
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total_size -= size
+            with self._lock:
+                self._evictions += 1
+
+    def _list_entries(self) -> list[tuple[Path, int, float]]:
+        """Get the directory, size in bytes and last use time of each entry in the cache."""
+        if not self._cache_dir.exists():
+            return []
+
+        entries = []
+        for entry_dir in self._cache_dir.iterdir():
+            try:
+                last_used = (entry_dir / 'manifest.json').stat().st_mtime
+                size = sum(path.stat().st_size for path in entry_dir.iterdir())
+            except OSError:
+                continue
+            entries.append((entry_dir, size, last_used))
+        return entries
+
+
+def _file_fingerprint(path: Path | str | None) -> str | list | None:
+    """Fingerprint a file by its path, size and modification time, or return the path if it is not a file."""
+    if path is None:
+        return None
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return str(path)
+    return [str(path), stat.st_size, stat.st_mtime_ns]
+
+
+def _get_lilypond_version() -> str | None:
+    """Get the version reported by lilypond, or None if lilypond could not be run."""
+    if shutil.which('lilypond') is None:
+        return None
+    try:
+        return run_command(['lilypond', '--version']).decode(errors='replace').strip()
+    except (OSError, RuntimeError):
+        return None
+
+
+def _get_include_checksums(lilypond_in: Path, lilypond_text: bytes) -> dict[str, str | None]:
+    """Get the checksums of the files included by a lilypond file, recursively.
+
+    As lilypond does by default, the includes are resolved relative to the directory of the (main) lilypond file.
+    Includes which do not exist there, like ``articulate.ly``, are assumed to come from the lilypond installation,
+    which is covered by the lilypond version, and get a checksum of None.
+
+    Args:
+        lilypond_in: the lilypond file
+        lilypond_text: the content of the lilypond file
+
+    Returns:
+        Per included file name, the hexadecimal SHA-256 hash of its content.
+    """
+    checksums = {}
+    texts = [lilypond_text]
+    while texts:
+        for match in _include_pattern.finditer(texts.pop()):
+            include_name = match.group(1).decode(errors='replace')
+            if include_name in checksums:
+                continue
+            try:
+                include_text = (lilypond_in.parent / include_name).read_bytes()
+            except OSError:
+                checksums[include_name] = None
+                continue
+            checksums[include_name] = hashlib.sha256(include_text).hexdigest()
+            texts.append(include_text)
+    return checksums
@@ -1,3 +1,5 @@
+from __future__ import annotations
+
 __author__ = 'Robbert Harms'
 __date__ = "2015-09-22"
 __maintainer__ = "Robbert Harms"
@@ -6,6 +8,7 @@ __email__ = "robbert@xkls.nl"
 from dataclasses import dataclass
 from pathlib import Path
 import os
+import time
 
 from musical_games.external.images import trim_image
 from musical_games.external.utils import run_command
@@ -45,16 +48,75 @@ def typeset_lilypond(lilypond_in: Path, output_basename: Path, pdf: bool = True,
 
     run_command(command)
 
-    pdf_list = [output_basename.with_suffix('.pdf')] if pdf else []
-    png_list = _get_png_list(output_basename) if png else []
-    ps_list = [output_basename.with_suffix('.ps')] if ps else []
-    midi_list = _get_midi_list(output_basename)
+    return _get_typeset_results(output_basename, pdf=pdf, png=png, ps=ps, trim_png=trim_png)
 
-    if trim_png:
-        for png in png_list:
-            trim_image(png)
 
-    return LilypondTypesetResults(pdf_list, png_list, ps_list, midi_list)
+def typeset_lilypond_batch(lilypond_files: list[Path], output_dir: Path, pdf: bool = True, png: bool = True,
+                           ps: bool = False, trim_png: bool = True,
+                           job_count: int | None = None) -> LilypondBatchTypesetResults:
+    """Typeset many lilypond files with a single lilypond invocation.
+
+    Starting lilypond and loading its fonts takes a fixed amount of time, which for short scores is larger than the
+    typesetting itself. This passes all the files to one lilypond process, which typesets them in parallel using
+    its ``job-count`` option.
+
+    If the batch fails, we retry each file without up-to-date output on its own, such that a failure in one file
+    does not affect the others. The files which also fail on their own are reported in the errors of the results.
+
+    Args:
+        lilypond_files: the lilypond files to convert, these should have unique file names.
+        output_dir: the directory for the output files, each output is named after its lilypond file.
+        pdf: if we want pdf output
+        png: if we want png output
+        ps: if we want postscript output
+        trim_png: if we want to automatically trim the PNG images.
+        job_count: the number of files lilypond typesets in parallel, defaults to the number of CPUs.
+
+    Raises:
+        ValueError: if two lilypond files have the same name, since their outputs would overwrite each other.
+
+    Returns:
+        The output files of each lilypond file, and the errors of the files which could not be typeset.
+    """
+    lilypond_files = [Path(lilypond_file) for lilypond_file in lilypond_files]
+    output_basenames = {lilypond_file: output_dir / lilypond_file.stem for lilypond_file in lilypond_files}
+    if len(set(output_basenames.values())) < len(lilypond_files):
+        raise ValueError('The lilypond files should have unique file names.')
+    if not lilypond_files:
+        return LilypondBatchTypesetResults({}, {})
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    command = ['lilypond', f'-djob-count={job_count or os.cpu_count() or 1}']
+    if pdf:
+        command.append('--pdf')
+    if png:
+        command.append('--png')
+    if ps:
+        command.append('--ps')
+    command.extend(['-o', output_dir, *lilypond_files])
+
+    start_time = int(time.time())  # whole seconds, for file systems with coarse modification times
+    try:
+        run_command(command)
+        failed_files = []
+    except RuntimeError:
+        failed_files = [lilypond_file for lilypond_file, output_basename in output_basenames.items()
+                        if not _has_recent_output(output_basename, start_time, pdf=pdf, png=png, ps=ps)]
+
+    results = {}
+    errors = {}
+    for lilypond_file, output_basename in output_basenames.items():
+        try:
+            if lilypond_file in failed_files:
+                results[lilypond_file] = typeset_lilypond(lilypond_file, output_basename, pdf=pdf, png=png, ps=ps,
+                                                          trim_png=trim_png)
+            else:
+                results[lilypond_file] = _get_typeset_results(output_basename, pdf=pdf, png=png, ps=ps,
+                                                              trim_png=trim_png)
+        except RuntimeError as exc:
+            errors[lilypond_file] = exc
+    return LilypondBatchTypesetResults(results, errors)
 
 
 @dataclass(frozen=True, slots=True)
@@ -73,6 +135,74 @@ class LilypondTypesetResults:
     midi_list: list[Path]
 
 
+@dataclass(frozen=True, slots=True)
+class LilypondBatchTypesetResults:
+    """Result set for the output of the batch lilypond function.
+
+    Args:
+        results: per successfully typeset lilypond file, the locations of the output files
+        errors: per lilypond file which could not be typeset, the error raised by lilypond
+    """
+    results: dict[Path, LilypondTypesetResults]
+    errors: dict[Path, RuntimeError]
+
+
+def _get_typeset_results(output_basename: Path, pdf: bool = True, png: bool = True, ps: bool = False,
+                         trim_png: bool = True) -> LilypondTypesetResults:
+    """Collect, and optionally trim, the output files of a typeset lilypond file.
+
+    Args:
+        output_basename: the basename of the output
+        pdf: if pdf output was requested
+        png: if png output was requested
+        ps: if postscript output was requested
+        trim_png: if we want to automatically trim the PNG images.
+
+    Returns:
+        The result set with the location of the output files.
+    """
+    pdf_list = [output_basename.with_suffix('.pdf')] if pdf else []
+    png_list = _get_png_list(output_basename) if png else []
+    ps_list = [output_basename.with_suffix('.ps')] if ps else []
+    midi_list = _get_midi_list(output_basename)
+
+    if trim_png:
+        for png in png_list:
+            trim_image(png)
+
+    return LilypondTypesetResults(pdf_list, png_list, ps_list, midi_list)
+
+
+def _has_recent_output(output_basename: Path, start_time: float, pdf: bool = True, png: bool = True,
+                       ps: bool = False) -> bool:
+    """Check if all the requested outputs of a lilypond file were written after the given time.
+
+    Args:
+        output_basename: the basename of the output
+        start_time: the time at which the typesetting started
+        pdf: if pdf output was requested
+        png: if png output was requested
+        ps: if postscript output was requested
+
+    Returns:
+        True if all the requested outputs exist and are up to date, False otherwise.
+    """
+    output_lists = [_get_midi_list(output_basename)]
+    if pdf:
+        output_lists.append([output_basename.with_suffix('.pdf')])
+    if png:
+        output_lists.append(_get_png_list(output_basename))
+    if ps:
+        output_lists.append([output_basename.with_suffix('.ps')])
+
+    if not any(output_lists):
+        return False
+    for output_list in output_lists[1:]:
+        if not output_list or not all(path.exists() and path.stat().st_mtime >= start_time for path in output_list):
+            return False
+    return all(path.stat().st_mtime >= start_time for path in output_lists[0])
+
+
 def _get_png_list(output_basename: Path) -> list[Path]:
     """Get the list of PNG images created by the lilypond typesetter.
 
@@ -9,6 +9,7 @@ from concurrent.futures.thread import ThreadPoolExecutor
 from dataclasses import dataclass
 from pathlib import Path
 
+from musical_games.external.cache import ConversionCache
 from musical_games.external.wav_converters import wav_to_mp3, wav_to_ogg
 from musical_games.external.midi_converters import midi_to_wav
 from musical_games.external.lilypond import typeset_lilypond, LilypondTypesetResults
@@ -17,11 +18,15 @@ from musical_games.external.lilypond import typeset_lilypond, LilypondTypesetRes
 def auto_convert_lilypond_file(lilypond_in: Path, soundfont: Path | None = None, output_basename: Path | None = None,
                                pdf: bool = True, png: bool = True, ps: bool = False, mp3: bool = True,
                                ogg: bool = True, midi_gain: float | None = None,
-                               trim_png: bool = True) -> AutoConvertLilypondResults:
+                               trim_png: bool = True,
+                               cache: ConversionCache | None = None) -> AutoConvertLilypondResults:
     """Converts a lilypond file to pdf, png, midi, wav, mp3 and ogg.
 
     Given a lilypond file we create some common output files you are typically interested in.
 
+    If a cache is given, identical conversions (same lilypond text, tools and options) are only done once. On a
+    cache hit the cached output files are placed at the output location, without running any external program.
+
     Args:
         lilypond_in: the lilypond file name
         soundfont: the path to the soundfont to use. If not given we will not convert to wav, mp3 and ogg.
@@ -33,6 +38,7 @@ def auto_convert_lilypond_file(lilypond_in: Path, soundfont: Path | None = None,
         ogg: if we want ogg output, only applicable if the lilypond has midi output defined
         midi_gain: the gain for use during the midi to wav conversion
         trim_png: if we want to automatically trim the png outputs
+        cache: the cache for the converted output files
 
     Returns:
         Information about the file names that were outputted
@@ -40,6 +46,17 @@ def auto_convert_lilypond_file(lilypond_in: Path, soundfont: Path | None = None,
     if not output_basename:
         output_basename = lilypond_in.parent / lilypond_in.stem
 
+    cache_key = None
+    if cache is not None:
+        cache_key = cache.get_key(lilypond_in, soundfont=soundfont, pdf=pdf, png=png, ps=ps, mp3=mp3, ogg=ogg,
+                                  midi_gain=midi_gain, trim_png=trim_png)
+        cached_outputs = cache.retrieve(cache_key, output_basename)
+        if cached_outputs is not None:
+            return AutoConvertLilypondResults(
+                LilypondTypesetResults(cached_outputs['pdf_list'], cached_outputs['png_list'],
+                                       cached_outputs['ps_list'], cached_outputs['midi_list']),
+                cached_outputs['wav_list'], cached_outputs['mp3_list'], cached_outputs['ogg_list'])
+
     typeset_results = typeset_lilypond(lilypond_in, output_basename, pdf=pdf, png=png, ps=ps, trim_png=trim_png)
 
     wav_list = []
@@ -57,7 +74,12 @@ def auto_convert_lilypond_file(lilypond_in: Path, soundfont: Path | None = None,
             if 'ogg' in midi_conversion_result:
                 ogg_list.append(midi_conversion_result['ogg'])
 
-    return AutoConvertLilypondResults(typeset_results, wav_list, mp3_list, ogg_list)
+    results = AutoConvertLilypondResults(typeset_results, wav_list, mp3_list, ogg_list)
+    if cache is not None:
+        cache.store(cache_key, output_basename, {
+            'pdf_list': results.pdf_list, 'png_list': results.png_list, 'ps_list': results.ps_list,
+            'midi_list': results.midi_list, 'wav_list': wav_list, 'mp3_list': mp3_list, 'ogg_list': ogg_list})
+    return results
 
 
 def _convert_midi(midi_in: Path, soundfont: Path | None = None,
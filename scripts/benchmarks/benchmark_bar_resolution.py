@@ -0,0 +1,32 @@
+__author__ = 'Robbert Harms'
+__date__ = '2026-10-18'
+__maintainer__ = 'Robbert Harms'
+__email__ = 'robbert@xkls.nl'
+__licence__ = 'LGPL v3'
+
+import timeit
+
+from musical_games.dice_games.dice_games import MozartWaltz, KirnbergerPolonaise, GerlachScottishDance
+
+nmr_selections = 2_000
+
+for dice_game in [MozartWaltz(), KirnbergerPolonaise(), GerlachScottishDance()]:
+    table_name = dice_game.get_dice_table_names()[0]
+    bar_collection = dice_game.get_bar_collections()[table_name]
+    staff_name = bar_collection.get_staff_names()[0]
+    bar_indices = list(bar_collection.get_synchronous_bar_sequences().keys())
+
+    lookup_time = timeit.timeit(
+        lambda: [bar_collection.get_bar_sequence(staff_name, bar_index) for bar_index in bar_indices], number=100)
+    staff_names_time = timeit.timeit(lambda: bar_collection.get_staff_names(), number=100_000)
+
+    print(f'{dice_game.author} {dice_game.title}:')
+    print(f'    get_bar_sequence, {100 * len(bar_indices)} lookups: {lookup_time:.4f}s')
+    print(f'    get_staff_names, 100000 lookups: {staff_names_time:.4f}s')
+
+    for shuffle_staffs in [False, True]:
+        bar_selections = dice_game.get_random_bar_selections(nmr_selections, seed=0, shuffle_staffs=shuffle_staffs)
+        resolve_time = timeit.timeit(
+            lambda: [dice_game.bar_selection_to_bars(bar_selection) for bar_selection in bar_selections], number=1)
+        print(f'    bar_selection_to_bars, {nmr_selections} selections, '
+              f'shuffle_staffs={shuffle_staffs}: {resolve_time:.4f}s')
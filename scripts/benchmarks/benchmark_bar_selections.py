@@ -0,0 +1,28 @@
+__author__ = 'Robbert Harms'
+__date__ = '2026-10-18'
+__maintainer__ = 'Robbert Harms'
+__email__ = 'robbert@xkls.nl'
+__licence__ = 'LGPL v3'
+
+import timeit
+
+from musical_games.dice_games.dice_games import MozartWaltz, KirnbergerPolonaise
+
+nmr_selections = 10_000
+
+for dice_game in [MozartWaltz(), KirnbergerPolonaise()]:
+    for shuffle_staffs in [False, True]:
+        loop_time = timeit.timeit(
+            lambda: [dice_game.get_random_bar_selection(seed=seed, shuffle_staffs=shuffle_staffs)
+                     for seed in range(nmr_selections)], number=1)
+        batch_time = timeit.timeit(
+            lambda: dice_game.get_random_bar_selections(nmr_selections, seed=0, shuffle_staffs=shuffle_staffs),
+            number=1)
+        indices_time = timeit.timeit(
+            lambda: dice_game.get_random_row_indices(nmr_selections, seed=0, shuffle_staffs=shuffle_staffs),
+            number=1)
+
+        print(f'{dice_game.title}, shuffle_staffs={shuffle_staffs}, {nmr_selections} selections:')
+        print(f'    per call loop: {loop_time:.4f}s')
+        print(f'    batch selections: {batch_time:.4f}s ({loop_time / batch_time:.1f}x)')
+        print(f'    batch row indices: {indices_time:.4f}s ({loop_time / indices_time:.1f}x)')
@@ -0,0 +1,35 @@
+__author__ = 'Robbert Harms'
+__date__ = '2026-10-18'
+__maintainer__ = 'Robbert Harms'
+__email__ = 'robbert@xkls.nl'
+__licence__ = 'LGPL v3'
+
+import subprocess
+import sys
+import timeit
+
+nmr_repeats = 5
+
+# Each measurement runs in a new process, such that nothing is cached between runs.
+load_all_games = '''
+import time
+from musical_games.dice_games import registry
+import musical_games.dice_games.dice_games
+start = time.perf_counter()
+for game_name in registry.list_games():
+    for bar_collection in registry.get_game(game_name).get_bar_collections().values():
+        bar_collection.bar_collection_loader.{load_method}()
+print(time.perf_counter() - start)
+'''
+
+for description, load_method in [('CSV files', 'csv_loader.load_data'), ('binary snapshots', 'load_data')]:
+    timings = []
+    for _ in range(nmr_repeats):
+        output = subprocess.run([sys.executable, '-c', load_all_games.format(load_method=load_method)],
+                                capture_output=True, text=True, check=True).stdout
+        timings.append(float(output))
+    print(f'Cold start, load the bars of all games from {description}: {min(timings):.4f}s (best of {nmr_repeats})')
+
+import_time = timeit.timeit(lambda: subprocess.run([sys.executable, '-c', 'import musical_games.dice_games.dice_games'],
+                                                   check=True), number=nmr_repeats) / nmr_repeats
+print(f'Python interpreter start and import of the dice games: {import_time:.4f}s')
@@ -30,6 +30,7 @@ print(dice_game.get_duplicate_dice_table_elements('part_one'))
 print(dice_game.get_duplicate_dice_table_elements('part_two'))
 print(dice_game.count_unique_compositions(count_duplicates=True))
 print(dice_game.count_unique_compositions(count_duplicates=False))
+print(dice_game.count_unique_compositions(count_duplicates=False, shuffle_staffs=True))
 
 dice_tables = dice_game.get_dice_tables()
 selection = GroupedStaffsBarSelection(
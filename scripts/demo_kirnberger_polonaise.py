@@ -27,6 +27,7 @@ auto_convert_lilypond_file(out_dir / 'single_dice_table_element_polonaise_0.ly')
 print(dice_game.get_duplicate_dice_table_elements('polonaise'))
 print(dice_game.count_unique_compositions(count_duplicates=True))
 print(dice_game.count_unique_compositions(count_duplicates=False))
+print(dice_game.count_unique_compositions(count_duplicates=False, shuffle_staffs=True))
 
 dice_game.compile_composition_score(dice_game.get_random_bar_selection(seed=0, shuffle_staffs=True),
                                     comment='Test', single_page=True).to_file(out_dir / 'composition_pdf.ly')
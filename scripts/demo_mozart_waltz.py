@@ -39,6 +39,9 @@ dice_game.compile_composition_audio(
     dice_game.get_random_bar_selection(seed=1, shuffle_staffs=False),
     midi_settings=my_midi_settings).to_file(out_dir / 'composition_midi.ly')
 
+(out_dir / 'composition_direct.midi').write_bytes(dice_game.compile_composition_midi(
+    dice_game.get_random_bar_selection(seed=1, shuffle_staffs=False), midi_settings=my_midi_settings))
+
 auto_convert_lilypond_file(
     out_dir / 'composition_midi.ly',
     soundfont=Path('/home/robbert/programming/python/opus_infinity.org/soundfonts/Musyng_Kite.sf2'))
@@ -0,0 +1,23 @@
+__author__ = 'Robbert Harms'
+__date__ = '2026-10-18'
+__maintainer__ = 'Robbert Harms'
+__email__ = 'robbert@xkls.nl'
+__licence__ = 'LGPL v3'
+
+from musical_games.dice_games import registry
+from musical_games.dice_games.data_csv import LazyBarCollection
+from musical_games.dice_games.data_snapshot import SnapshotBarCollectionLoader
+
+# Compiles the bar and annotation CSV files of all dice games into binary snapshots.
+# Run this after changing any of the bar or annotation CSV files, stale snapshots are ignored when loading.
+snapshot_loaders = {}
+for game_name in registry.list_games():
+    for bar_collection in registry.get_game(game_name).get_bar_collections().values():
+        if isinstance(bar_collection, LazyBarCollection):
+            loader = bar_collection.bar_collection_loader
+            if isinstance(loader, SnapshotBarCollectionLoader):
+                snapshot_loaders[loader.snapshot_file] = loader
+
+for snapshot_file, loader in snapshot_loaders.items():
+    loader.write_snapshot()
+    print(f'Wrote {snapshot_file}')
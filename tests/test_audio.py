@@ -0,0 +1,175 @@
+__author__ = 'Robbert Harms'
+__date__ = '2026-10-18'
+__maintainer__ = 'Robbert Harms'
+__email__ = 'robbert@xkls.nl'
+__licence__ = 'LGPL v3'
+
+import io
+import wave
+
+import numpy as np
+import pytest
+
+from musical_games.dice_games import audio
+from musical_games.dice_games.audio import BarAudioCache, read_wav, to_pcm_bytes, write_wav
+from musical_games.dice_games.base import MidiSection
+from musical_games.dice_games.dice_games import MozartWaltz
+from musical_games.dice_games.midi import default_ticks_per_quarter
+from musical_games.dice_games.registry import get_game
+
+
+def _get_bar_id(placement):
+    return placement.table_name, placement.staff_name, placement.lilypond_str, placement.tempo
+
+
+def _store_bar_audio(bar_audio_cache, placements):
+    """Store distinct audio for each of the placements in the cache, such that no synthesizer is needed."""
+    bar_audio = {}
+    for ind, placement in enumerate(placements):
+        samples = np.full((100 + ind, 2), ind / len(placements), dtype=np.float32)
+        bar_audio_cache.store_bar_audio(placement, samples, 8000)
+        bar_audio[_get_bar_id(placement)] = samples
+    return bar_audio
+
+
+def _store_full_bar_audio(bar_audio_cache, placements, release_time=0.5):
+    """Store random audio spanning the length of each bar plus a release tail, as a synthesizer would render."""
+    rng = np.random.default_rng(0)
+    bar_lengths = []
+    for placement in placements:
+        bar_time = placement.bar_events.length / default_ticks_per_quarter * 60 / placement.tempo
+        samples = (rng.random((round((bar_time + release_time) * 8000), 2)) - 0.5).astype(np.float32)
+        bar_audio_cache.store_bar_audio(placement, samples, 8000)
+        bar_lengths.append(len(samples))
+    return max(bar_lengths)
+
+
+class _TwoTempiWaltz(MozartWaltz):
+    """Mozart's waltz playing its second half at a different tempo."""
+
+    def get_midi_sections(self):
+        return [MidiSection(('waltz',), 55, tuple(range(8))), MidiSection(('waltz',), 80, tuple(range(8, 16)))]
+
+
+class _CountingMidiToWavFactory:
+    """Synthesizer factory writing a short silence for each call, counting the calls."""
+
+    def __init__(self):
+        self.nmr_calls = 0
+
+    def set_soundfont(self, soundfont):
+        pass
+
+    def create(self):
+        factory = self
+
+        class CountingMidiToWav:
+            def call(self, midi_in, wav_out, gain=None):
+                factory.nmr_calls += 1
+                write_wav(wav_out, np.zeros((10, 2), dtype=np.float32), 8000)
+
+        return CountingMidiToWav()
+
+
+def test_open_bars_are_bounded(tmp_path):
+    dice_game = MozartWaltz()
+    bar_audio_cache = BarAudioCache(dice_game, tmp_path, max_open_bars=4)
+    placements = dice_game.get_midi_bar_placements(dice_game.get_random_bar_selection(seed=0))
+    bar_audio = _store_bar_audio(bar_audio_cache, placements)
+    assert len(bar_audio) > 4
+
+    for placement in placements * 2:
+        assert bar_audio_cache.has_bar_audio(placement)
+        samples, sample_rate = bar_audio_cache.get_bar_audio(placement)
+        assert sample_rate == 8000
+        assert np.array_equal(samples, bar_audio[_get_bar_id(placement)])
+        assert bar_audio_cache.nmr_open_bars <= 4
+
+
+def test_uncached_bars_are_read(tmp_path):
+    dice_game = MozartWaltz()
+    placements = dice_game.get_midi_bar_placements(dice_game.get_random_bar_selection(seed=0))
+    _store_bar_audio(BarAudioCache(dice_game, tmp_path), placements)
+
+    reference = BarAudioCache(dice_game, tmp_path).get_composition_audio(dice_game.get_random_bar_selection(seed=0))
+    bar_audio_cache = BarAudioCache(dice_game, tmp_path, max_open_bars=0)
+    samples, sample_rate = bar_audio_cache.get_composition_audio(dice_game.get_random_bar_selection(seed=0))
+    assert bar_audio_cache.nmr_open_bars == 0
+    assert sample_rate == reference[1]
+    assert np.array_equal(samples, reference[0])
+
+
+def test_prerender_all_tempi(tmp_path, monkeypatch):
+    factory = _CountingMidiToWavFactory()
+    monkeypatch.setattr(audio, 'AutoMidiToWavFactory', lambda: factory)
+    dice_game = _TwoTempiWaltz()
+    bar_audio_cache = BarAudioCache(dice_game, tmp_path)
+
+    bar_collection = dice_game.get_bar_collections()['waltz']
+    nmr_bars = len({(staff_name, bar.lilypond_str) for staff_name in bar_collection.get_staff_names()
+                    for bar_sequence in bar_collection.get_bar_sequences(staff_name).values()
+                    for bar in bar_sequence.get_bars()})
+    assert bar_audio_cache.prerender(max_workers=4) == 2 * nmr_bars
+    assert factory.nmr_calls == 2 * nmr_bars
+    assert bar_audio_cache.prerender() == 0
+
+    for bar_selection in dice_game.get_random_bar_selections(5, seed=0):
+        placements = dice_game.get_midi_bar_placements(bar_selection)
+        assert {placement.tempo for placement in placements} == {55, 80}
+        assert all(bar_audio_cache.has_bar_audio(placement) for placement in placements)
+        bar_audio_cache.get_composition_audio(bar_selection)
+    assert factory.nmr_calls == 2 * nmr_bars
+
+
+@pytest.mark.parametrize('game_name', ['mozart_waltz', 'cpe_bach_counterpoint'])
+def test_streamed_audio_equals_assembled_audio(game_name, tmp_path):
+    dice_game = get_game(game_name)
+    bar_selection = dice_game.get_random_bar_selection(seed=0)
+    bar_audio_cache = BarAudioCache(dice_game, tmp_path)
+    max_bar_length = _store_full_bar_audio(bar_audio_cache, dice_game.get_midi_bar_placements(bar_selection))
+
+    samples, sample_rate = bar_audio_cache.get_composition_audio(bar_selection)
+    chunks = list(bar_audio_cache.iter_composition_audio(bar_selection))
+    assert len(chunks) > 1
+    assert all(chunk_sample_rate == sample_rate for _, chunk_sample_rate in chunks)
+    assert all(0 < len(chunk) <= max_bar_length for chunk, _ in chunks)
+    assert np.array_equal(np.concatenate([chunk for chunk, _ in chunks]), samples)
+
+
+@pytest.mark.parametrize('float_samples', [False, True])
+def test_streamed_wav(float_samples, tmp_path):
+    dice_game = MozartWaltz()
+    bar_selection = dice_game.get_random_bar_selection(seed=0)
+    bar_audio_cache = BarAudioCache(dice_game, tmp_path / 'cache')
+    _store_full_bar_audio(bar_audio_cache, dice_game.get_midi_bar_placements(bar_selection))
+    samples, sample_rate = bar_audio_cache.get_composition_audio(bar_selection)
+
+    wav_bytes = b''.join(bar_audio_cache.iter_composition_wav(bar_selection, float_samples=float_samples))
+    (tmp_path / 'streamed.wav').write_bytes(wav_bytes)
+    streamed_samples, streamed_sample_rate = read_wav(tmp_path / 'streamed.wav')
+    assert streamed_sample_rate == sample_rate
+    assert streamed_samples.shape == samples.shape
+
+    written_samples, _ = read_wav(bar_audio_cache.write_composition_wav(
+        bar_selection, tmp_path / 'written.wav', float_samples=float_samples))
+    assert np.array_equal(streamed_samples, written_samples)
+
+    if float_samples:
+        assert np.array_equal(streamed_samples, samples)
+    else:
+        assert np.abs(streamed_samples - np.clip(samples, -1, 32767 / 32768)).max() <= 1 / 32768
+        with wave.open(io.BytesIO(wav_bytes)) as wav_file:
+            assert (wav_file.getnchannels(), wav_file.getsampwidth(), wav_file.getframerate()) == (2, 2, sample_rate)
+            assert wav_file.readframes(len(samples) + 1) == to_pcm_bytes(samples)
+
+
+def test_read_wav_roundtrip(tmp_path):
+    samples = (np.random.default_rng(0).random((1000, 2)) * 2 - 1).astype(np.float32)
+    write_wav(tmp_path / 'float.wav', samples, 8000, float_samples=True)
+    assert np.array_equal(read_wav(tmp_path / 'float.wav')[0], samples)
+    assert np.array_equal(read_wav(tmp_path / 'float.wav', mmap=False)[0], samples)
+
+    write_wav(tmp_path / 'pcm.wav', samples, 8000)
+    pcm_samples, sample_rate = read_wav(tmp_path / 'pcm.wav')
+    assert sample_rate == 8000
+    assert np.abs(pcm_samples - samples).max() < 1 / 32767
@@ -0,0 +1,50 @@
+__author__ = 'Robbert Harms'
+__date__ = '2026-10-18'
+__maintainer__ = 'Robbert Harms'
+__email__ = 'robbert@xkls.nl'
+__licence__ = 'LGPL v3'
+
+import gc
+import weakref
+
+import jinja2
+import pytest
+
+from musical_games.dice_games.base import SimpleDiceGame
+from musical_games.dice_games.registry import get_game
+
+
+def _create_dice_game(bar_selection_cache_size):
+    dice_game = get_game('mozart_waltz')
+    return SimpleDiceGame(dice_game.author, dice_game.title, dice_game.get_dice_tables(),
+                          dice_game.get_bar_collections(), jinja2.Environment(), dice_game.get_default_midi_settings(),
+                          bar_selection_cache_size=bar_selection_cache_size)
+
+
+@pytest.mark.parametrize('bar_selection_cache_size, currsize', [(0, 0), (4, 4), (None, 10)])
+def test_cache_size(bar_selection_cache_size, currsize):
+    dice_game = _create_dice_game(bar_selection_cache_size)
+    reference = get_game('mozart_waltz')
+
+    bar_selections = dice_game.get_random_bar_selections(10, seed=0)
+    for bar_selection in bar_selections + bar_selections[::-1]:
+        assert dice_game.bar_selection_to_bars(bar_selection) == reference.bar_selection_to_bars(bar_selection)
+
+    cache_info = dice_game.get_bar_selection_cache_info()
+    assert cache_info.maxsize == bar_selection_cache_size
+    assert cache_info.currsize == currsize
+    assert cache_info.hits + cache_info.misses == 20
+    assert cache_info.hits == min(currsize, 10)
+
+
+def test_cache_is_freed_with_the_game():
+    dice_game = _create_dice_game(16)
+    dice_game.bar_selection_to_bars(dice_game.get_random_bar_selection(seed=0))
+    dice_game_ref = weakref.ref(dice_game)
+
+    gc.disable()
+    try:
+        del dice_game
+        assert dice_game_ref() is None
+    finally:
+        gc.enable()
@@ -0,0 +1,106 @@
+__author__ = 'Robbert Harms'
+__date__ = '2026-10-18'
+__maintainer__ = 'Robbert Harms'
+__email__ = 'robbert@xkls.nl'
+__licence__ = 'LGPL v3'
+
+import concurrent.futures
+import itertools
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import jinja2
+import pytest
+
+from musical_games.dice_games.base import (BarAnnotation, CompiledCompositionTemplate, RenderOptions, SimpleBar,
+                                           SimpleBarSequence, SimpleSynchronousBarSequence)
+from musical_games.dice_games.registry import get_game, list_games
+
+
+@pytest.mark.parametrize('game_name', list_games())
+@pytest.mark.parametrize('shuffle_staffs', [False, True])
+def test_compiled_output_identical_to_jinja2(game_name, shuffle_staffs):
+    compiled_game = get_game(game_name, render_options=RenderOptions(compiled_compositions=True))
+    jinja2_game = get_game(game_name, render_options=RenderOptions(compiled_compositions=False))
+
+    midi_settings = jinja2_game.get_default_midi_settings()
+    table_name = jinja2_game.get_dice_table_names()[0]
+    staff_name = jinja2_game.get_staff_names()[table_name][0]
+    other_midi_settings = midi_settings.with_updated_instrument('violin', table_name, staff_name)
+
+    bar_selections = jinja2_game.get_random_bar_selections(150, seed=0, shuffle_staffs=shuffle_staffs)
+    for ind, bar_selection in enumerate(bar_selections):
+        comment = None if ind % 3 else f'Composition {ind}'
+        single_page = ind % 2 == 0
+        assert (compiled_game.compile_composition_score(bar_selection, comment, single_page).get_score()
+                == jinja2_game.compile_composition_score(bar_selection, comment, single_page).get_score())
+
+        settings = other_midi_settings if ind % 4 == 0 else midi_settings
+        assert (compiled_game.compile_composition_audio(bar_selection, settings).get_score()
+                == jinja2_game.compile_composition_audio(bar_selection, settings).get_score())
+
+
+@dataclass(frozen=True)
+class _Annotation(BarAnnotation):
+    accent: bool
+    label: str
+
+
+def _make_composition_bars(annotations):
+    return {'table': [SimpleSynchronousBarSequence.from_dict_of_bar_sequences({
+        'upper': SimpleBarSequence((SimpleBar(f'c{ind}', annotation),)),
+        'lower': SimpleBarSequence((SimpleBar(f'd{ind}', _Annotation(False, 'x')),))})
+        for ind, annotation in enumerate(annotations)]}
+
+
+@pytest.mark.parametrize('template_str, nmr_skeletons', [
+    ('{% for s in composition_bars.table %}{% set b = s.get_bar_sequence("upper").get_bars()[0] %}'
+     '{% if b.get_annotation().accent %}!{% endif %}{{ b.lilypond_str }} {% endfor %}', 2 ** 3),
+    ('{% for s in composition_bars.table %}{% set b = s.get_bar_sequence("upper").get_bars()[0] %}'
+     '{{ b.get_annotation() }}{{ b.lilypond_str }} {% endfor %}', 4 ** 3),
+    ('{% for s in composition_bars.table %}{{ s.get_bar_sequence("lower").get_bars()[0].lilypond_str }}'
+     '{% endfor %}', 1),
+])
+def test_skeletons_keyed_on_used_annotations(template_str, nmr_skeletons):
+    template = jinja2.Environment().from_string(template_str)
+    compiled_template = CompiledCompositionTemplate(template)
+
+    annotations = [_Annotation(accent, label) for accent in (False, True) for label in ('a', 'b')]
+    for combination in itertools.product(annotations, repeat=3):
+        composition_bars = _make_composition_bars(combination)
+        assert (compiled_template.render(composition_bars, None)
+                == template.render(composition_bars=composition_bars))
+    assert len(compiled_template._skeletons) == nmr_skeletons
+
+
+class _SwitchingOrderedDict(OrderedDict):
+    """Ordered dict yielding to other threads before moving a key, to expose unguarded check-then-move sequences."""
+
+    def move_to_end(self, key, last=True):
+        time.sleep(0)
+        super().move_to_end(key, last)
+
+
+def test_render_from_multiple_threads():
+    template_str = ('{% for s in composition_bars.table %}{% set b = s.get_bar_sequence("upper").get_bars()[0] %}'
+                    '{{ b.get_annotation() }}{{ b.lilypond_str }} {% endfor %}')
+    template = jinja2.Environment().from_string(template_str)
+    compiled_template = CompiledCompositionTemplate(template, max_skeletons=4, max_sequences=8)
+    compiled_template._skeletons = _SwitchingOrderedDict()
+
+    annotations = [_Annotation(accent, label) for accent in (False, True) for label in ('a', 'b')]
+    all_composition_bars = [_make_composition_bars(combination)
+                            for combination in itertools.product(annotations, repeat=3)] * 20
+
+    def render_all(thread_ind):
+        return [compiled_template.render(composition_bars, None)
+                for composition_bars in all_composition_bars[thread_ind:] + all_composition_bars[:thread_ind]]
+
+    with concurrent.futures.ThreadPoolExecutor(8) as executor:
+        results = list(executor.map(render_all, range(8)))
+
+    expected = [template.render(composition_bars=composition_bars) for composition_bars in all_composition_bars]
+    for thread_ind, result in enumerate(results):
+        assert result == expected[thread_ind:] + expected[:thread_ind]
+    assert len(compiled_template._skeletons) <= 4
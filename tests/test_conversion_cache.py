@@ -0,0 +1,56 @@
+__author__ = 'Robbert Harms'
+__date__ = '2026-10-18'
+__maintainer__ = 'Robbert Harms'
+__email__ = 'robbert@xkls.nl'
+__licence__ = 'LGPL v3'
+
+import pytest
+
+from musical_games.external import cache as cache_module
+from musical_games.external.cache import ConversionCache
+
+
+@pytest.fixture
+def lilypond_file(tmp_path):
+    (tmp_path / 'notes.ily').write_text('\\include "voices/upper.ily"\nnotes = { \\upper }')
+    (tmp_path / 'voices').mkdir()
+    (tmp_path / 'voices' / 'upper.ily').write_text("upper = { c'4 }")
+    lilypond_in = tmp_path / 'score.ly'
+    lilypond_in.write_text('\\include "articulate.ly"\n\\include "notes.ily"\n\\score { \\notes }')
+    return lilypond_in
+
+
+def test_key_depends_on_included_files(tmp_path, lilypond_file):
+    conversion_cache = ConversionCache(tmp_path / 'cache')
+    key = conversion_cache.get_key(lilypond_file, pdf=True)
+    assert conversion_cache.get_key(lilypond_file, pdf=True) == key
+    assert conversion_cache.get_key(lilypond_file, pdf=False) != key
+
+    (tmp_path / 'voices' / 'upper.ily').write_text("upper = { d'4 }")
+    assert conversion_cache.get_key(lilypond_file, pdf=True) != key
+
+
+def test_key_depends_on_lilypond_version(tmp_path, lilypond_file, monkeypatch):
+    monkeypatch.setattr(cache_module, '_get_lilypond_version', lambda: 'GNU LilyPond 2.22.1')
+    key = ConversionCache(tmp_path / 'cache').get_key(lilypond_file)
+
+    monkeypatch.setattr(cache_module, '_get_lilypond_version', lambda: 'GNU LilyPond 2.24.4')
+    assert ConversionCache(tmp_path / 'cache').get_key(lilypond_file) != key
+
+
+def test_store_and_retrieve(tmp_path, lilypond_file):
+    conversion_cache = ConversionCache(tmp_path / 'cache')
+    key = conversion_cache.get_key(lilypond_file)
+    assert conversion_cache.retrieve(key, tmp_path / 'out' / 'score') is None
+
+    (tmp_path / 'score.pdf').write_text('pdf')
+    (tmp_path / 'score-1.midi').write_text('midi')
+    conversion_cache.store(key, tmp_path / 'score', {'pdf_list': [tmp_path / 'score.pdf'],
+                                                     'midi_list': [tmp_path / 'score-1.midi']})
+
+    outputs = conversion_cache.retrieve(key, tmp_path / 'out' / 'score')
+    assert outputs == {'pdf_list': [tmp_path / 'out' / 'score.pdf'], 'midi_list': [tmp_path / 'out' / 'score-1.midi']}
+    assert (tmp_path / 'out' / 'score-1.midi').read_text() == 'midi'
+
+    stats = conversion_cache.get_stats()
+    assert (stats.hits, stats.misses, stats.nmr_entries) == (1, 1, 1)
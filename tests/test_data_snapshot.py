@@ -0,0 +1,94 @@
+__author__ = 'Robbert Harms'
+__date__ = '2026-10-18'
+__maintainer__ = 'Robbert Harms'
+__email__ = 'robbert@xkls.nl'
+__licence__ = 'LGPL v3'
+
+import mmap
+import os
+import shutil
+from importlib import resources
+
+import pytest
+
+from musical_games.dice_games import data_snapshot
+from musical_games.dice_games.data_csv import CSVBarCollectionLoader
+from musical_games.dice_games.data_snapshot import SnapshotBarCollectionLoader, SnapshotError
+from musical_games.dice_games.dice_games import GerlachScottishDance
+
+
+@pytest.fixture
+def snapshot_loader(tmp_path):
+    data_dir = resources.files('musical_games') / 'data/dice_games/gerlach_scottish_dance'
+    for file_name in ['scottish_dance_bars.csv', 'scottish_dance_bars_annotations.csv']:
+        shutil.copy(data_dir / file_name, tmp_path / file_name)
+
+    loader = SnapshotBarCollectionLoader(CSVBarCollectionLoader(
+        tmp_path / 'scottish_dance_bars.csv',
+        annotation_data_csv=tmp_path / 'scottish_dance_bars_annotations.csv',
+        annotation_loader=GerlachScottishDance.GerlachAnnotationLoader()))
+    loader.write_snapshot()
+    return loader
+
+
+@pytest.fixture
+def opened_buffers(monkeypatch):
+    buffers = []
+    mmap_type = mmap.mmap
+
+    def open_buffer(*args, **kwargs):
+        buffers.append(mmap_type(*args, **kwargs))
+        return buffers[-1]
+
+    monkeypatch.setattr(data_snapshot.mmap, 'mmap', open_buffer)
+    return buffers
+
+
+def _get_bar_strings(bar_collection):
+    return {bar_index: [[bar.lilypond_str for bar in sync_bar.get_bars()]
+                        for sync_bar in sequence.get_synchronous_bars()]
+            for bar_index, sequence in bar_collection.get_synchronous_bar_sequences().items()}
+
+
+def test_snapshot_equals_csv(snapshot_loader):
+    bar_collection = snapshot_loader.load_snapshot(verify_payload=True)
+    csv_collection = snapshot_loader.csv_loader.load_data()
+    assert bar_collection.get_staff_names() == csv_collection.get_staff_names()
+    assert _get_bar_strings(bar_collection) == _get_bar_strings(csv_collection)
+
+
+def test_touched_sources_are_hashed(snapshot_loader, monkeypatch):
+    hashed_files = []
+    file_checksum = data_snapshot._file_checksum
+    monkeypatch.setattr(data_snapshot, '_file_checksum', lambda source: hashed_files.append(source) or
+                        file_checksum(source))
+
+    snapshot_loader.load_snapshot()
+    assert hashed_files == []
+
+    bar_data_csv = snapshot_loader.csv_loader.bar_data_csv
+    os.utime(bar_data_csv, ns=(0, 0))
+    assert not snapshot_loader.is_stale()
+    assert bar_data_csv in hashed_files
+
+
+def test_changed_sources_are_stale(snapshot_loader, opened_buffers):
+    bar_data_csv = snapshot_loader.csv_loader.bar_data_csv
+    bar_data_csv.write_text(bar_data_csv.read_text().replace('c', 'd', 1))
+
+    with pytest.raises(SnapshotError):
+        snapshot_loader.load_snapshot()
+    assert snapshot_loader.is_stale()
+    assert snapshot_loader.load_data().nmr_bars > 0
+    assert all(buffer.closed for buffer in opened_buffers)
+
+
+def test_payload_verified_on_request(snapshot_loader, opened_buffers):
+    data = snapshot_loader.snapshot_file.read_bytes()
+    position = data.index(b'\\clef')
+    snapshot_loader.snapshot_file.write_bytes(data[:position] + b'\\CLEF' + data[position + 5:])
+
+    snapshot_loader.load_snapshot()
+    with pytest.raises(SnapshotError):
+        snapshot_loader.load_snapshot(verify_payload=True)
+    assert opened_buffers[-1].closed
@@ -0,0 +1,117 @@
+__author__ = 'Robbert Harms'
+__date__ = '2026-10-18'
+__maintainer__ = 'Robbert Harms'
+__email__ = 'robbert@xkls.nl'
+__licence__ = 'LGPL v3'
+
+import numpy as np
+import pytest
+
+from musical_games.dice_games.base import DiceGame, MidiSection
+from musical_games.dice_games.registry import get_game, list_games
+
+
+class _MinimalDiceGame(DiceGame):
+    """Dice game implementing only the abstract methods, delegating them to a bundled game."""
+
+    def __init__(self, dice_game):
+        self._dice_game = dice_game
+
+    @property
+    def author(self):
+        return self._dice_game.author
+
+    @property
+    def title(self):
+        return self._dice_game.title
+
+    def get_dice_table_names(self):
+        return self._dice_game.get_dice_table_names()
+
+    def get_staff_names(self):
+        return self._dice_game.get_staff_names()
+
+    def get_dice_tables(self):
+        return self._dice_game.get_dice_tables()
+
+    def get_bar_collections(self):
+        return self._dice_game.get_bar_collections()
+
+    def get_duplicate_dice_table_elements(self, dice_table_name, staff_name=None):
+        return self._dice_game.get_duplicate_dice_table_elements(dice_table_name, staff_name)
+
+    def count_unique_compositions(self, count_duplicates=False, shuffle_staffs=False):
+        return self._dice_game.count_unique_compositions(count_duplicates, shuffle_staffs)
+
+    def get_random_bar_selection(self, seed=None, shuffle_staffs=False, dice_weighted=False):
+        return self._dice_game.get_random_bar_selection(seed, shuffle_staffs, dice_weighted)
+
+    def bar_selection_to_bars(self, bar_selection):
+        return self._dice_game.bar_selection_to_bars(bar_selection)
+
+    def get_default_midi_settings(self):
+        return self._dice_game.get_default_midi_settings()
+
+    def compile_bars_overview(self, single_page=False):
+        return self._dice_game.compile_bars_overview(single_page)
+
+    def compile_single_bar(self, table_name, bar_ind):
+        return self._dice_game.compile_single_bar(table_name, bar_ind)
+
+    def compile_single_dice_table_element(self, table_name, dice_table_element):
+        return self._dice_game.compile_single_dice_table_element(table_name, dice_table_element)
+
+    def compile_composition_score(self, bar_selection, comment=None, single_page=False):
+        return self._dice_game.compile_composition_score(bar_selection, comment, single_page)
+
+    def compile_composition_audio(self, bar_selection, midi_settings=None):
+        return self._dice_game.compile_composition_audio(bar_selection, midi_settings)
+
+
+@pytest.mark.parametrize('game_name', list_games())
+@pytest.mark.parametrize('shuffle_staffs', [False, True])
+def test_default_implementations(game_name, shuffle_staffs):
+    dice_game = get_game(game_name)
+    minimal_game = _MinimalDiceGame(dice_game)
+    minimal_game.warm()
+
+    row_indices = minimal_game.get_random_row_indices(20, seed=0, shuffle_staffs=shuffle_staffs)
+    reference_row_indices = dice_game.get_random_row_indices(20, seed=0, shuffle_staffs=shuffle_staffs)
+    assert all(np.array_equal(row_indices[table_name], reference_row_indices[table_name])
+               for table_name in dice_game.get_dice_table_names())
+
+    bar_indices = minimal_game.row_indices_to_bar_indices(row_indices)
+    reference_bar_indices = dice_game.row_indices_to_bar_indices(row_indices)
+    assert all(np.array_equal(bar_indices[table_name], reference_bar_indices[table_name])
+               for table_name in dice_game.get_dice_table_names())
+
+    bar_selections = minimal_game.get_random_bar_selections(20, seed=0, shuffle_staffs=shuffle_staffs)
+    assert bar_selections == dice_game.get_random_bar_selections(20, seed=0, shuffle_staffs=shuffle_staffs)
+
+    for bar_selection in bar_selections[:5]:
+        rank = minimal_game.selection_to_rank(bar_selection, shuffle_staffs)
+        assert rank == dice_game.selection_to_rank(bar_selection, shuffle_staffs)
+        assert minimal_game.rank_to_selection(rank, shuffle_staffs) == dice_game.rank_to_selection(
+            rank, shuffle_staffs)
+        assert (minimal_game.get_composition_probability(bar_selection, shuffle_staffs)
+                == dice_game.get_composition_probability(bar_selection, shuffle_staffs))
+
+    for table_name, staff_names in dice_game.get_staff_names().items():
+        for staff_name in [None] + (staff_names if shuffle_staffs else []):
+            assert (minimal_game.get_unique_dice_table_elements(table_name, staff_name)
+                    == dice_game.get_unique_dice_table_elements(table_name, staff_name))
+    assert (list(minimal_game.enumerate_unique_compositions(stop=10, shuffle_staffs=shuffle_staffs))
+            == list(dice_game.enumerate_unique_compositions(stop=10, shuffle_staffs=shuffle_staffs)))
+
+
+def test_default_midi_sections():
+    dice_game = get_game('mozart_waltz')
+    assert _MinimalDiceGame(dice_game).get_midi_sections() == [MidiSection(('waltz',), 100)]
+
+    class _SectionsDiceGame(_MinimalDiceGame):
+        def get_midi_sections(self):
+            return self._dice_game.get_midi_sections()
+
+    bar_selection = dice_game.get_random_bar_selection(seed=0)
+    assert (_SectionsDiceGame(dice_game).compile_composition_midi(bar_selection)
+            == dice_game.compile_composition_midi(bar_selection))
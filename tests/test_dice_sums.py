@@ -0,0 +1,118 @@
+__author__ = 'Robbert Harms'
+__date__ = '2026-10-18'
+__maintainer__ = 'Robbert Harms'
+__email__ = 'robbert@xkls.nl'
+__licence__ = 'LGPL v3'
+
+import re
+
+import numpy as np
+import pytest
+
+from musical_games.dice_games.base import SimpleDiceTable
+from musical_games.dice_games.dice_games import GerlachScottishDance
+from musical_games.dice_games.registry import get_game, list_games
+
+
+class _MixedLengthScottishDance(GerlachScottishDance):
+    """Gerlach's Scottish dance with every third dice table element shortened to a single bar."""
+
+    def __init__(self):
+        super().__init__()
+        self._mixed_dice_tables = {
+            table_name: SimpleDiceTable.from_lists([
+                [element.get_bar_indices()[:1] if (element.row_ind + element.column_ind) % 3 == 0
+                 else element.get_bar_indices() for element in row] for row in dice_table.list_rows()])
+            for table_name, dice_table in super().get_dice_tables().items()}
+
+    def get_dice_tables(self):
+        return self._mixed_dice_tables
+
+
+def _get_random_dice_sums(dice_game, nmr_compositions, per_staff):
+    rng = np.random.default_rng(0)
+    dice_sums = {}
+    for table_name, dice_table in dice_game.get_dice_tables().items():
+        shape = (nmr_compositions, dice_table.nmr_throws)
+        if per_staff:
+            shape = (nmr_compositions, len(dice_game.get_staff_names()[table_name]), dice_table.nmr_throws)
+        dice_sums[table_name] = rng.integers(dice_table.min_dice_value, dice_table.max_dice_value + 1, size=shape)
+    return dice_sums
+
+
+_dice_games = {game_name: get_game(game_name) for game_name in list_games()} | {
+    'mixed_length_scottish_dance': _MixedLengthScottishDance()}
+
+
+@pytest.mark.parametrize('game_name', list(_dice_games))
+@pytest.mark.parametrize('per_staff', [False, True])
+def test_dice_sums_match_dice_throws(game_name, per_staff):
+    dice_game = _dice_games[game_name]
+    dice_sums = _get_random_dice_sums(dice_game, 50, per_staff)
+    row_indices = dice_game.dice_sums_to_row_indices(dice_sums)
+    bar_indices = dice_game.dice_sums_to_bar_indices(dice_sums)
+
+    for table_name, table_dice_sums in dice_sums.items():
+        dice_table = dice_game.get_dice_tables()[table_name]
+        nmr_staffs = len(dice_game.get_staff_names()[table_name])
+        assert row_indices[table_name].shape == table_dice_sums.shape
+        assert bar_indices[table_name].shape == (50, nmr_staffs, dice_table.nmr_throws,
+                                                 dice_table.max_measures_per_throw)
+
+        for composition_ind in range(50):
+            for staff_ind in range(nmr_staffs):
+                for throw_ind in range(dice_table.nmr_throws):
+                    position = (composition_ind, staff_ind, throw_ind) if per_staff else (composition_ind, throw_ind)
+                    element = dice_table.get_dice_throw(int(table_dice_sums[position]), throw_ind)
+                    expected = list(element.get_bar_indices())
+                    expected += [-1] * (dice_table.max_measures_per_throw - len(expected))
+
+                    assert row_indices[table_name][position] == element.row_ind
+                    assert bar_indices[table_name][composition_ind, staff_ind, throw_ind].tolist() == expected
+
+
+def test_padding_of_mixed_lengths():
+    dice_game = _dice_games['mixed_length_scottish_dance']
+    bar_indices = dice_game.dice_sums_to_bar_indices(_get_random_dice_sums(dice_game, 50, False))
+    for table_bar_indices in bar_indices.values():
+        assert np.any(table_bar_indices[..., 1] == -1)
+        assert np.all(table_bar_indices[..., 0] >= 0)
+
+
+def test_all_invalid_dice_sums_reported():
+    dice_game = get_game('mozart_contredanse')
+    dice_sums = _get_random_dice_sums(dice_game, 10, False)
+    invalid_positions = [(0, 1), (3, 4), (9, 15)]
+    for position, value in zip(invalid_positions, [1, 13, -2]):
+        dice_sums['contredanse'][position] = value
+
+    with pytest.raises(ValueError) as error_info:
+        dice_game.dice_sums_to_row_indices(dice_sums)
+    message = str(error_info.value)
+    assert '3 dice sums out of range [2, 12]' in message
+    for position, value in zip(invalid_positions, [1, 13, -2]):
+        assert f'{position}: {value}' in message
+
+
+def test_all_invalid_tables_reported():
+    dice_game = get_game('kirnberger_menuet_trio')
+    dice_sums = _get_random_dice_sums(dice_game, 10, False)
+    dice_sums['menuet'] = dice_sums['menuet'][:, :-1]
+    dice_sums['trio'][2, 3] = 13
+    dice_sums['polonaise'] = dice_sums['trio']
+
+    with pytest.raises(ValueError) as error_info:
+        dice_game.dice_sums_to_bar_indices(dice_sums)
+    message = str(error_info.value)
+    assert re.search(r'Table "menuet": expected integer dice sums of shape .* array of shape \(10, 15\) given',
+                     message)
+    assert 'Table "trio": 1 dice sums out of range [1, 6], for example at (2, 3): 13' in message
+    assert 'Unknown dice table "polonaise"' in message
+
+
+@pytest.mark.parametrize('dice_sums', [np.full((2, 16), 2.0), np.full((2, 3, 16), 2), np.full((16,), 2)],
+                         ids=['float', 'wrong_staffs', 'one_dimensional'])
+def test_invalid_shapes(dice_sums):
+    dice_game = get_game('mozart_waltz')
+    with pytest.raises(ValueError, match='Table "waltz": expected integer dice sums'):
+        dice_game.dice_sums_to_row_indices({'waltz': dice_sums})
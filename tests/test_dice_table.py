@@ -0,0 +1,164 @@
+__author__ = 'Robbert Harms'
+__date__ = '2026-10-18'
+__maintainer__ = 'Robbert Harms'
+__email__ = 'robbert@xkls.nl'
+__licence__ = 'LGPL v3'
+
+from fractions import Fraction
+
+import numpy as np
+import pytest
+
+from musical_games.dice_games import dice_games
+from musical_games.dice_games.base import ArrayDiceTable, DiceTable, SimpleDiceTable, get_dice_sum_probabilities
+from musical_games.dice_games.registry import get_game, list_games
+
+_dice_table_types = [SimpleDiceTable, ArrayDiceTable]
+_table_lists = {
+    f'{game_name}-{table_name}': [[element.get_bar_indices() for element in row] for row in dice_table.list_rows()]
+    for game_name in list_games() for table_name, dice_table in get_game(game_name).get_dice_tables().items()}
+
+
+@pytest.fixture(params=list(_table_lists))
+def table_lists(request):
+    return _table_lists[request.param]
+
+
+@pytest.fixture(params=_dice_table_types, ids=lambda dice_table_type: dice_table_type.__name__)
+def dice_table(request, table_lists):
+    return request.param.from_lists(table_lists)
+
+
+def test_shape(dice_table, table_lists):
+    assert dice_table.shape == (len(table_lists), len(table_lists[0]))
+    assert dice_table.nmr_throws == len(table_lists[0])
+    assert dice_table.nmr_dice_values == len(table_lists)
+    assert dice_table.max_measures_per_throw == max(len(value) for row in table_lists for value in row)
+
+
+def test_get_elements(dice_table, table_lists):
+    elements = dice_table.get_elements()
+    assert len(elements) == len(table_lists) * len(table_lists[0])
+    for element in elements:
+        assert element.get_bar_indices() == table_lists[element.row_ind][element.column_ind]
+        assert dice_table.get_element(element.row_ind, element.column_ind) == element
+
+    assert [element.get_bar_indices() for element in dice_table.get_column(1)] == [row[1] for row in table_lists]
+    assert [element.get_bar_indices() for element in dice_table.get_row(1)] == list(table_lists[1])
+
+
+def test_table(dice_table, table_lists):
+    assert [[element.get_bar_indices() for element in row] for row in dice_table.table] == table_lists
+    assert dice_table.table == SimpleDiceTable.from_lists(table_lists).table
+
+
+def test_get_row_selection(dice_table, table_lists):
+    row_indices = [(column_ind * 5) % len(table_lists) for column_ind in range(len(table_lists[0]))]
+    selection = dice_table.get_row_selection(row_indices)
+    assert [element.row_ind for element in selection] == row_indices
+    assert [element.column_ind for element in selection] == list(range(len(table_lists[0])))
+    assert [element.get_bar_indices() for element in selection] == [
+        table_lists[row_ind][column_ind] for column_ind, row_ind in enumerate(row_indices)]
+
+
+@pytest.mark.parametrize('dice_weighted', [False, True])
+def test_get_random_selection(dice_table, table_lists, dice_weighted):
+    selection = dice_table.get_random_selection(np.random.default_rng(0), dice_weighted=dice_weighted)
+    assert [element.column_ind for element in selection] == list(range(len(table_lists[0])))
+
+    row_indices = dice_table.get_random_row_indices(1000, seed=0, dice_weighted=dice_weighted)
+    assert row_indices.shape == (1000, len(table_lists[0]))
+    assert 0 <= row_indices.min() and row_indices.max() < len(table_lists)
+
+    reference = SimpleDiceTable.from_lists(table_lists)
+    assert np.array_equal(row_indices, reference.get_random_row_indices(1000, seed=0, dice_weighted=dice_weighted))
+    assert dice_table.get_random_selection(1, dice_weighted=dice_weighted) == reference.get_random_selection(
+        1, dice_weighted=dice_weighted)
+
+
+def test_get_row_probabilities(dice_table, table_lists):
+    row_probabilities = dice_table.get_row_probabilities()
+    assert len(row_probabilities) == len(table_lists)
+    assert sum(row_probabilities) == Fraction(1)
+    assert row_probabilities == get_dice_sum_probabilities(
+        dice_table.nmr_dices, dice_table.min_dice_value, dice_table.max_dice_value)
+
+
+def test_get_bar_indices_array(dice_table, table_lists):
+    bar_indices = dice_table.get_bar_indices_array()
+    assert bar_indices.shape == dice_table.shape + (dice_table.max_measures_per_throw,)
+    for row_ind, row in enumerate(table_lists):
+        for column_ind, value in enumerate(row):
+            assert tuple(bar_indices[row_ind, column_ind, :len(value)].tolist()) == value
+            assert np.all(bar_indices[row_ind, column_ind, len(value):] == -1)
+
+
+class _MinimalDiceTable(DiceTable):
+    """Dice table implementing only the abstract methods, delegating them to a simple dice table."""
+
+    def __init__(self, dice_table):
+        self._dice_table = dice_table
+
+    shape = property(lambda self: self._dice_table.shape)
+    max_measures_per_throw = property(lambda self: self._dice_table.max_measures_per_throw)
+    nmr_dices = property(lambda self: self._dice_table.nmr_dices)
+    min_dice_value = property(lambda self: self._dice_table.min_dice_value)
+    max_dice_value = property(lambda self: self._dice_table.max_dice_value)
+    nmr_dice_values = property(lambda self: self._dice_table.nmr_dice_values)
+    nmr_throws = property(lambda self: self._dice_table.nmr_throws)
+
+    def get_element(self, row, column):
+        return self._dice_table.get_element(row, column)
+
+    def get_dice_throw(self, dice_number, column):
+        return self._dice_table.get_dice_throw(dice_number, column)
+
+    def get_elements(self):
+        return self._dice_table.get_elements()
+
+    def list_rows(self):
+        return self._dice_table.list_rows()
+
+    def list_columns(self):
+        return self._dice_table.list_columns()
+
+    def get_column(self, column_ind):
+        return self._dice_table.get_column(column_ind)
+
+    def get_row(self, row_ind):
+        return self._dice_table.get_row(row_ind)
+
+
+@pytest.mark.parametrize('dice_weighted', [False, True])
+def test_default_implementations(table_lists, dice_weighted):
+    reference = SimpleDiceTable.from_lists(table_lists)
+    dice_table = _MinimalDiceTable(reference)
+
+    assert dice_table.get_row_probabilities() == reference.get_row_probabilities()
+    assert np.array_equal(dice_table.get_bar_indices_array(), reference.get_bar_indices_array())
+    assert np.array_equal(dice_table.get_random_row_indices(100, seed=0, dice_weighted=dice_weighted),
+                          reference.get_random_row_indices(100, seed=0, dice_weighted=dice_weighted))
+    assert (dice_table.get_random_selection(0, dice_weighted=dice_weighted)
+            == reference.get_random_selection(0, dice_weighted=dice_weighted))
+
+    row_indices = [column_ind % len(table_lists) for column_ind in range(len(table_lists[0]))]
+    assert dice_table.get_row_selection(row_indices) == reference.get_row_selection(row_indices)
+
+
+@pytest.mark.parametrize('game_name', list_games())
+@pytest.mark.parametrize('shuffle_staffs', [False, True])
+def test_array_dice_table_is_drop_in(game_name, shuffle_staffs, monkeypatch):
+    simple_game = get_game(game_name)
+    monkeypatch.setattr(dice_games, 'SimpleDiceTable', ArrayDiceTable)
+    array_game = type(simple_game)()
+    assert all(isinstance(dice_table, ArrayDiceTable) for dice_table in array_game.get_dice_tables().values())
+
+    bar_selections = simple_game.get_random_bar_selections(20, seed=0, shuffle_staffs=shuffle_staffs)
+    assert array_game.get_random_bar_selections(20, seed=0, shuffle_staffs=shuffle_staffs) == bar_selections
+    assert (array_game.count_unique_compositions(shuffle_staffs=shuffle_staffs)
+            == simple_game.count_unique_compositions(shuffle_staffs=shuffle_staffs))
+    for bar_selection in bar_selections[:5]:
+        assert (array_game.selection_to_rank(bar_selection, shuffle_staffs=shuffle_staffs)
+                == simple_game.selection_to_rank(bar_selection, shuffle_staffs=shuffle_staffs))
+        assert (array_game.compile_composition_score(bar_selection).get_score()
+                == simple_game.compile_composition_score(bar_selection).get_score())
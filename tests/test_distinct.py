@@ -0,0 +1,141 @@
+__author__ = 'Robbert Harms'
+__date__ = '2026-10-18'
+__maintainer__ = 'Robbert Harms'
+__email__ = 'robbert@xkls.nl'
+__licence__ = 'LGPL v3'
+
+import itertools
+import multiprocessing
+import time
+
+import pytest
+
+from musical_games.dice_games.dice_games import MozartWaltz, StadlerMenuetTrio
+from musical_games.dice_games.distinct import BitmapRankFilter, BloomRankFilter, DistinctCompositionGenerator
+
+
+class _SmallMozartWaltz(MozartWaltz):
+    """Mozart's waltz with only the first two throws of each table left free, giving few unique compositions."""
+
+    def get_unique_dice_table_elements(self, dice_table_name, staff_name=None):
+        unique_elements = super().get_unique_dice_table_elements(dice_table_name, staff_name)
+        return unique_elements[:2] + [column_elements[:1] for column_elements in unique_elements[2:]]
+
+
+def _get_composition_key(dice_game, bar_selection):
+    """Get a hashable representation of the bars of a composition."""
+    return tuple((table_name, tuple(tuple(bar.lilypond_str for bar in sync_bar.get_bars())
+                                    for sync_bars in bar_sequences for sync_bar in sync_bars.get_synchronous_bars()))
+                 for table_name, bar_sequences in dice_game.bar_selection_to_bars(bar_selection).items())
+
+
+@pytest.mark.parametrize('dice_game', [MozartWaltz(), _SmallMozartWaltz()], ids=['bloom', 'bitmap'])
+def test_state_file_prevents_repeats(dice_game, tmp_path):
+    state_file = tmp_path / 'state.bin'
+    nmr_compositions = 30
+
+    compositions = set()
+    for ind in range(3):
+        generator = DistinctCompositionGenerator(dice_game, state_file)
+        assert generator.nmr_emitted == ind * nmr_compositions
+        for bar_selection in generator.generate(nmr_compositions, seed=0):
+            compositions.add(_get_composition_key(dice_game, bar_selection))
+    assert len(compositions) == 3 * nmr_compositions
+
+    expected_filter = BitmapRankFilter if isinstance(dice_game, _SmallMozartWaltz) else BloomRankFilter
+    assert isinstance(DistinctCompositionGenerator(dice_game, state_file).rank_filter, expected_filter)
+
+
+def _generate_compositions(state_file, nmr_yielded, batch_size, queue, wait_for_kill):
+    """Generate compositions in a child process, putting them on the queue, optionally waiting to be killed after."""
+    dice_game = MozartWaltz()
+    generator = DistinctCompositionGenerator(dice_game, state_file)
+    iterator = generator.generate(1000, seed=0, batch_size=batch_size)
+    for bar_selection in itertools.islice(iterator, nmr_yielded):
+        queue.put(_get_composition_key(dice_game, bar_selection))
+    if wait_for_kill:
+        time.sleep(60)
+
+
+def test_killed_generator_does_not_repeat(tmp_path):
+    state_file = tmp_path / 'state.bin'
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    process = context.Process(target=_generate_compositions, args=(state_file, 10, 4, queue, True))
+    process.start()
+    killed_compositions = {queue.get(timeout=60) for _ in range(10)}
+    process.kill()
+    process.join()
+
+    dice_game = MozartWaltz()
+    generator = DistinctCompositionGenerator(dice_game, state_file)
+    assert generator.nmr_emitted == 12
+    assert killed_compositions.isdisjoint(_get_composition_key(dice_game, bar_selection)
+                                          for bar_selection in generator.generate(100, seed=0))
+
+
+def test_concurrent_processes_do_not_repeat(tmp_path):
+    state_file = tmp_path / 'state.bin'
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    processes = [context.Process(target=_generate_compositions, args=(state_file, 50, 5, queue, False))
+                 for _ in range(2)]
+    for process in processes:
+        process.start()
+    compositions = [queue.get(timeout=60) for _ in range(100)]
+    for process in processes:
+        process.join()
+
+    assert len(set(compositions)) == 100
+    assert DistinctCompositionGenerator(MozartWaltz(), state_file).nmr_emitted == 100
+
+
+@pytest.mark.parametrize('dice_game', [MozartWaltz(), _SmallMozartWaltz()], ids=['bloom', 'bitmap'])
+def test_shared_state_file_is_merged(dice_game, tmp_path):
+    state_file = tmp_path / 'state.bin'
+    iterators = [DistinctCompositionGenerator(dice_game, state_file).generate(40, seed=0, batch_size=1)
+                 for _ in range(2)]
+    compositions = {_get_composition_key(dice_game, bar_selection)
+                    for bar_selections in zip(*iterators) for bar_selection in bar_selections}
+
+    assert len(compositions) == 80
+    assert DistinctCompositionGenerator(dice_game, state_file).nmr_emitted == 80
+
+
+def test_merge_rank_filters():
+    first_filter, second_filter = BitmapRankFilter(100), BitmapRankFilter(100)
+    for rank in range(0, 100, 3):
+        first_filter.add(rank)
+    for rank in range(0, 100, 5):
+        second_filter.add(rank)
+    first_filter.merge(second_filter)
+    assert first_filter.nmr_added == len(set(range(0, 100, 3)) | set(range(0, 100, 5)))
+    assert all(first_filter.contains(rank) == (rank % 3 == 0 or rank % 5 == 0) for rank in range(100))
+
+    with pytest.raises(ValueError):
+        first_filter.merge(BitmapRankFilter(200))
+    with pytest.raises(ValueError):
+        BloomRankFilter(800, 3).merge(BloomRankFilter(800, 4))
+
+
+def test_exhausted_state_file(tmp_path):
+    dice_game = _SmallMozartWaltz()
+    state_file = tmp_path / 'state.bin'
+    nmr_ranks = dice_game.enumerate_unique_compositions().nmr_ranks
+
+    generator = DistinctCompositionGenerator(dice_game, state_file)
+    compositions = {_get_composition_key(dice_game, bar_selection)
+                    for bar_selection in generator.generate(nmr_ranks, seed=0, max_attempts=100_000)}
+    assert len(compositions) == nmr_ranks
+
+    generator = DistinctCompositionGenerator(dice_game, state_file)
+    with pytest.raises(RuntimeError):
+        next(generator.generate(1, seed=1))
+    assert generator.nmr_emitted == nmr_ranks
+
+
+def test_state_file_of_other_game(tmp_path):
+    state_file = tmp_path / 'state.bin'
+    list(DistinctCompositionGenerator(MozartWaltz(), state_file).generate(1, seed=0))
+    with pytest.raises(ValueError):
+        DistinctCompositionGenerator(StadlerMenuetTrio(), state_file)
@@ -0,0 +1,111 @@
+__author__ = 'Robbert Harms'
+__date__ = '2026-10-18'
+__maintainer__ = 'Robbert Harms'
+__email__ = 'robbert@xkls.nl'
+__licence__ = 'LGPL v3'
+
+import os
+from pathlib import Path
+
+import pytest
+
+from musical_games.external import lilypond
+from musical_games.external.lilypond import typeset_lilypond_batch
+
+
+class _FakeLilypond:
+    """Replacement of the lilypond command, typesetting files by name.
+
+    Files named ``good*`` typeset in the batch and on their own, ``flaky*`` only on their own and ``broken*`` never.
+    A batch with a flaky or broken file fails, after writing the outputs of the other files.
+    """
+
+    def __init__(self):
+        self.batch_calls = []
+        self.single_calls = []
+
+    def __call__(self, command):
+        output_index = command.index('-o')
+        output_path = Path(command[output_index + 1])
+        lilypond_files = [Path(lilypond_file) for lilypond_file in command[output_index + 2:]]
+
+        if any(str(argument).startswith('-djob-count') for argument in command):
+            self.batch_calls.append(lilypond_files)
+            for lilypond_file in lilypond_files:
+                if lilypond_file.stem.startswith('good'):
+                    self._write_outputs(output_path / lilypond_file.stem)
+            if not all(lilypond_file.stem.startswith('good') for lilypond_file in lilypond_files):
+                raise RuntimeError('Batch failed.')
+        else:
+            self.single_calls.extend(lilypond_files)
+            if lilypond_files[0].stem.startswith('broken'):
+                raise RuntimeError(f'Could not typeset {lilypond_files[0].name}.')
+            self._write_outputs(output_path)
+
+    @staticmethod
+    def _write_outputs(output_basename):
+        output_basename.with_suffix('.pdf').write_bytes(b'%PDF')
+        output_basename.with_suffix('.midi').write_bytes(b'MThd')
+
+
+@pytest.fixture
+def fake_lilypond(monkeypatch):
+    fake_lilypond = _FakeLilypond()
+    monkeypatch.setattr(lilypond, 'run_command', fake_lilypond)
+    return fake_lilypond
+
+
+def _write_lilypond_files(directory, names):
+    directory.mkdir(parents=True, exist_ok=True)
+    lilypond_files = []
+    for name in names:
+        lilypond_files.append(directory / f'{name}.ly')
+        lilypond_files[-1].write_text('{ c }')
+    return lilypond_files
+
+
+def test_successful_batch(tmp_path, fake_lilypond):
+    lilypond_files = _write_lilypond_files(tmp_path / 'in', ['good_1', 'good_2', 'good_3'])
+    batch_results = typeset_lilypond_batch(lilypond_files, tmp_path / 'out', png=False)
+
+    assert fake_lilypond.batch_calls == [lilypond_files]
+    assert fake_lilypond.single_calls == []
+    assert batch_results.errors == {}
+    assert list(batch_results.results) == lilypond_files
+    for lilypond_file, results in batch_results.results.items():
+        assert results.pdf_list == [tmp_path / 'out' / f'{lilypond_file.stem}.pdf']
+        assert results.midi_list == [tmp_path / 'out' / f'{lilypond_file.stem}.midi']
+
+
+def test_failed_files_are_isolated(tmp_path, fake_lilypond):
+    lilypond_files = _write_lilypond_files(tmp_path / 'in', ['good_1', 'flaky', 'good_2', 'broken', 'broken_stale'])
+
+    output_dir = tmp_path / 'out'
+    output_dir.mkdir()
+    for name in ['flaky', 'broken_stale']:
+        _FakeLilypond._write_outputs(output_dir / name)
+        for suffix in ['.pdf', '.midi']:
+            os.utime((output_dir / name).with_suffix(suffix), (0, 0))
+
+    batch_results = typeset_lilypond_batch(lilypond_files, output_dir, png=False)
+
+    assert fake_lilypond.batch_calls == [lilypond_files]
+    assert fake_lilypond.single_calls == [lilypond_files[1], lilypond_files[3], lilypond_files[4]]
+    assert list(batch_results.results) == lilypond_files[:3]
+    assert list(batch_results.errors) == [lilypond_files[3], lilypond_files[4]]
+    assert all(isinstance(error, RuntimeError) for error in batch_results.errors.values())
+    assert batch_results.results[lilypond_files[1]].pdf_list == [output_dir / 'flaky.pdf']
+
+
+def test_duplicate_file_names(tmp_path, fake_lilypond):
+    lilypond_files = (_write_lilypond_files(tmp_path / 'first', ['good'])
+                      + _write_lilypond_files(tmp_path / 'second', ['good']))
+    with pytest.raises(ValueError):
+        typeset_lilypond_batch(lilypond_files, tmp_path / 'out')
+    assert fake_lilypond.batch_calls == []
+
+
+def test_empty_batch(tmp_path, fake_lilypond):
+    batch_results = typeset_lilypond_batch([], tmp_path / 'out')
+    assert batch_results.results == {} and batch_results.errors == {}
+    assert fake_lilypond.batch_calls == []
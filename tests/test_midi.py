@@ -0,0 +1,111 @@
+__author__ = 'Robbert Harms'
+__date__ = '2026-10-18'
+__maintainer__ = 'Robbert Harms'
+__email__ = 'robbert@xkls.nl'
+__licence__ = 'LGPL v3'
+
+import bisect
+import shutil
+import struct
+
+import pytest
+
+from musical_games.dice_games.midi import default_ticks_per_quarter, parse_lilypond_bar
+from musical_games.dice_games.registry import get_game, list_games
+from musical_games.external.lilypond import typeset_lilypond
+
+
+def _read_variable_length(data, position):
+    value = 0
+    while True:
+        value = (value << 7) | (data[position] & 0x7F)
+        position += 1
+        if not data[position - 1] & 0x80:
+            return value, position
+
+
+def _read_midi_notes(data):
+    """Read the note on events of all the tracks of a midi file.
+
+    Returns:
+        The notes as tuples of the start time, in ticks of the default resolution, and the pitch, and the end time of
+        the longest track.
+    """
+    _, _, nmr_tracks, division = struct.unpack('>IHHH', data[4:14])
+    position = 14
+    notes = []
+    end_time = 0
+    for _ in range(nmr_tracks):
+        track_length = struct.unpack('>I', data[position + 4:position + 8])[0]
+        track = data[position + 8:position + 8 + track_length]
+        position += 8 + track_length
+
+        ind = 0
+        time = 0
+        status = None
+        while ind < len(track):
+            delta, ind = _read_variable_length(track, ind)
+            time += delta
+            if track[ind] == 0xFF:
+                length, ind = _read_variable_length(track, ind + 2)
+                ind += length
+            elif track[ind] in (0xF0, 0xF7):
+                length, ind = _read_variable_length(track, ind + 1)
+                ind += length
+            else:
+                if track[ind] & 0x80:
+                    status = track[ind]
+                    ind += 1
+                if status & 0xF0 == 0x90 and track[ind + 1] > 0:
+                    notes.append((round(time * default_ticks_per_quarter / division), track[ind]))
+                ind += 1 if status & 0xF0 in (0xC0, 0xD0) else 2
+        end_time = max(end_time, round(time * default_ticks_per_quarter / division))
+    return notes, end_time
+
+
+def _order_by_bar(notes, bar_starts):
+    """Order the pitches by the bar in which they start, allowing grace notes to be played just before the bar."""
+    tolerance = default_ticks_per_quarter // 4
+    return sorted((bisect.bisect_right(bar_starts, time + tolerance) - 1, pitch) for time, pitch in notes)
+
+
+def test_parse_lilypond_bar():
+    bar_events = parse_lilypond_bar("<c' e'>8. d''16 r4 \\tuplet 3/2 { e'8 f' g' }")
+    assert [(note.start, note.pitch) for note in bar_events.notes] == [
+        (0, 60), (0, 64), (288, 74), (768, 64), (896, 65), (1024, 67)]
+    assert bar_events.length == 3 * default_ticks_per_quarter
+
+
+@pytest.mark.parametrize('lilypond_str', ["\\relative c' { c4 d e f }", "\\fixed c' { c4 }",
+                                          "\\transpose c d { c'4 }"])
+def test_relative_pitches_not_supported(lilypond_str):
+    with pytest.raises(ValueError):
+        parse_lilypond_bar(lilypond_str)
+
+
+@pytest.mark.skipif(shutil.which('lilypond') is None, reason='lilypond is not installed')
+@pytest.mark.parametrize('game_name', list_games())
+def test_midi_notes_match_lilypond(game_name, tmp_path):
+    """The sections of the games should play the bars in the same order as the lilypond midi templates.
+
+    We remove the articulations from the lilypond score, since the realisation of ornaments is not part of the
+    midi compiled directly from the bars.
+    """
+    dice_game = get_game(game_name)
+    bar_selection = dice_game.get_random_bar_selection(seed=0)
+    bar_starts = sorted({placement.start for placement in dice_game.get_midi_bar_placements(bar_selection)})
+
+    score = dice_game.compile_composition_audio(bar_selection).get_score().replace('\\articulate', '')
+    (tmp_path / 'composition.ly').write_text(score)
+    results = typeset_lilypond(tmp_path / 'composition.ly', tmp_path / 'composition', pdf=False, png=False)
+
+    lilypond_notes = []
+    offset = 0
+    for midi_file in results.midi_list:
+        notes, end_time = _read_midi_notes(midi_file.read_bytes())
+        lilypond_notes.extend((offset + time, pitch) for time, pitch in notes)
+        offset = min(bar_starts, key=lambda bar_start: abs(bar_start - offset - end_time))
+
+    notes, _ = _read_midi_notes(dice_game.compile_composition_midi(bar_selection))
+    assert len(lilypond_notes) == len(notes)
+    assert _order_by_bar(lilypond_notes, bar_starts) == _order_by_bar(notes, bar_starts)
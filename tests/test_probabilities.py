@@ -0,0 +1,51 @@
+__author__ = 'Robbert Harms'
+__date__ = '2026-10-18'
+__maintainer__ = 'Robbert Harms'
+__email__ = 'robbert@xkls.nl'
+__licence__ = 'LGPL v3'
+
+from fractions import Fraction
+
+import pytest
+
+from musical_games.dice_games.base import PerStaffsBarSelection
+from musical_games.dice_games.registry import get_game, list_games
+
+
+@pytest.mark.parametrize('game_name', list_games())
+def test_unique_staff_selections_sum_to_one(game_name):
+    dice_game = get_game(game_name)
+    for table_name, staff_names in dice_game.get_staff_names().items():
+        for staff_name in staff_names:
+            element_probabilities = dice_game._get_dice_table_element_probabilities(table_name, staff_name)
+            for column_elements in dice_game.get_unique_dice_table_elements(table_name, staff_name):
+                assert sum(element_probabilities[element.column_ind][element.row_ind]
+                           for element in column_elements) == 1
+
+
+@pytest.mark.parametrize('game_name', list_games())
+def test_staff_probability_merges_identical_staff_bars(game_name):
+    dice_game = get_game(game_name)
+    base_selection = dice_game.rank_to_selection(0, shuffle_staffs=True)
+    base_probability = dice_game.get_composition_probability(base_selection, shuffle_staffs=True)
+
+    for table_name, staff_names in dice_game.get_staff_names().items():
+        dice_table = dice_game.get_dice_tables()[table_name]
+        bar_collection = dice_game.get_bar_collections()[table_name]
+        row_probabilities = dice_table.get_row_probabilities()
+        for staff_name in staff_names:
+            base_elements = base_selection.get_dice_table_elements(table_name, staff_name)
+            column = dice_table.get_column(0)
+            column_bars = bar_collection.get_bar_selection(staff_name, column)
+            expected = sum((row_probabilities[element.row_ind] for element, bar in zip(column, column_bars)
+                            if bar == column_bars[base_elements[0].row_ind]), Fraction(0))
+
+            for other_row in range(dice_table.nmr_dice_values):
+                choices = {name: {staff: list(base_selection.get_dice_table_elements(name, staff))
+                                  for staff in staffs} for name, staffs in dice_game.get_staff_names().items()}
+                choices[table_name][staff_name][0] = column[other_row]
+                probability = dice_game.get_composition_probability(PerStaffsBarSelection(choices),
+                                                                    shuffle_staffs=True)
+                other_expected = sum((row_probabilities[element.row_ind] for element, bar in zip(column, column_bars)
+                                      if bar == column_bars[other_row]), Fraction(0))
+                assert probability * expected == base_probability * other_expected
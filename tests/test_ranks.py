@@ -0,0 +1,38 @@
+__author__ = 'Robbert Harms'
+__date__ = '2026-10-18'
+__maintainer__ = 'Robbert Harms'
+__email__ = 'robbert@xkls.nl'
+__licence__ = 'LGPL v3'
+
+import numpy as np
+import pytest
+
+from musical_games.dice_games.registry import get_game, list_games
+
+
+@pytest.mark.parametrize('game_name', list_games())
+@pytest.mark.parametrize('shuffle_staffs', [False, True])
+def test_rank_round_trip(game_name, shuffle_staffs):
+    dice_game = get_game(game_name)
+    nmr_ranks = dice_game.count_ranks(shuffle_staffs)
+    assert nmr_ranks >= dice_game.count_unique_compositions(shuffle_staffs=shuffle_staffs)
+
+    for bar_selection in dice_game.get_random_bar_selections(50, seed=0, shuffle_staffs=shuffle_staffs):
+        rank = dice_game.selection_to_rank(bar_selection, shuffle_staffs=shuffle_staffs)
+        assert 0 <= rank < nmr_ranks
+        decoded = dice_game.rank_to_selection(rank, shuffle_staffs=shuffle_staffs)
+        assert dice_game.bar_selection_to_bars(decoded) == dice_game.bar_selection_to_bars(bar_selection)
+
+    rng = np.random.default_rng(0)
+    ranks = [0, nmr_ranks - 1] + [int(rng.integers(0, 2 ** 62)) * nmr_ranks // 2 ** 62 for _ in range(50)]
+    for rank in ranks:
+        decoded = dice_game.rank_to_selection(rank, shuffle_staffs=shuffle_staffs)
+        assert dice_game.selection_to_rank(decoded, shuffle_staffs=shuffle_staffs) == rank
+
+
+@pytest.mark.parametrize('shuffle_staffs', [False, True])
+def test_ranks_out_of_range(shuffle_staffs):
+    dice_game = get_game('mozart_waltz')
+    for rank in (-1, dice_game.count_ranks(shuffle_staffs)):
+        with pytest.raises(ValueError):
+            dice_game.rank_to_selection(rank, shuffle_staffs=shuffle_staffs)
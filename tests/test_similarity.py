@@ -0,0 +1,44 @@
+__author__ = 'Robbert Harms'
+__date__ = '2026-10-18'
+__maintainer__ = 'Robbert Harms'
+__email__ = 'robbert@xkls.nl'
+__licence__ = 'LGPL v3'
+
+import pytest
+
+from musical_games.dice_games.registry import get_game, list_games
+from musical_games.dice_games.similarity import CompositionIndex
+
+
+def _count_differing_bars(dice_game, first_selection, second_selection, shuffle_staffs):
+    """Count the throws (per staff, if shuffling staffs) in which two compositions select different bars."""
+    nmr_differing = 0
+    for table_name, staff_names in dice_game.get_staff_names().items():
+        bar_collection = dice_game.get_bar_collections()[table_name]
+        if shuffle_staffs:
+            for staff_name in staff_names:
+                nmr_differing += sum(first_bar != second_bar for first_bar, second_bar in zip(
+                    bar_collection.get_bar_selection(
+                        staff_name, first_selection.get_dice_table_elements(table_name, staff_name)),
+                    bar_collection.get_bar_selection(
+                        staff_name, second_selection.get_dice_table_elements(table_name, staff_name))))
+        else:
+            nmr_differing += sum(first_bar != second_bar for first_bar, second_bar in zip(
+                bar_collection.get_synchronous_selection(first_selection.get_dice_table_elements(table_name)),
+                bar_collection.get_synchronous_selection(second_selection.get_dice_table_elements(table_name))))
+    return nmr_differing
+
+
+@pytest.mark.parametrize('game_name', list_games())
+@pytest.mark.parametrize('shuffle_staffs', [False, True])
+def test_distance_counts_differing_bars(game_name, shuffle_staffs):
+    dice_game = get_game(game_name)
+    bar_selections = dice_game.get_random_bar_selections(20, seed=0, shuffle_staffs=shuffle_staffs)
+
+    index = CompositionIndex(dice_game, shuffle_staffs=shuffle_staffs)
+    index.add_bar_selections(bar_selections)
+
+    for bar_selection in bar_selections[:5]:
+        for composition_id, distance in index.query(bar_selection, k=len(bar_selections)):
+            assert distance == _count_differing_bars(dice_game, bar_selection, bar_selections[composition_id],
+                                                     shuffle_staffs)
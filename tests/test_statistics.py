@@ -0,0 +1,149 @@
+__author__ = 'Robbert Harms'
+__date__ = '2026-10-18'
+__maintainer__ = 'Robbert Harms'
+__email__ = 'robbert@xkls.nl'
+__licence__ = 'LGPL v3'
+
+import csv
+from fractions import Fraction
+
+import numpy as np
+import pytest
+
+from musical_games.dice_games.registry import get_game, list_games
+from musical_games.dice_games.statistics import BarUsage, count_bar_usage, expected_bar_usage, sample_bar_usage
+
+
+def _count_by_hand(dice_game, row_indices):
+    """Count the bar usage per table, staff, throw and bar index by walking the dice table elements."""
+    counts = {}
+    for table_name, table_rows in row_indices.items():
+        dice_table = dice_game.get_dice_tables()[table_name]
+        staff_names = dice_game.get_staff_names()[table_name]
+        table_counts = counts[table_name] = {}
+        for composition_rows in table_rows.tolist():
+            for staff_ind in range(len(staff_names)):
+                staff_rows = composition_rows[staff_ind] if table_rows.ndim == 3 else composition_rows
+                for throw_ind, row_ind in enumerate(staff_rows):
+                    for bar_index in dice_table.get_element(row_ind, throw_ind).get_bar_indices():
+                        key = (staff_ind, throw_ind, bar_index)
+                        table_counts[key] = table_counts.get(key, 0) + 1
+    return counts
+
+
+def _get_non_zero_counts(bar_usage):
+    return {table_name: {tuple(position): counts[tuple(position)].item() for position in np.argwhere(counts).tolist()}
+            for table_name, counts in bar_usage.counts.items()}
+
+
+def _get_exact_expected_counts(dice_game, nmr_compositions, dice_weighted):
+    """Compute the expected usage per table, throw and bar index with exact fractions."""
+    expected = {}
+    for table_name, dice_table in dice_game.get_dice_tables().items():
+        if dice_weighted:
+            row_probabilities = dice_table.get_row_probabilities()
+        else:
+            row_probabilities = [Fraction(1, dice_table.shape[0])] * dice_table.shape[0]
+
+        table_expected = expected[table_name] = {}
+        for element in dice_table.get_elements():
+            for bar_index in element.get_bar_indices():
+                key = (element.column_ind, bar_index)
+                table_expected[key] = (table_expected.get(key, Fraction(0))
+                                       + nmr_compositions * row_probabilities[element.row_ind])
+    return expected
+
+
+@pytest.mark.parametrize('game_name', list_games())
+@pytest.mark.parametrize('shuffle_staffs', [False, True])
+def test_count_bar_usage(game_name, shuffle_staffs):
+    dice_game = get_game(game_name)
+    row_indices = dice_game.get_random_row_indices(200, seed=0, shuffle_staffs=shuffle_staffs)
+    bar_usage = count_bar_usage(dice_game, row_indices)
+
+    assert bar_usage.nmr_compositions == 200
+    assert bar_usage.staff_names == dice_game.get_staff_names()
+    assert _get_non_zero_counts(bar_usage) == _count_by_hand(dice_game, row_indices)
+
+
+@pytest.mark.parametrize('game_name', list_games())
+@pytest.mark.parametrize('dice_weighted', [False, True])
+def test_expected_bar_usage_exact(game_name, dice_weighted):
+    dice_game = get_game(game_name)
+    bar_usage = expected_bar_usage(dice_game, 1000, dice_weighted=dice_weighted)
+    exact_counts = _get_exact_expected_counts(dice_game, 1000, dice_weighted)
+
+    for table_name, counts in bar_usage.counts.items():
+        assert counts.shape[0] == len(dice_game.get_staff_names()[table_name])
+        for staff_counts in counts:
+            assert {tuple(position): staff_counts[tuple(position)].item()
+                    for position in np.argwhere(staff_counts).tolist()} == pytest.approx(
+                {key: float(value) for key, value in exact_counts[table_name].items()})
+
+
+@pytest.mark.parametrize('dice_weighted', [False, True])
+@pytest.mark.parametrize('shuffle_staffs', [False, True])
+def test_sampled_usage_matches_expected(dice_weighted, shuffle_staffs):
+    dice_game = get_game('gerlach_scottish_dance')
+    nmr_compositions = 100_000
+    sampled_usage = sample_bar_usage(dice_game, nmr_compositions, seed=0, shuffle_staffs=shuffle_staffs,
+                                     dice_weighted=dice_weighted, batch_size=30_000)
+    expected_usage = expected_bar_usage(dice_game, nmr_compositions, dice_weighted=dice_weighted)
+
+    assert sampled_usage.nmr_compositions == nmr_compositions
+    for table_name, expected_counts in expected_usage.counts.items():
+        sampled_counts = sampled_usage.counts[table_name]
+        standard_deviations = np.sqrt(expected_counts * (1 - expected_counts / nmr_compositions))
+        assert np.all(np.abs(sampled_counts - expected_counts) <= 5 * standard_deviations + 1)
+        assert np.all(sampled_counts[expected_counts == 0] == 0)
+
+
+def test_bar_usage_npz_round_trip(tmp_path):
+    dice_game = get_game('gerlach_scottish_dance')
+    bar_usage = sample_bar_usage(dice_game, 500, seed=0, shuffle_staffs=True)
+    bar_usage.to_npz(tmp_path / 'usage.npz')
+    loaded_usage = BarUsage.from_npz(tmp_path / 'usage.npz')
+
+    assert loaded_usage.nmr_compositions == bar_usage.nmr_compositions
+    assert loaded_usage.staff_names == bar_usage.staff_names
+    assert loaded_usage.counts.keys() == bar_usage.counts.keys()
+    for table_name, counts in bar_usage.counts.items():
+        assert loaded_usage.counts[table_name].dtype == counts.dtype
+        assert np.array_equal(loaded_usage.counts[table_name], counts)
+
+
+def test_bar_usage_csv(tmp_path):
+    dice_game = get_game('gerlach_scottish_dance')
+    bar_usage = sample_bar_usage(dice_game, 500, seed=0, shuffle_staffs=True)
+    bar_usage.to_csv(tmp_path / 'usage.csv')
+
+    with open(tmp_path / 'usage.csv', newline='') as f:
+        reader = csv.reader(f)
+        assert next(reader) == ['table', 'staff', 'throw', 'bar_index', 'count']
+        rows = list(reader)
+
+    csv_counts = {}
+    for table_name, staff_name, throw_ind, bar_index, count in rows:
+        staff_ind = bar_usage.staff_names[table_name].index(staff_name)
+        csv_counts.setdefault(table_name, {})[(staff_ind, int(throw_ind), int(bar_index))] = int(count)
+    assert csv_counts == _get_non_zero_counts(bar_usage)
+
+
+def test_bar_usage_add_and_get_counts():
+    dice_game = get_game('gerlach_scottish_dance')
+    first_rows = dice_game.get_random_row_indices(100, seed=0, shuffle_staffs=True)
+    second_rows = dice_game.get_random_row_indices(50, seed=1, shuffle_staffs=True)
+    combined_usage = count_bar_usage(dice_game, first_rows) + count_bar_usage(dice_game, second_rows)
+    all_usage = count_bar_usage(dice_game, {table_name: np.concatenate([rows, second_rows[table_name]])
+                                            for table_name, rows in first_rows.items()})
+
+    assert combined_usage.nmr_compositions == 150
+    assert _get_non_zero_counts(combined_usage) == _get_non_zero_counts(all_usage)
+
+    table_name = dice_game.get_dice_table_names()[0]
+    staff_name = dice_game.get_staff_names()[table_name][1]
+    counts = combined_usage.counts[table_name]
+    assert np.array_equal(combined_usage.get_counts(table_name), counts.sum(axis=(0, 1)))
+    assert np.array_equal(combined_usage.get_counts(table_name, staff_name), counts[1].sum(axis=0))
+    assert np.array_equal(combined_usage.get_counts(table_name, staff_name, 3), counts[1, 3])
+    assert np.array_equal(combined_usage.get_counts(table_name, throw_ind=3), counts[:, 3].sum(axis=0))
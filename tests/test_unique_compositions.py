@@ -0,0 +1,39 @@
+__author__ = 'Robbert Harms'
+__date__ = '2026-10-18'
+__maintainer__ = 'Robbert Harms'
+__email__ = 'robbert@xkls.nl'
+__licence__ = 'LGPL v3'
+
+import itertools
+
+import pytest
+
+from musical_games.dice_games.base import PerStaffsBarSelection
+from musical_games.dice_games.registry import get_game, list_games
+
+
+@pytest.mark.parametrize('game_name', list_games())
+def test_unique_staff_elements_cover_all_bars(game_name):
+    dice_game = get_game(game_name)
+    for table_name, staff_names in dice_game.get_staff_names().items():
+        dice_table = dice_game.get_dice_tables()[table_name]
+        bar_collection = dice_game.get_bar_collections()[table_name]
+        for staff_name in staff_names:
+            for column_ind, unique_elements in enumerate(
+                    dice_game.get_unique_dice_table_elements(table_name, staff_name)):
+                unique_bars = bar_collection.get_bar_selection(staff_name, unique_elements)
+                column_bars = bar_collection.get_bar_selection(staff_name, dice_table.get_column(column_ind))
+                assert len(set(unique_bars)) == len(unique_bars)
+                assert set(unique_bars) == set(column_bars)
+
+
+@pytest.mark.parametrize('game_name', list_games())
+@pytest.mark.parametrize('shuffle_staffs', [False, True])
+def test_enumeration_matches_count(game_name, shuffle_staffs):
+    dice_game = get_game(game_name)
+    enumerator = dice_game.enumerate_unique_compositions(shuffle_staffs=shuffle_staffs)
+    assert enumerator.nmr_ranks == dice_game.count_unique_compositions(shuffle_staffs=shuffle_staffs)
+
+    for bar_selection in itertools.islice(enumerator.shard(3, 4), 5):
+        assert isinstance(bar_selection, PerStaffsBarSelection) == shuffle_staffs
+        dice_game.bar_selection_to_bars(bar_selection)